@@ -0,0 +1,146 @@
+"""
+Descargas concurrentes de cubos grandes: un proceso WSGI (gunicorn, workers sync) contra un proceso
+ASGI (uvicorn) sirviendo las mismas vistas. Reporta req/s, MB/s y latencias p50/p99 por nivel de
+concurrencia.
+
+Requiere gunicorn y uvicorn instalados (el servidor que falte se omite). Todo es offline: se genera
+una instancia sintetica en un directorio temporal que se pasa a Django con PROVIDER_DATA_DIR.
+
+Uso:
+    python benchmarks/bench_asgi.py --nt 96 --nv 20 --ny 150 --nx 150 --concurrency 1,8,32 --requests 4
+    python benchmarks/bench_asgi.py --client-mbps 20    # clientes remotos lentos
+
+En loopback sin limite el worker sync con sendfile es dificil de superar; la diferencia aparece con
+clientes lentos, donde cada descarga ocupa un worker sync completo mientras ASGI las intercala.
+"""
+import os
+import sys
+import time
+import shutil
+import socket
+import argparse
+import tempfile
+import threading
+import subprocess
+import http.client
+import importlib.util
+import numpy as np
+
+from bench_datajson import make_instance, INSTANCE, DOMAIN, VARIABLE
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SERVERS = {
+    'wsgi': lambda port, args: ['gunicorn', 'dj_apiMap.wsgi:application', '--workers', '1',
+                                '--threads', str(args.wsgi_threads), '--bind', f'127.0.0.1:{port}'],
+    'asgi': lambda port, args: ['uvicorn', 'dj_apiMap.asgi:application', '--workers', '1',
+                                '--host', '127.0.0.1', '--port', str(port), '--log-level', 'warning'],
+}
+MODULES = {'wsgi': 'gunicorn', 'asgi': 'uvicorn'}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_ready(port, timeout=30):
+    start = time.time()
+    while time.time() - start < timeout:
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=2)
+            conn.request('GET', '/api/context/')
+            conn.getresponse().read()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"El servidor no respondio en el puerto {port}")
+
+
+def fetch(port, path, client_mbps=0):
+    """Descarga path completo. client_mbps > 0 simula un cliente remoto leyendo a esa tasa."""
+    start = time.perf_counter()
+    conn  = http.client.HTTPConnection('127.0.0.1', port, timeout=300)
+    conn.request('GET', path, headers={'Accept-Encoding': 'identity'})
+    response = conn.getresponse()
+    first    = time.perf_counter()
+    nbytes   = 0
+    while True:
+        chunk = response.read(1 << 20)
+        if not chunk:
+            break
+        nbytes += len(chunk)
+        if client_mbps > 0:
+            time.sleep(max(0.0, first + nbytes / (client_mbps * 1e6) - time.perf_counter()))
+    conn.close()
+    return time.perf_counter() - start, nbytes
+
+
+def load(port, path, concurrency, requests, client_mbps=0):
+    """concurrency clientes, cada uno descarga requests veces el cubo."""
+    latencies, sizes, lock = [], [], threading.Lock()
+    def client():
+        for _ in range(requests):
+            latency, nbytes = fetch(port, path, client_mbps)
+            with lock:
+                latencies.append(latency)
+                sizes.append(nbytes)
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    start   = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    return {
+        "req_s": len(latencies) / elapsed,
+        "mb_s" : sum(sizes) / elapsed / 1e6,
+        "p50"  : float(np.percentile(latencies, 50)),
+        "p99"  : float(np.percentile(latencies, 99)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--nt', type=int, default=96)
+    parser.add_argument('--nv', type=int, default=20)
+    parser.add_argument('--ny', type=int, default=150)
+    parser.add_argument('--nx', type=int, default=150)
+    parser.add_argument('--concurrency', default='1,8,32')
+    parser.add_argument('--requests', type=int, default=4, help='requests por cliente')
+    parser.add_argument('--wsgi-threads', type=int, default=1, help='threads del worker gunicorn')
+    parser.add_argument('--endpoint', default='data', help='data, datajson o bundle')
+    parser.add_argument('--client-mbps', type=float, default=0,
+                        help='tasa de lectura de cada cliente en MB/s (0 = sin limite, loopback)')
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix='bench_asgi_')
+    path = f'/api/{args.endpoint}/?domain={DOMAIN}&instance={INSTANCE}&variable={VARIABLE}'
+    try:
+        make_instance(root, args.nt, args.nv, args.ny, args.nx)
+        env = {**os.environ, 'PROVIDER_DATA_DIR': root, 'DJANGO_SETTINGS_MODULE': 'dj_apiMap.settings'}
+        print(f"cubo ({args.nt}, {args.nv}, 1, {args.ny}, {args.nx}) float16, endpoint /api/{args.endpoint}/")
+        print(f"{'servidor':8} {'clientes':>8} {'req/s':>8} {'MB/s':>8} {'p50 s':>8} {'p99 s':>8}")
+        for name, command in SERVERS.items():
+            if importlib.util.find_spec(MODULES[name]) is None:
+                print(f"{name:8} [SKIP] {MODULES[name]} no instalado")
+                continue
+            port   = free_port()
+            server = subprocess.Popen(command(port, args), cwd=BASE_DIR, env=env,
+                                      stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            try:
+                wait_ready(port)
+                fetch(port, path)   # calienta caches
+                for concurrency in [int(c) for c in args.concurrency.split(',')]:
+                    r = load(port, path, concurrency, args.requests, args.client_mbps)
+                    print(f"{name:8} {concurrency:8d} {r['req_s']:8.1f} {r['mb_s']:8.1f} {r['p50']:8.3f} {r['p99']:8.3f}")
+            finally:
+                server.terminate()
+                server.wait()
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
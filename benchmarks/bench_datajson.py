@@ -0,0 +1,112 @@
+"""
+Benchmark de /api/datajson/: implementacion anterior (values.flatten().tolist() + JsonResponse)
+contra la respuesta por bloques (StreamingHttpResponse).
+
+Cada modo corre en un subproceso separado para que el peak RSS (ru_maxrss) sea comparable.
+Todo es offline: se genera una instancia sintetica en un directorio temporal.
+
+Uso:
+    python benchmarks/bench_datajson.py --nt 96 --nv 20 --ny 150 --nx 150 --requests 3
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import resource
+import tempfile
+import subprocess
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+INSTANCE = '2025-01-01_00'
+DOMAIN   = 'antucoya'
+VARIABLE = 'mp10_hd_species'
+
+
+def make_instance(root, nt, nv, ny, nx):
+    sys.path.insert(0, os.path.join(BASE_DIR, 'dataApp'))
+    from visor_io import save_data
+    dir_visor = os.path.join(root, INSTANCE, DOMAIN, 'visor')
+    rng    = np.random.default_rng(0)
+    values = rng.gamma(0.3, 5.0, size=(nt, nv, 1, ny, nx)).astype(np.float32)
+    values[values < 1] = 0
+    save_data(dir_visor, VARIABLE, values, attrs={'dt': 15}, compress='float16')
+
+
+def worker(mode, root, requests):
+    sys.path.insert(0, BASE_DIR)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'dj_apiMap.settings')
+    import django
+    django.setup()
+    from django.conf import settings
+    from django.http import JsonResponse
+    from django.test import Client
+    import provider.views as views
+    from provider.storage import find_cube, load_cube
+    settings.ALLOWED_HOSTS = ['*']
+    views.dir_root = root
+
+    url = f'/api/datajson/?domain={DOMAIN}&instance={INSTANCE}&variable={VARIABLE}'
+    cube = load_cube(find_cube(os.path.join(root, INSTANCE, DOMAIN, 'visor'), VARIABLE))
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    client = Client()
+    nbytes = 0
+    start  = time.perf_counter()
+    for _ in range(requests):
+        if mode == 'legacy':
+            header = {key: cube[key] for key in ('nt', 'nv', 'nz', 'ny', 'nx', 'attrs', 'compress')}
+            body   = JsonResponse({"header": header, "values": cube["values"].flatten().tolist()}, safe=False).content
+            nbytes += len(body)
+            del body
+        else:
+            response = client.get(url)
+            for chunk in response.streaming_content:
+                nbytes += len(chunk)
+    elapsed = time.perf_counter() - start
+
+    print(json.dumps({
+        "mode"        : mode,
+        "seconds"     : elapsed / requests,
+        "mb_per_s"    : nbytes / elapsed / 1e6,
+        "body_mb"     : nbytes / requests / 1e6,
+        "rss_base_mb" : rss_before / 1024,
+        "rss_peak_mb" : resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--nt', type=int, default=96)
+    parser.add_argument('--nv', type=int, default=20)
+    parser.add_argument('--ny', type=int, default=150)
+    parser.add_argument('--nx', type=int, default=150)
+    parser.add_argument('--requests', type=int, default=3)
+    parser.add_argument('--worker', choices=['legacy', 'stream'])
+    parser.add_argument('--root')
+    args = parser.parse_args()
+
+    if args.worker:
+        worker(args.worker, args.root, args.requests)
+        return
+
+    root = tempfile.mkdtemp(prefix='bench_datajson_')
+    try:
+        make_instance(root, args.nt, args.nv, args.ny, args.nx)
+        print(f"cubo ({args.nt}, {args.nv}, 1, {args.ny}, {args.nx}) float16, {args.requests} requests por modo")
+        print(f"{'modo':8} {'s/req':>8} {'MB/s':>8} {'MB cuerpo':>10} {'RSS base MB':>12} {'RSS peak MB':>12}")
+        for mode in ('legacy', 'stream'):
+            out = subprocess.run(
+                [sys.executable, __file__, '--worker', mode, '--root', root, '--requests', str(args.requests)],
+                check=True, capture_output=True, text=True,
+            ).stdout.strip().splitlines()[-1]
+            r = json.loads(out)
+            print(f"{r['mode']:8} {r['seconds']:8.3f} {r['mb_per_s']:8.1f} {r['body_mb']:10.1f} {r['rss_base_mb']:12.1f} {r['rss_peak_mb']:12.1f}")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""
+Regrillado del viento WRF a la grilla ld del visor: RegularGridInterpolator paso a paso (como lo hacia
+dataApp/trigger.py, rotando el viento para cada componente) contra los pesos bilineales precalculados
+de dataApp/regrid.py (una rotacion y un producto matricial para u10 y v10 en todos los tiempos).
+
+Uso:
+    python benchmarks/bench_regrid.py --nt 97 --ny 120 --nx 150 --target 180,200
+"""
+import os
+import sys
+import time
+import argparse
+import numpy as np
+from scipy.interpolate import RegularGridInterpolator
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(BASE_DIR, 'dataApp'))
+from regrid import bilinear_weights, regrid, earth_relative
+
+
+def interpolator_loop(U10, V10, COSALPHA, SINALPHA, y0, dy, x0, dx, YY, XX):
+    """Implementacion anterior: rotacion y un RegularGridInterpolator por componente y paso de tiempo."""
+    nt, ny, nx = U10.shape
+    result = []
+    for component in range(2):
+        U10_earth, V10_earth = earth_relative(U10, V10, COSALPHA, SINALPHA)
+        field  = (U10_earth, V10_earth)[component]
+        values = np.zeros((nt,) + YY.shape, dtype=np.float32)
+        for t in range(nt):
+            interpolator = RegularGridInterpolator(
+                (np.arange(ny) * dy + y0, np.arange(nx) * dx + x0), field[t], bounds_error=False, fill_value=0,
+            )
+            values[t] = interpolator((YY.ravel(), XX.ravel())).reshape(YY.shape)
+        result.append(values)
+    return result
+
+
+def weights_product(U10, V10, COSALPHA, SINALPHA, y0, dy, x0, dx, YY, XX):
+    nt, ny, nx = U10.shape
+    weights = bilinear_weights(y0, dy, ny, x0, dx, nx, YY, XX)
+    return regrid(weights, YY.shape, *earth_relative(U10, V10, COSALPHA, SINALPHA))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--nt', type=int, default=97)
+    parser.add_argument('--ny', type=int, default=120)
+    parser.add_argument('--nx', type=int, default=150)
+    parser.add_argument('--target', default='180,200', help='ny,nx de la grilla destino')
+    args = parser.parse_args()
+
+    rng    = np.random.default_rng(0)
+    shape  = (args.nt, args.ny, args.nx)
+    U10    = rng.normal(0, 4, size=shape).astype(np.float32)
+    V10    = rng.normal(0, 4, size=shape).astype(np.float32)
+    alpha  = rng.uniform(-0.3, 0.3, size=shape).astype(np.float32)
+    dx = dy = 3000.0
+    x0, y0 = -args.nx * dx / 2, -args.ny * dy / 2
+    tny, tnx = (int(n) for n in args.target.split(','))
+    ## Grilla destino algo mas grande que la WRF: parte de los puntos cae fuera (valor 0)
+    XX, YY = np.meshgrid(np.linspace(x0 - 5 * dx, x0 + args.nx * dx, tnx), np.linspace(y0 - 5 * dy, y0 + args.ny * dy, tny))
+    inputs = (U10, V10, np.cos(alpha), np.sin(alpha), y0, dy, x0, dx, YY, XX)
+
+    results = {}
+    for name, func in (('interpolador', interpolator_loop), ('pesos', weights_product)):
+        start = time.perf_counter()
+        results[name] = func(*inputs)
+        results[name + '_s'] = time.perf_counter() - start
+    error = max(float(np.abs(a - b).max()) for a, b in zip(results['interpolador'], results['pesos']))
+    print(f"WRF {shape} -> {YY.shape}: interpolador {results['interpolador_s']:.2f} s, "
+          f"pesos {results['pesos_s']:.3f} s ({results['interpolador_s'] / results['pesos_s']:.0f}x), error max {error:.2g}")
+
+
+if __name__ == '__main__':
+    main()
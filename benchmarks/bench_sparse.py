@@ -0,0 +1,92 @@
+"""
+Tamaño y velocidad de decodificacion del formato disperso (sparse.bin) contra el denso float16 (values.bin).
+
+Los frames son plumas gaussianas sinteticas por fuente (una direccion de viento que rota en el tiempo),
+con la mayor parte de la grilla bajo el piso. Para medir sobre una corrida real, pasar el header.json
+de una variable raw publicada con --header (se re-codifica con cada piso).
+
+Uso:
+    python benchmarks/bench_sparse.py --nt 96 --nv 20 --ny 150 --nx 150 --floors 0,0.05,0.5
+    python benchmarks/bench_sparse.py --header dataApp/2025-07-24_00/antucoya/visor/mp10_hd_species/header.json
+"""
+import os
+import sys
+import gzip
+import json
+import time
+import argparse
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+sys.path.insert(0, os.path.join(BASE_DIR, 'dataApp'))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'dj_apiMap.settings')
+from visor_io import sparse_encode
+from provider.storage import sparse_decode
+
+
+def plumes(nt, nv, ny, nx, seed=0):
+    """Cubo (nt,nv,1,ny,nx) float16: una pluma por fuente, que gira con el viento."""
+    rng    = np.random.default_rng(seed)
+    jj, ii = np.mgrid[0:ny, 0:nx].astype(np.float32)
+    values = np.zeros((nt, nv, 1, ny, nx), dtype=np.float16)
+    source = rng.uniform(0.3, 0.7, size=(nv, 2)) * (ny, nx)
+    rate   = rng.lognormal(3, 1, size=nv)
+    for t in range(nt):
+        angle = 2 * np.pi * t / nt
+        for v in range(nv):
+            dy, dx = jj - source[v, 0], ii - source[v, 1]
+            along  = dx * np.cos(angle) + dy * np.sin(angle)
+            cross  = -dx * np.sin(angle) + dy * np.cos(angle)
+            sigma  = 1 + 0.15 * np.maximum(along, 0)
+            plume  = rate[v] / sigma * np.exp(-0.5 * (cross / sigma) ** 2) * (along > 0)
+            values[t, v, 0] = plume
+    return values
+
+
+def timed(func, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        start  = time.perf_counter()
+        result = func()
+        best   = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--nt', type=int, default=96)
+    parser.add_argument('--nv', type=int, default=20)
+    parser.add_argument('--ny', type=int, default=150)
+    parser.add_argument('--nx', type=int, default=150)
+    parser.add_argument('--floors', default='0,0.05,0.5')
+    parser.add_argument('--header', help='header.json de una variable raw densa publicada')
+    args = parser.parse_args()
+
+    if args.header:
+        with open(args.header) as f:
+            header = json.load(f)
+        shape  = (header["nt"], header["nv"], header["nz"], header["ny"], header["nx"])
+        values = np.fromfile(os.path.join(os.path.dirname(args.header), 'values.bin'), dtype=header["dtype"]).reshape(shape)
+        source = args.header
+    else:
+        values = plumes(args.nt, args.nv, args.ny, args.nx)
+        source = 'plumas sinteticas'
+    dense = values.tobytes()
+
+    dense_s, _ = timed(lambda: np.frombuffer(dense, dtype=values.dtype).reshape(values.shape).copy())
+    print(f"{source}: cubo {values.shape} {values.dtype}, celdas > 0: {np.count_nonzero(values) / values.size:.1%}")
+    print(f"{'formato':16} {'MB':>8} {'MB gzip':>8} {'x denso':>8} {'decodif. ms':>12} {'error max':>10}")
+    gz = len(gzip.compress(dense, 6))
+    print(f"{'denso':16} {len(dense) / 1e6:8.2f} {gz / 1e6:8.2f} {1:8.1f} {dense_s * 1000:12.1f} {0:10.3g}")
+    for floor in [float(x) for x in args.floors.split(',')]:
+        encode_s, (data, layout) = timed(lambda: sparse_encode(values, floor), repeat=1)
+        decode_s, decoded = timed(lambda: sparse_decode(data, layout, values.shape, values.dtype))
+        error = float(np.abs(decoded.astype(np.float32) - values.astype(np.float32)).max())
+        gz = len(gzip.compress(data, 6))
+        print(f"{f'disperso > {floor:g}':16} {len(data) / 1e6:8.2f} {gz / 1e6:8.2f} {len(dense) / len(data):8.1f} "
+              f"{decode_s * 1000:12.1f} {error:10.3g}   (codificar {encode_s:.2f} s)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""
+Memoria maxima (RSS) al armar y publicar un cubo de concentraciones de muchas fuentes: el cubo denso
+float32 con zoom sobre todo el cubo (como lo hacia dataApp/trigger.py) contra el armado fuente a fuente
+por bloques de tiempo (regrid.zoom_blocks) en un visor_io.DiskCube, publicado por bloques de fuentes.
+Cada modo corre en un proceso aparte; las fuentes son campos sinteticos (nt,ny,nx) generados al leerlas.
+
+Uso:
+    python benchmarks/bench_species_memory.py --nt 24 --nv 40 --ny 150 --nx 160 --budget-mb 128
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import resource
+import tempfile
+import subprocess
+import numpy as np
+from scipy.ndimage import zoom
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(BASE_DIR, 'dataApp'))
+from visor_io import save_data, DiskCube
+from regrid import zoom_shape, zoom_blocks
+
+FACTORS = (4, 1.3, 1.3)
+
+
+def source(v, nt, ny, nx):
+    return np.random.default_rng(v).random((nt, ny, nx), dtype=np.float32) * 1e-3
+
+
+def dense(args, dir_visor):
+    """Implementacion anterior: cubo (nt,nv,ny,nx) completo y zoom sobre todo el cubo."""
+    values = np.zeros((args.nt, args.nv, args.ny, args.nx), dtype=np.float32)
+    for v in range(args.nv):
+        values[:, v] = source(v, args.nt, args.ny, args.nx)
+    values = zoom(values * 1000*365*0.25, (FACTORS[0], 1) + FACTORS[1:], order=1)
+    save_data(dir_visor, 'species', np.expand_dims(values, axis=2), {}, compress='float16', lod_levels=2)
+
+
+def streamed(args, dir_visor):
+    shape  = (args.nt, args.ny, args.nx)
+    nt, ny, nx = zoom_shape(shape, FACTORS)
+    budget = args.budget_mb * 1024**2
+    values = DiskCube(os.path.join(dir_visor, '.species.cube'), (nt, args.nv, 1, ny, nx), budget=budget // 2)
+    steps  = max(1, budget // (16 * 4 * ny * nx))
+    for v in range(args.nv):
+        read = lambda j0, j1: source(v, *shape)[j0:j1] * 1000*365*0.25
+        for i0, i1, block in zoom_blocks(read, shape, FACTORS, steps):
+            values[i0:i1, v] = block[:, np.newaxis]
+    save_data(dir_visor, 'species', values, {}, compress='float16', lod_levels=2)
+    values.remove()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--nt', type=int, default=24)
+    parser.add_argument('--nv', type=int, default=40)
+    parser.add_argument('--ny', type=int, default=150)
+    parser.add_argument('--nx', type=int, default=160)
+    parser.add_argument('--budget-mb', type=int, default=128)
+    parser.add_argument('--mode', choices=('denso', 'bloques'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        dir_visor = tempfile.mkdtemp()
+        start = time.perf_counter()
+        (dense if args.mode == 'denso' else streamed)(args, dir_visor)
+        seconds = time.perf_counter() - start
+        shutil.rmtree(dir_visor)
+        print(f"{seconds:.1f} {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f}")
+        return
+
+    nt, ny, nx = zoom_shape((args.nt, args.ny, args.nx), FACTORS)
+    print(f"{args.nv} fuentes {(args.nt, args.ny, args.nx)} -> cubo {(nt, args.nv, 1, ny, nx)} float32 "
+          f"{4 * nt * args.nv * ny * nx / 1024**2:.0f} MB, presupuesto {args.budget_mb} MB")
+    for mode in ('denso', 'bloques'):
+        output = subprocess.run([sys.executable, __file__, '--mode', mode] + sys.argv[1:],
+                                check=True, capture_output=True, text=True).stdout.split('\n')
+        seconds, rss = output[-2].split()
+        print(f"{mode:8} {float(seconds):6.1f} s   RSS maximo {rss:>6} MB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,239 @@
+"""
+Suite de benchmarks de la API sobre una instancia sintetica (ver synthetic.py).
+
+Para cada endpoint, en un subproceso propio (peak RSS comparable entre endpoints):
+    1. una request en frio (cache del proceso vacia),
+    2. --requests requests secuenciales con el cliente de pruebas de Django: latencia p50/p99,
+    3. --concurrent requests repartidas en --concurrency threads: req/s y MB/s,
+y reporta bytes por request y peak RSS. Todo es offline (sin red ni servidor).
+
+Los resultados se guardan como linea base con --save y se comparan con --compare: un endpoint
+con p50 o RSS mayor, o throughput menor, en mas de --tolerance respecto de la base es una regresion
+(codigo de salida 1). baselines/main.json es la corrida de referencia con la configuracion por defecto
+(su "config" y "machine" dicen donde se midio; en otra maquina conviene guardar una base propia).
+
+Uso:
+    python benchmarks/bench_suite.py --save main
+    python benchmarks/bench_suite.py --compare main --only data,datajson
+    python benchmarks/bench_suite.py --nt 24 --nv 4 --ny 60 --nx 60 --format npz
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import resource
+import tempfile
+import threading
+import subprocess
+import contextlib
+import numpy as np
+
+from synthetic import make_tree, add_arguments, tree_config, instance_names, DOMAIN, SPECIES
+
+BASE_DIR      = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINES_DIR = os.path.join(BASE_DIR, 'benchmarks', 'baselines')
+
+
+def endpoints(instances):
+    """(nombre, url, headers) de cada endpoint, con parametros que existen en el arbol sintetico."""
+    instance = instances[0]
+    base     = f'domain={DOMAIN}&instance={instance}'
+    cube     = f'{base}&variable={SPECIES}_hd_species'
+    return [
+        ('context'     , '/api/context/', {}),
+        ('instances'   , f'/api/instances/?domain={DOMAIN}', {}),
+        ('variables'   , f'/api/variables/?{base}', {}),
+        ('catalog'     , f'/api/catalog/?{base}', {}),
+        ('places'      , f'/api/places/?{base}', {}),
+        ('sources'     , f'/api/sources/?{base}&species={SPECIES}', {}),
+        ('data'        , f'/api/data/?{cube}', {}),
+        ('data_gzip'   , f'/api/data/?{cube}', {'HTTP_ACCEPT_ENCODING': 'gzip'}),
+        ('data_slab'   , f'/api/data/?{cube}&t0=0&t1=4&v=0,1&level=0', {}),
+        ('data_304'    , f'/api/data/?{cube}', {'etag': True}),
+        ('datajson'    , f'/api/datajson/?{cube}', {}),
+        ('aggregate'   , f'/api/aggregate/?{cube}', {}),
+        ('series'      , f'/api/series/?{cube}&lon=-69.7,-69.6&lat=-22.5,-22.45', {}),
+        ('bundle'      , f'/api/bundle/?{cube}&sources=true', {}),
+        ('stats'       , f'/api/stats/?{cube}&p=50,90', {}),
+        ('receptors'   , f'/api/receptors/?{cube}', {}),
+        ('ensemble'    , f'/api/ensemble/?domain={DOMAIN}&variable={SPECIES}_hd_species&instances={",".join(instances[:2])}&op=mean', {}),
+        ('cache'       , '/api/cache/', {}),
+        ('metrics'     , '/metrics', {}),
+    ]
+
+
+def fetch(client, url, headers):
+    """Hace la request y consume el cuerpo completo. Retorna (status, bytes del cuerpo)."""
+    response = client.get(url, **headers)
+    if response.streaming:
+        nbytes = sum(len(chunk) for chunk in response.streaming_content)
+    else:
+        nbytes = len(response.content)
+    response.close()
+    return response.status_code, nbytes
+
+
+def percentile(samples, q):
+    return float(np.percentile(samples, q)) if samples else float('nan')
+
+
+def peak_rss_mb():
+    """
+    Peak RSS del proceso (MB). En Linux ru_maxrss se hereda a traves de fork+exec (el worker reportaria
+    el pico del proceso padre, que genero el arbol): se usa VmHWM, que es propio del proceso.
+    """
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def worker(name, root, args):
+    sys.path.insert(0, BASE_DIR)
+    os.environ['PROVIDER_DATA_DIR'] = root
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'dj_apiMap.settings')
+    import django
+    django.setup()
+    from django.conf import settings
+    from django.test import Client
+    settings.ALLOWED_HOSTS = ['*']
+
+    _, url, headers = next(item for item in endpoints(instance_names(args.instances, args.nt)) if item[0] == name)
+    if headers.pop('etag', False):
+        headers = {**headers, 'HTTP_IF_NONE_MATCH': Client().get(url)['ETag']}
+
+    client = Client()
+    start  = time.perf_counter()
+    status, nbytes = fetch(client, url, headers)
+    cold = time.perf_counter() - start
+
+    latencies = []
+    for _ in range(args.requests):
+        start = time.perf_counter()
+        fetch(client, url, headers)
+        latencies.append(time.perf_counter() - start)
+
+    ## Carga concurrente: cada thread con su cliente, todos contra el mismo proceso
+    counter = iter(range(args.concurrent))
+    lock    = threading.Lock()
+    sent    = []
+    def load():
+        local = Client()
+        while True:
+            with lock:
+                if next(counter, None) is None:
+                    return
+            sent.append(fetch(local, url, headers)[1])
+    threads = [threading.Thread(target=load) for _ in range(args.concurrency)]
+    start   = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    print(json.dumps({
+        "endpoint"   : name,
+        "status"     : status,
+        "cold_ms"    : cold * 1000,
+        "p50_ms"     : percentile(latencies, 50) * 1000,
+        "p99_ms"     : percentile(latencies, 99) * 1000,
+        "req_s"      : len(sent) / elapsed if elapsed else float('nan'),
+        "mb_s"       : sum(sent) / elapsed / 1e6 if elapsed else float('nan'),
+        "kb_req"     : nbytes / 1024,
+        "rss_peak_mb": peak_rss_mb(),
+    }))
+
+
+def compare(results, baseline, tolerance):
+    """Lista de regresiones (endpoint, metrica, base, actual) respecto de la linea base."""
+    base = {r["endpoint"]: r for r in baseline["results"]}
+    regressions = []
+    for r in results:
+        b = base.get(r["endpoint"])
+        if b is None:
+            continue
+        for metric, worse in (("p50_ms", 1), ("rss_peak_mb", 1), ("req_s", -1)):
+            if worse > 0 and r[metric] > b[metric] * (1 + tolerance):
+                regressions.append((r["endpoint"], metric, b[metric], r[metric]))
+            elif worse < 0 and r[metric] < b[metric] / (1 + tolerance):
+                regressions.append((r["endpoint"], metric, b[metric], r[metric]))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_arguments(parser)
+    parser.add_argument('--requests', type=int, default=20, help='requests secuenciales por endpoint')
+    parser.add_argument('--concurrent', type=int, default=40, help='requests de la fase concurrente')
+    parser.add_argument('--concurrency', type=int, default=8, help='threads de la fase concurrente')
+    parser.add_argument('--only', help='endpoints separados por coma')
+    parser.add_argument('--root', help='arbol ya generado (por defecto uno temporal)')
+    parser.add_argument('--save', metavar='NAME', help=f'guardar la linea base en {BASELINES_DIR}/NAME.json')
+    parser.add_argument('--compare', metavar='NAME', help='comparar con una linea base guardada')
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    parser.add_argument('--worker')
+    args = parser.parse_args()
+
+    if args.worker:
+        worker(args.worker, args.root, args)
+        return
+
+    names = [name for name, _, _ in endpoints(instance_names(args.instances, args.nt))]
+    if args.only:
+        names = [name for name in names if name in args.only.split(',')]
+
+    root = args.root or tempfile.mkdtemp(prefix='bench_suite_')
+    try:
+        if not args.root:
+            with contextlib.redirect_stdout(open(os.devnull, 'w')):
+                make_tree(root, **tree_config(args))
+        config = tree_config(args)
+        print(f"arbol {config}, {args.requests} secuenciales, {args.concurrent} concurrentes en {args.concurrency} threads")
+        print(f"{'endpoint':12} {'status':>6} {'frio ms':>8} {'p50 ms':>8} {'p99 ms':>8} {'req/s':>8} {'MB/s':>8} {'KB/req':>10} {'RSS MB':>8}")
+        results = []
+        for name in names:
+            command = [sys.executable, os.path.abspath(__file__), '--worker', name, '--root', root]
+            for key in ('nt', 'nv', 'ny', 'nx', 'dtype', 'instances', 'requests', 'concurrent', 'concurrency'):
+                command += [f'--{key}', str(getattr(args, key))]
+            out = subprocess.run(command, check=True, capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+            r = json.loads(out.stdout.strip().splitlines()[-1])
+            results.append(r)
+            print(f"{r['endpoint']:12} {r['status']:6d} {r['cold_ms']:8.1f} {r['p50_ms']:8.2f} {r['p99_ms']:8.2f} "
+                  f"{r['req_s']:8.1f} {r['mb_s']:8.1f} {r['kb_req']:10.1f} {r['rss_peak_mb']:8.1f}")
+    finally:
+        if not args.root:
+            shutil.rmtree(root, ignore_errors=True)
+
+    report = {
+        "config" : {**config, "requests": args.requests, "concurrent": args.concurrent, "concurrency": args.concurrency},
+        "machine": {"python": platform.python_version(), "numpy": np.__version__, "platform": platform.platform(), "cpus": os.cpu_count()},
+        "results": results,
+    }
+    if args.save:
+        os.makedirs(BASELINES_DIR, exist_ok=True)
+        with open(os.path.join(BASELINES_DIR, f'{args.save}.json'), 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"linea base guardada: {args.save}")
+    if args.compare:
+        with open(os.path.join(BASELINES_DIR, f'{args.compare}.json')) as f:
+            baseline = json.load(f)
+        if baseline["config"] != report["config"] or baseline["machine"] != report["machine"]:
+            print("[WARN] la linea base se midio con otra configuracion o en otra maquina")
+        regressions = compare(results, baseline, args.tolerance)
+        for endpoint, metric, before, after in regressions:
+            print(f"[REGRESION] {endpoint} {metric}: {before:.2f} -> {after:.2f}")
+        if regressions:
+            sys.exit(1)
+        print(f"sin regresiones respecto de {args.compare} (tolerancia {args.tolerance:.0%})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+"""
+Generador de instancias sinteticas con la misma estructura que publica dataApp/trigger.py:
+
+    <root>/<instance>/<domain>/visor/<variable>/(values.bin + header.json | data.npz)
+    <root>/<instance>/<domain>/visor/<species>.geojson, places.geojson
+    <root>/<instance>/READY
+
+Por instancia y dominio: grilla hd (lon/lat + concentraciones por fuente, float16) y grilla ld
+(lon/lat + viento u10/v10). Los valores son reproducibles (semilla fija).
+
+Uso:
+    python benchmarks/synthetic.py /tmp/bench_root --nt 96 --nv 20 --ny 150 --nx 150 --format npz
+"""
+import os
+import sys
+import json
+import argparse
+from datetime import datetime, timedelta
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(BASE_DIR, 'dataApp'))
+from visor_io import save_data
+
+SPECIES  = 'mp10'
+DOMAIN   = 'antucoya'
+START    = datetime(2025, 1, 1, 0)
+DT       = 15                      # minutos entre pasos de tiempo
+CENTER   = (-69.7, -22.5)
+PLACES   = {
+    'Receptor 1': (-69.80, -22.60),
+    'Receptor 2': (-69.65, -22.45),
+    'Receptor 3': (-69.55, -22.40),
+}
+PROJECTS = ('A', 'B', 'C')
+
+
+def instance_names(n, nt):
+    """Corridas separadas por la mitad de su duracion (en horas), asi /api/ensemble/ tiene tiempos validos comunes."""
+    spacing = timedelta(hours=max(1, nt * DT // 60 // 2))
+    return [(START + k * spacing).strftime('%Y-%m-%d_%H') for k in range(n)]
+
+
+def grid(ny, nx, step):
+    lon = CENTER[0] + (np.arange(nx) - (nx - 1) / 2) * step
+    lat = CENTER[1] + (np.arange(ny) - (ny - 1) / 2) * step
+    return np.meshgrid(lon, lat)
+
+
+def make_domain(dir_visor, seed, nt, nv, ny, nx, dtype, storage_format, precompress):
+    rng  = np.random.default_rng(seed)
+    save = lambda variable, values, attrs, compress='float32': save_data(
+        dir_visor, variable, values, attrs=attrs, compress=compress, storage_format=storage_format,
+        precompress=precompress if storage_format == 'raw' else ())
+    attrs = {
+        'dt'    : DT,
+        'coordx': f'{SPECIES}_hd_lat',      # mismo cruce de nombres que trigger.py: coordx guarda longitudes
+        'coordy': f'{SPECIES}_hd_lon',
+        'windx' : f'{SPECIES}_ld_u10',
+        'windy' : f'{SPECIES}_ld_v10',
+    }
+
+    lon, lat = grid(ny, nx, 0.01)
+    save(attrs['coordx'], lon[None, None, None], {**attrs, 'human_name': 'Longitud', 'unit': 'deg'})
+    save(attrs['coordy'], lat[None, None, None], {**attrs, 'human_name': 'Latitud', 'unit': 'deg'})
+    values = rng.gamma(0.3, 5.0, size=(nt, nv, 1, ny, nx)).astype(np.float32)
+    values[values < 1] = 0
+    save(f'{SPECIES}_hd_species', values, {
+        **attrs,
+        'human_name': 'Concentracion MP10',
+        'unit'      : 'ug/m3',
+        'vmin'      : float(values.min()),
+        'vmax'      : float(values.max()),
+        'thresholds': [0.5, 1, 2, 5, 10, 20, 30, 40, 50, 75, 100],
+    }, compress=dtype)
+    del values
+
+    nyl, nxl = max(ny // 2, 2), max(nx // 2, 2)
+    lon, lat = grid(nyl, nxl, 0.02)
+    attrs_ld = {**attrs, 'coordx': f'{SPECIES}_ld_lat', 'coordy': f'{SPECIES}_ld_lon'}
+    save(attrs_ld['coordx'], lon[None, None, None], {**attrs_ld, 'human_name': 'Longitud', 'unit': 'deg'})
+    save(attrs_ld['coordy'], lat[None, None, None], {**attrs_ld, 'human_name': 'Latitud', 'unit': 'deg'})
+    for name in ('u10', 'v10'):
+        wind = rng.normal(0, 4, size=(nt, 1, 1, nyl, nxl)).astype(np.float32)
+        save(f'{SPECIES}_ld_{name}', wind, {**attrs_ld, 'human_name': name, 'unit': 'm/s'}, compress='float16')
+
+    features = []
+    for v in range(nv):
+        features.append({
+            'type'      : 'Feature',
+            'geometry'  : {'type': 'Point', 'coordinates': [float(rng.uniform(-69.8, -69.6)), float(rng.uniform(-22.6, -22.4))]},
+            'properties': {'id_inner': v, 'name_file': f'source_{v:03d}', 'project': PROJECTS[v % len(PROJECTS)]},
+        })
+    with open(os.path.join(dir_visor, f'{SPECIES}.geojson'), 'w') as f:
+        json.dump({'type': 'FeatureCollection', 'features': features}, f)
+    with open(os.path.join(dir_visor, 'places.geojson'), 'w') as f:
+        json.dump({'type': 'FeatureCollection', 'features': [
+            {'type': 'Feature', 'geometry': {'type': 'Point', 'coordinates': list(point)}, 'properties': {'name': name}}
+            for name, point in PLACES.items()
+        ]}, f)
+
+
+def make_tree(root, nt=96, nv=20, ny=150, nx=150, dtype='float16', storage_format='raw', precompress=('gzip',),
+              instances=2, domains=(DOMAIN,)):
+    """Crea `instances` corridas READY en root. Retorna la lista de instancias."""
+    names = instance_names(instances, nt)
+    for k, instance in enumerate(names):
+        for d, domain in enumerate(domains):
+            dir_visor = os.path.join(root, instance, domain, 'visor')
+            os.makedirs(dir_visor, exist_ok=True)
+            make_domain(dir_visor, 1000 * k + d, nt, nv, ny, nx, dtype, storage_format, precompress)
+        open(os.path.join(root, instance, 'READY'), 'w').close()
+    return names
+
+
+def add_arguments(parser):
+    parser.add_argument('--nt', type=int, default=96)
+    parser.add_argument('--nv', type=int, default=20)
+    parser.add_argument('--ny', type=int, default=150)
+    parser.add_argument('--nx', type=int, default=150)
+    parser.add_argument('--dtype', choices=['float16', 'float32', 'uint8'], default='float16')
+    parser.add_argument('--format', dest='storage_format', choices=['raw', 'npz'], default='raw')
+    parser.add_argument('--precompress', type=lambda text: [c for c in text.split(',') if c], default=['gzip'],
+                        help="copias precomprimidas de values.bin, ej. 'gzip,br,zstd' ('' ninguna)")
+    parser.add_argument('--instances', type=int, default=2)
+
+
+def tree_config(args):
+    return {key: getattr(args, key) for key in ('nt', 'nv', 'ny', 'nx', 'dtype', 'storage_format', 'precompress', 'instances')}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('root')
+    add_arguments(parser)
+    args = parser.parse_args()
+    names = make_tree(args.root, **tree_config(args))
+    print(f"{len(names)} instancias en {args.root}: {', '.join(names)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,237 @@
+#################################################################################################
+## INGESTA PARALELA: POOL DE PROCESOS CON LIMITE DE MEMORIA
+#################################################################################################
+import os
+import json
+import time
+import hashlib
+import traceback
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+
+## Fraccion de la memoria disponible que pueden ocupar las tareas en curso (segun su estimacion)
+MEMORY_FRACTION = 0.7
+## Manifiesto de cada instancia: entradas y configuracion con que se genero cada salida
+MANIFEST = 'manifest.json'
+
+
+def available_memory():
+    """Bytes de memoria disponible (MemAvailable de /proc/meminfo; paginas libres si no existe)."""
+    try:
+        with open('/proc/meminfo') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_AVPHYS_PAGES')
+
+
+def timed_call(work, task):
+    """Ejecuta work(*task) y retorna (ok, segundos, error). Nunca lanza: el error viaja como texto."""
+    start = time.perf_counter()
+    try:
+        work(*task)
+        return True, time.perf_counter() - start, None
+    except Exception:
+        return False, time.perf_counter() - start, traceback.format_exc()
+
+
+def label(task):
+    return '/'.join(','.join(item) if isinstance(item, tuple) else str(item) for item in task)
+
+
+def run_tasks(tasks, work, workers=None, memory=None):
+    """
+    Ejecuta work(*task) para cada task en un pool de `workers` procesos.
+    tasks : [(task, bytes estimados)]; task es una tupla de argumentos picklables
+    memory: bytes que pueden sumar las estimaciones de las tareas en curso
+            (por defecto MEMORY_FRACTION de la memoria disponible). Una tarea que por si sola
+            excede el limite corre cuando no hay otra en curso.
+    Las tareas se lanzan de mayor a menor estimacion. workers=1 corre todo en este proceso.
+    Retorna {task: (ok, segundos, error)} e imprime el tiempo de cada tarea y el total.
+    """
+    workers = workers or os.cpu_count()
+    memory  = memory or int(available_memory() * MEMORY_FRACTION)
+    pending = sorted(tasks, key=lambda item: -item[1])
+    results = {}
+    start   = time.perf_counter()
+
+    def report(task, result):
+        results[task] = result
+        ok, seconds, error = result
+        if ok:
+            print(f"[OK] {label(task)} en {seconds:.1f} s")
+        else:
+            print(f"[ERROR] {label(task)} despues de {seconds:.1f} s\n{error}")
+
+    print(f"[INFO] {len(pending)} tareas, {workers} procesos, limite de memoria {memory / 1024**3:.1f} GiB")
+    if workers == 1:
+        for task, _ in pending:
+            report(task, timed_call(work, task))
+    else:
+        running = {}      # future -> (task, bytes estimados)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            while pending or running:
+                in_use = sum(estimate for _, estimate in running.values())
+                for item in list(pending):
+                    if len(running) >= workers:
+                        break
+                    task, estimate = item
+                    if running and in_use + estimate > memory:
+                        continue
+                    pending.remove(item)
+                    running[pool.submit(timed_call, work, task)] = item
+                    in_use += estimate
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                broken = False
+                for future in done:
+                    task, _ = running.pop(future)
+                    try:
+                        report(task, future.result())
+                    except BrokenProcessPool:
+                        ## Un proceso murio (ej. sin memoria): el pool queda inutilizable
+                        report(task, (False, 0.0, "El proceso de la tarea termino inesperadamente"))
+                        broken = True
+                if broken:
+                    for task, _ in list(running.values()) + pending:
+                        report(task, (False, 0.0, "Pool de procesos interrumpido"))
+                    running, pending = {}, []
+
+    failed = sum(1 for ok, _, _ in results.values() if not ok)
+    print(f"[INFO] {len(results) - failed}/{len(results)} tareas correctas, "
+          f"{sum(seconds for _, seconds, _ in results.values()):.1f} s de trabajo en {time.perf_counter() - start:.1f} s")
+    return results
+
+
+def clear_ready(instances):
+    """Quita READY de las instancias que se van a reescribir (el visor las deja de tratar como inmutables)."""
+    for instance in instances:
+        flag_path = os.path.join(instance, 'READY')
+        if os.path.exists(flag_path):
+            os.remove(flag_path)
+
+
+def mark_ready(instances, results):
+    """
+    Escribe <instance>/READY solo para las instancias cuyas tareas terminaron todas bien
+    (la primera componente de cada task es la instancia). Retorna las instancias marcadas.
+    Una instancia sin tareas (todo al dia) conserva su READY sin tocarlo: reescribirlo cambia su mtime,
+    que es la generacion de la instancia para el catalogo y las URLs inmutables del visor.
+    """
+    ready = []
+    for instance in instances:
+        outcome = [ok for task, (ok, _, _) in results.items() if task[0] == instance]
+        flag_path = os.path.join(instance, 'READY')
+        if not outcome and os.path.exists(flag_path):
+            continue
+        if all(outcome):
+            with open(flag_path, 'w') as f:
+                f.write('')
+            ready.append(instance)
+        else:
+            print(f"[ALERT] {instance} no se marca READY ({outcome.count(False)} tareas con error)")
+    return ready
+
+
+#################################################################################################
+## MANIFIESTO: INGESTA INCREMENTAL
+#################################################################################################
+##  <instance>/manifest.json = {"outputs": {clave: {"inputs": {archivo: firma}, "config": hash}}}
+##  clave: task sin la instancia (ej. "antucoya/mp10/hd"). Una salida esta al dia si sus entradas,
+##  la configuracion del pipeline y sus directorios de salida no cambiaron desde que se genero.
+
+def load_manifest(instance):
+    path = os.path.join(instance, MANIFEST)
+    if not os.path.exists(path):
+        return {"outputs": {}}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_manifest(instance, manifest):
+    """Escritura atomica (tmp + rename): un corte a mitad no deja un manifiesto corrupto."""
+    path = os.path.join(instance, MANIFEST)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(path + '.tmp', path)
+
+
+def file_signature(path, checksum=False):
+    """[bytes, mtime_ns] del archivo, o [bytes, blake2b del contenido] con checksum."""
+    stat = os.stat(path)
+    if not checksum:
+        return [stat.st_size, stat.st_mtime_ns]
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return [stat.st_size, digest.hexdigest()]
+
+
+def config_hash(config):
+    text = json.dumps(config, sort_keys=True, default=str)
+    return hashlib.sha256(text.encode()).hexdigest()[:16]
+
+
+def fingerprint(inputs, config, checksum=False):
+    """Huella de una salida: firma de cada archivo de entrada y hash de la configuracion."""
+    return {
+        "inputs": {path: file_signature(path, checksum) for path in sorted(inputs)},
+        "config": config_hash(config),
+    }
+
+
+def task_key(task):
+    return label(task[1:])
+
+
+def stale_reason(manifest, task, entry, outputs, force=False):
+    """Motivo para regenerar la salida de task, o None si esta al dia."""
+    if force:
+        return "--force"
+    previous = manifest["outputs"].get(task_key(task))
+    if previous is None:
+        return "nueva"
+    if previous["config"] != entry["config"]:
+        return "cambio la configuracion"
+    if previous["inputs"] != entry["inputs"]:
+        changed = sorted(set(previous["inputs"]) ^ set(entry["inputs"]) |
+                         {path for path in entry["inputs"] if previous["inputs"].get(path) != entry["inputs"][path]})
+        return f"cambiaron {len(changed)} entradas ({os.path.basename(changed[0])}{', ...' if len(changed) > 1 else ''})"
+    missing = [path for path in outputs if not os.path.exists(path)]
+    if missing:
+        return f"falta {missing[0]}"
+    return None
+
+
+def record(manifests, results, entries):
+    """
+    Registra en el manifiesto de cada instancia las salidas de las tareas terminadas sin error y lo guarda.
+    entries: {task: [(salida, fingerprint)]} (una tarea puede generar varias salidas).
+    """
+    updated = set()
+    for task, (ok, _, _) in results.items():
+        if ok and task in entries:
+            for output, entry in entries[task]:
+                manifests[output[0]]["outputs"][task_key(output)] = entry
+            updated.add(task[0])
+    for instance in updated:
+        save_manifest(instance, manifests[instance])
+
+
+def add_arguments(parser):
+    parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                        help='procesos en paralelo (1 = secuencial en este proceso)')
+    parser.add_argument('--memory-gb', type=float, default=None,
+                        help=f'memoria estimada maxima de las tareas en curso (por defecto {MEMORY_FRACTION:.0%} de la disponible)')
+    parser.add_argument('--force', action='store_true',
+                        help=f'regenerar todas las salidas aunque {MANIFEST} indique que estan al dia')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='solo reportar que se regeneraria y por que, sin escribir nada')
+    parser.add_argument('--checksum', action='store_true',
+                        help='comparar las entradas por contenido (blake2b) en vez de tamaño y mtime')
+
+
+def memory_bytes(args):
+    return int(args.memory_gb * 1024**3) if args.memory_gb else None
@@ -0,0 +1,83 @@
+#################################################################################################
+## REGRILLADO WRF -> GRILLA DEL VISOR CON PESOS BILINEALES PRECALCULADOS
+#################################################################################################
+import numpy as np
+from scipy.ndimage import zoom
+from scipy.sparse import csr_matrix
+
+## Pesos por (grilla WRF, grilla destino); se reutilizan entre variables y especies del proceso
+_weights = {}
+
+
+def bilinear_weights(y0, dy, ny, x0, dx, nx, YY, XX):
+    """
+    Matriz dispersa (npuntos, ny*nx) float32 que interpola bilinealmente un campo de la grilla
+    regular WRF (y0 + j*dy, x0 + i*dx) en los puntos (YY, XX) de la grilla destino.
+    Equivale a RegularGridInterpolator(method='linear', bounds_error=False, fill_value=0):
+    los puntos fuera de la grilla WRF quedan con fila vacia (valor 0).
+    """
+    fy = (np.ravel(YY) - y0) / dy
+    fx = (np.ravel(XX) - x0) / dx
+    inside = (fy >= 0) & (fy <= ny - 1) & (fx >= 0) & (fx <= nx - 1)
+    j0 = np.clip(np.floor(fy), 0, ny - 2).astype(np.int64)
+    i0 = np.clip(np.floor(fx), 0, nx - 2).astype(np.int64)
+    ty = (fy - j0).astype(np.float32)
+    tx = (fx - i0).astype(np.float32)
+
+    rows = np.repeat(np.flatnonzero(inside), 4)
+    cols = np.stack([j0 * nx + i0, j0 * nx + i0 + 1, (j0 + 1) * nx + i0, (j0 + 1) * nx + i0 + 1], axis=1)[inside].ravel()
+    data = np.stack([(1 - ty) * (1 - tx), (1 - ty) * tx, ty * (1 - tx), ty * tx], axis=1)[inside].ravel()
+    return csr_matrix((data, (rows, cols)), shape=(fy.size, ny * nx), dtype=np.float32)
+
+
+def cached_weights(y0, dy, ny, x0, dx, nx, YY, XX):
+    """bilinear_weights memorizado por grilla WRF y contenido de la grilla destino."""
+    YY = np.ascontiguousarray(YY)
+    XX = np.ascontiguousarray(XX)
+    key = (y0, dy, ny, x0, dx, nx, YY.shape, hash(YY.tobytes()), hash(XX.tobytes()))
+    if key not in _weights:
+        _weights[key] = bilinear_weights(y0, dy, ny, x0, dx, nx, YY, XX)
+    return _weights[key]
+
+
+def regrid(weights, shape, *fields):
+    """
+    Aplica los pesos a campos (nt, ny, nx) de la grilla WRF con un solo producto matricial
+    para todos los campos y pasos de tiempo. Retorna una lista de arreglos (nt, *shape) float32.
+    """
+    stacked = np.concatenate([np.asarray(field, dtype=np.float32).reshape(field.shape[0], -1) for field in fields])
+    result  = np.asarray(stacked @ weights.T)              # (sum nt, npuntos), filas contiguas
+    splits  = np.cumsum([field.shape[0] for field in fields])[:-1]
+    return [part.reshape((part.shape[0],) + tuple(shape)) for part in np.split(result, splits)]
+
+
+def earth_relative(U10, V10, COSALPHA, SINALPHA):
+    """Rota el viento de la grilla WRF (relativo a la grilla) a componentes este/norte."""
+    return U10 * COSALPHA - V10 * SINALPHA, U10 * SINALPHA + V10 * COSALPHA
+
+
+def zoom_shape(shape, factors):
+    """Forma de salida de scipy.ndimage.zoom(arreglo de forma shape, factors)."""
+    return tuple(int(round(n * factor)) for n, factor in zip(shape, factors))
+
+
+def zoom_blocks(read, shape, factors, steps):
+    """
+    zoom(campo, factors, order=1) de un campo (nt, ny, nx) por bloques de hasta `steps` pasos de salida,
+    sin tener el campo completo en memoria. read(j0, j1) retorna los pasos [j0:j1] del campo.
+    order=1 es separable: cada paso leido se escala en (ny, nx) con zoom y el tiempo se interpola
+    linealmente con las mismas coordenadas que zoom (grid_mode=False).
+    Genera (i0, i1, bloque float32 (i1 - i0, ny', nx')).
+    """
+    nt = shape[0]
+    nt_out = zoom_shape(shape, factors)[0]
+    coords = np.arange(nt_out) * ((nt - 1) / (nt_out - 1) if nt_out > 1 else 0.0)
+    lower  = np.minimum(np.floor(coords).astype(np.int64), nt - 1)
+    upper  = np.minimum(lower + 1, nt - 1)
+    weight = (coords - lower).astype(np.float32)[:, np.newaxis, np.newaxis]
+    for i0 in range(0, nt_out, steps):
+        i1 = min(i0 + steps, nt_out)
+        j0, j1 = lower[i0], upper[i1 - 1] + 1
+        frames = zoom(np.asarray(read(j0, j1), dtype=np.float32), (1,) + tuple(factors[1:]), order=1)
+        block  = frames[lower[i0:i1] - j0] * (1 - weight[i0:i1]) + frames[upper[i0:i1] - j0] * weight[i0:i1]
+        yield i0, i1, block
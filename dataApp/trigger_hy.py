@@ -1,12 +1,18 @@
 import os
 import json
+import argparse
+import traceback
+from functools import lru_cache
 import numpy as np
 import xarray as xr
 from pyproj import Proj, Transformer
 from scipy.ndimage import zoom
 from scipy.ndimage import gaussian_filter1d
-from scipy.interpolate import RegularGridInterpolator
 from geojson import Point, LineString, Polygon, Feature, FeatureCollection, dumps
+from visor_io import save_data, save_stats, link_data, DiskCube, STATS_DIR
+from regrid import cached_weights, regrid, earth_relative, zoom_shape, zoom_blocks
+from ingest import run_tasks, clear_ready, mark_ready, add_arguments, memory_bytes, label
+from ingest import load_manifest, fingerprint, stale_reason, record
 
 ## Load Instances
 dir_root = os.listdir('.')
@@ -15,6 +21,27 @@ instances = [i for i in dir_root if os.path.isdir(i) and i.startswith('20')]
 ## Antucoya
 domains = ['pelambres']
 
+## Formato de publicacion de cada variable: 'raw' (values.bin + header.json) o 'npz' (legado)
+storage_format = 'raw'
+## Copias precomprimidas de cada values.bin ('gzip', 'br', 'zstd'); DataAPI elige segun Accept-Encoding
+precompress = ('gzip', 'br', 'zstd')
+## Tipo de dato de las concentraciones: 'float16', 'float32' o cuantizado ('uint8', 'uint16')
+#   Cuantizado: quantization = {'per': 'frame'|'source', 'log': True|False} (ver visor_io.quantize)
+#   'uint8' + log por frame: 1/2 de los bytes de float16, error relativo <~2% sobre x + umbral_min/10
+compress_species     = 'float16'
+quantization_species = {'per': 'frame', 'log': True}
+## Guardar las concentraciones en formato disperso (sparse.bin) con este piso; None = denso
+#   Solo con storage_format='raw' y compress float16/float32. Las celdas <= piso se publican como 0
+sparse_floor_species = None
+## Niveles de la piramide de resolucion de cada variable (<variable>/lod<k>/, grilla reducida 2^k veces)
+#   Coordenadas, viento y concentraciones usan los mismos niveles; /api/data/ los sirve con lod=k o maxcells=N
+lod_levels = 2
+## Publicar <variable>/stats/ (max, media, percentiles, pasos sobre umbral) de cada concentracion
+publish_stats = True
+## Memoria (bytes) para armar y publicar cada cubo de concentraciones. El campo se lee por bloques de tiempo;
+#   si el cubo float32 no cabe se arma en disco (visor_io.DiskCube, en dir_visor) y se publica por bloques
+species_memory_bytes = 2 * 1024**3
+
 structure_template = {
     'grids':{
         'hd': {
@@ -99,214 +126,332 @@ def projWRFGenerator(
     return myProj
 
 
-def save_data(dir_base, variable, values, attrs, compress='float32'):
-        
-        output_path = os.path.join(dir_base, variable)
-        if not os.path.exists(output_path):
-            os.makedirs(output_path)
-
-        ## Tipo de dato
-        if compress == 'uint8':
-            vmin = attrs['vmin']
-            vmax = attrs['vmax']
-            values = np.clip(((values - vmin) / (vmax - vmin)) * 255, vmin, vmax).astype(np.uint8)
-        elif compress == 'float16':
-            values = values.astype(np.float16)
-        else:
-            values = values.astype(np.float32)
-
-        np.savez(os.path.join(output_path, "data.npz"),
-            values   = values,
-            nt       = values.shape[0],
-            nv       = values.shape[1],
-            nz       = values.shape[2],
-            ny       = values.shape[3],
-            nx       = values.shape[4],
-            attrs    = attrs,
-            compress = compress,
+def domain_dirs(instance, domain):
+    """Directorios (dominio, hysplit, visor) de un dominio de la instancia."""
+    dir_domain = os.path.join(instance, domain)
+    return dir_domain, os.path.join(dir_domain, 'hysplit'), os.path.join(dir_domain, 'visor')
+
+
+def source_files(dir_puff, a_species):
+    return [f for f in os.listdir(os.path.join(dir_puff, a_species)) if f.endswith('.nc')]
+
+
+## Copias del cubo reescalado que conviven en memoria en ingest_grid (zoom, tipo de dato, piramide, estadisticas)
+MEMORY_COPIES = 4
+
+def task_memory(instance, domain, a_species, type_grid):
+    """
+    Bytes estimados que ocupa ingest_grid por especie: el cubo de entrada float32 mas MEMORY_COPIES copias
+    reescaladas, acotado por species_memory_bytes (ver species_cube).
+    """
+    dir_domain, dir_puff, dir_visor = domain_dirs(instance, domain)
+    nc_files_source = source_files(dir_puff, a_species)
+    grid = structure_template['grids'][type_grid]
+    with xr.open_dataset(os.path.join(dir_puff, a_species, nc_files_source[-1]), engine="netcdf4") as ds:
+        nt, ny, nx = ds['hysp'].shape
+    scale = grid['scale']
+    return min(int(4 * nt * ny * nx * (1 + MEMORY_COPIES * scale['dt'] * scale['dy'] * scale['dx'])), species_memory_bytes)
+
+
+def species_cube(dir_visor, var_name, shape):
+    """
+    Cubo float32 (nt,nv,nz,ny,nx) donde se arman las concentraciones: en memoria si el cubo y su copia
+    publicada caben en species_memory_bytes; si no, un DiskCube en dir_visor/.<var_name>.cube.
+    """
+    if 2 * 4 * int(np.prod(shape)) <= species_memory_bytes:
+        return np.zeros(shape, dtype=np.float32)
+    return DiskCube(os.path.join(dir_visor, f".{var_name}.cube"), shape, '<f4', budget=species_memory_bytes // 2)
+
+
+@lru_cache(maxsize=2)
+def wrf_context(dir_domain):
+    """
+    Salida WRF del dominio abierta, su proyeccion y el origen de su grilla regular.
+    Se calcula una vez por proceso y dominio (las grillas hd y ld del dominio la comparten).
+    """
+    wrf_nc = [f for f in os.listdir(dir_domain) if f.startswith('wrf_d') and f.endswith('.nc')][0]
+    dsWRF = xr.open_dataset(os.path.join(dir_domain, wrf_nc), engine="netcdf4")
+    projWRF = projWRFGenerator(
+        map_proj= dsWRF.attrs['MAP_PROJ_CHAR'],
+        ref_lat = dsWRF.attrs['MOAD_CEN_LAT'],
+        ref_lon = dsWRF.attrs['STAND_LON'], 
+        lat_1   = dsWRF.attrs['TRUELAT1'], 
+        lat_2   = dsWRF.attrs['TRUELAT2'],
+    )
+    projWGS = Proj(proj='latlong', datum='WGS84')
+
+    transformer_WGS_WRF = Transformer.from_proj(projWGS, projWRF, always_xy=True)
+
+    dx = dsWRF.attrs['DX']
+    dy = dsWRF.attrs['DY']
+    ny = dsWRF.XLAT.shape[1]
+    nx = dsWRF.XLAT.shape[2]
+    cen_lat = dsWRF.attrs['CEN_LAT']
+    cen_lon = dsWRF.attrs['CEN_LON']
+    e, n = transformer_WGS_WRF.transform(cen_lon, cen_lat)
+    x0 = -(nx-1) * dx / 2 + e
+    y0 = -(ny-1) * dy / 2 + n
+    return {
+        'dataset'    : dsWRF,
+        'transformer': transformer_WGS_WRF,
+        'grid'       : (y0, dy, ny, x0, dx, nx),
+    }
+
+
+class GridContext:
+    """
+    Lo comun a todas las especies de una grilla (structure_template['grids'][type_grid]) de un dominio:
+    grillas lon/lat recortadas y reescaladas y, si la grilla publica viento, u10/v10 regrillados desde
+    WRF. Se calcula una vez por tarea de ingest_grid y se reutiliza para cada especie (se asume, como
+    ya hacia el trigger con un .nc arbitrario, que todas las especies del dominio comparten la grilla).
+    """
+    def __init__(self, dir_domain, type_grid, reference_nc):
+        self.dir_domain = dir_domain
+        self.type_grid  = type_grid
+        self._wind      = None
+
+        ## Grillas base
+        dspuff = xr.open_dataset(reference_nc, engine="netcdf4")
+        cutx = structure_template['grids'][type_grid]['cut']['x']
+        cuty = structure_template['grids'][type_grid]['cut']['y']
+        self.GRID_LON = zoom(dspuff['lon'].values[cuty:-cuty if cuty>0 else None, cutx:-cutx if cutx>0 else None],
+            (structure_template['grids'][type_grid]['scale']['dy'], structure_template['grids'][type_grid]['scale']['dx']), order=1
+        )
+        self.GRID_LAT = zoom(dspuff['lat'].values[cuty:-cuty if cuty>0 else None, cutx:-cutx if cutx>0 else None],
+            (structure_template['grids'][type_grid]['scale']['dy'], structure_template['grids'][type_grid]['scale']['dx']), order=1
         )
-        print(f"[OK] {variable} - frames guardados en {dir_base}")
+        dspuff.close()
 
-for instance in instances:
-    for domain in domains:
+    def wind(self):
+        """{'u10', 'v10'}: viento a este/norte (nt,ny,nx) en la grilla, rotado y regrillado una sola vez."""
+        if self._wind is None:
+            wrf   = wrf_context(self.dir_domain)
+            dsWRF = wrf['dataset']
+            GRID_XX, GRID_YY = wrf['transformer'].transform(self.GRID_LON, self.GRID_LAT)
+            weights = cached_weights(*wrf['grid'], GRID_YY, GRID_XX)
+            U10_earth, V10_earth = earth_relative(
+                dsWRF['U10'].values, dsWRF['V10'].values, dsWRF['COSALPHA'].values, dsWRF['SINALPHA'].values,
+            )
+            self._wind = dict(zip(('u10', 'v10'), regrid(weights, self.GRID_LAT.shape, U10_earth, V10_earth)))
+        return self._wind
 
-        dir_domain = os.path.join(instance, domain)
-        if not dir_domain:
-            print(f"[SKIP] El dominio {domain} no se encuentra para la instancia {instance}")
-            continue
 
-        dir_puff = os.path.join(instance, domain, 'hysplit')
-        if not os.path.exists(dir_puff):
-            print(f"[ALERT] No existe el directorio {dir_puff} para el dominio {domain}")
+## Attrs que nombran otras variables de la especie (lo unico que cambia entre especies en las variables comunes)
+NAME_ATTRS = ('coordx', 'coordy', 'windx', 'windy')
+
+def ingest_grid(instance, domain, type_grid, species):
+    """
+    Publica las variables de una grilla (structure_template['grids'][type_grid]) para cada especie de species.
+    Las variables comunes a las especies (coordenadas y viento) se calculan una vez (GridContext), se guardan
+    para la primera especie y se enlazan para las demas (link_data); las concentraciones son de cada especie.
+    """
+    dir_domain, dir_puff, dir_visor = domain_dirs(instance, domain)
+    reference = os.path.join(dir_puff, species[0], source_files(dir_puff, species[0])[-1])
+    context   = GridContext(dir_domain, type_grid, reference)
+    shared    = {}     # var -> variable ya publicada con sus datos
+    for a_species in species:
+        ingest_species(context, dir_visor, dir_puff, a_species, type_grid, shared)
+
+
+def ingest_species(context, dir_visor, dir_puff, a_species, type_grid, shared):
+    nc_files_source = source_files(dir_puff, a_species)
+    GRID_LON = context.GRID_LON
+    GRID_LAT = context.GRID_LAT
+
+    ## Render first attrs (adjust according to the grid scale)
+    attrs_render = structure_template['attrs'].copy()
+    keys_attrs = ['dt', 'dz', 'dy', 'dx']
+    for key in keys_attrs:
+            if attrs_render[key]:
+                attrs_render[key] = attrs_render[key] / structure_template['grids'][type_grid]['scale'][key]
+
+    ## Indicamos la variables de coordenada
+    coordy = '_'.join([a_species, type_grid, 'lon'])
+    coordx = '_'.join([a_species, type_grid, 'lat'])
+
+    attrs_render['coordy'] = coordy
+    attrs_render['coordx'] = coordx
+
+    attrs_render['windx'] = '_'.join([a_species, 'ld', 'u10'])
+    attrs_render['windy'] = '_'.join([a_species, 'ld', 'v10'])
+    
+    for var in structure_template['grids'][type_grid]['vars']:
+
+        ## Variables comunes ya publicadas para otra especie: se enlazan
+        if var in shared:
+            var_name = {'lon': coordx, 'lat': coordy}.get(var, '_'.join([a_species, type_grid, var]))
+            link_data(dir_visor, var_name, shared[var], {key: attrs_render[key] for key in NAME_ATTRS})
             continue
 
-        dir_visor = os.path.join(dir_domain, 'visor')
-        if not os.path.exists(dir_visor):
-            os.makedirs(dir_visor)
-        
-        ## Read directories in dir_puff
-        species = os.listdir(dir_puff)
-        for a_species in species:
-
-            nc_files_source = [f for f in os.listdir(os.path.join(dir_puff, a_species)) if f.endswith('.nc')]
-
-            for type_grid, _ in structure_template['grids'].items():
-                ## Grillas base (se asume que todos los .nc de una especie tienen la misma grilla y se usa una arbitraria)
-                dspuff  = xr.open_dataset(os.path.join(dir_puff, a_species, nc_files_source[-1]), engine="netcdf4")
-                data_shape = dspuff['hysp'].shape  # (nt, ny, nx)
-
-                # (1) LAT LON
-                cutx = structure_template['grids'][type_grid]['cut']['x']
-                cuty = structure_template['grids'][type_grid]['cut']['y']
-                GRID_LON = zoom(dspuff['lon'].values[cuty:-cuty if cuty>0 else None, cutx:-cutx if cutx>0 else None],
-                    (structure_template['grids'][type_grid]['scale']['dy'], structure_template['grids'][type_grid]['scale']['dx']), order=1
-                )
-                GRID_LAT = zoom(dspuff['lat'].values[cuty:-cuty if cuty>0 else None, cutx:-cutx if cutx>0 else None],
-                    (structure_template['grids'][type_grid]['scale']['dy'], structure_template['grids'][type_grid]['scale']['dx']), order=1
-                )
-            
-                # (2) WRF XX and YY
-                wrf_nc = [f for f in os.listdir(dir_domain) if f.startswith('wrf_d') and f.endswith('.nc')][0]
-                dsWRF = xr.open_dataset(os.path.join(dir_domain, wrf_nc), engine="netcdf4")
-                projWRF = projWRFGenerator(
-                    map_proj= dsWRF.attrs['MAP_PROJ_CHAR'],
-                    ref_lat = dsWRF.attrs['MOAD_CEN_LAT'],
-                    ref_lon = dsWRF.attrs['STAND_LON'], 
-                    lat_1   = dsWRF.attrs['TRUELAT1'], 
-                    lat_2   = dsWRF.attrs['TRUELAT2'],
-                )
-                projWGS = Proj(proj='latlong', datum='WGS84')
-
-                transformer_WGS_WRF = Transformer.from_proj(projWGS, projWRF, always_xy=True)
-
-                dx = dsWRF.attrs['DX']
-                dy = dsWRF.attrs['DY']
-                ny = dsWRF.XLAT.shape[1]
-                nx = dsWRF.XLAT.shape[2]
-                cen_lat = dsWRF.attrs['CEN_LAT']
-                cen_lon = dsWRF.attrs['CEN_LON']
-                e, n = transformer_WGS_WRF.transform(cen_lon, cen_lat)
-                x0 = -(nx-1) * dx / 2 + e
-                y0 = -(ny-1) * dy / 2 + n
-                
-                GRID_XX, GRID_YY = transformer_WGS_WRF.transform(
-                    GRID_LON, GRID_LAT
-                )
-
-                ## Render first attrs (adjust according to the grid scale)
-                attrs_render = structure_template['attrs'].copy()
-                keys_attrs = ['dt', 'dz', 'dy', 'dx']
-                for key in keys_attrs:
-                        if attrs_render[key]:
-                            attrs_render[key] = attrs_render[key] / structure_template['grids'][type_grid]['scale'][key]
-
-                ## Indicamos la variables de coordenada
-                coordy = '_'.join([a_species, type_grid, 'lon'])
-                coordx = '_'.join([a_species, type_grid, 'lat'])
-
-                attrs_render['coordy'] = coordy
-                attrs_render['coordx'] = coordx
-
-                attrs_render['windx'] = '_'.join([a_species, 'ld', 'u10'])
-                attrs_render['windy'] = '_'.join([a_species, 'ld', 'v10'])
-                
-                for var in structure_template['grids'][type_grid]['vars']:
-
-                    if var == 'lon':
-                        values = GRID_LON #(ny,nx)
-                        values = np.expand_dims(np.expand_dims(np.expand_dims(values, axis=0), axis=0), axis=0) #(nt,nv,nz,ny,nx)
-                        attrs_render['human_name'] = 'Longitud'
-                        attrs_render['unit']       = 'deg'
-                        attrs_render['vmin']       = float(values.min())
-                        attrs_render['vmax']       = float(values.max())
-                        attrs_render['thresholds'] = np.round(np.linspace(attrs_render['vmin'], attrs_render['vmax'], 8),2).tolist()
-                        save_data(dir_visor, coordx, values, attrs=attrs_render)
-
-                    elif var == 'lat':
-                        values = GRID_LAT #(ny,nx)
-                        values = np.expand_dims(np.expand_dims(np.expand_dims(values, axis=0), axis=0), axis=0) #(nt,nv,nz,ny,nx)
-                        var_name = '_'.join([a_species, type_grid, var])
-                        attrs_render['human_name'] = 'Latitud'
-                        attrs_render['unit']       = 'deg'
-                        attrs_render['vmin']       = float(values.min())
-                        attrs_render['vmax']       = float(values.max())
-                        attrs_render['thresholds'] = np.round(np.linspace(attrs_render['vmin'], attrs_render['vmax'], 8),2).tolist()
-                        save_data(dir_visor, coordy, values, attrs=attrs_render)
-
-                    elif var == 'u10':
-                        COSALPHA = dsWRF['COSALPHA'].values
-                        SINALPHA = dsWRF['SINALPHA'].values
-                        U10 = dsWRF['U10'].values
-                        V10 = dsWRF['V10'].values
-                        U10_earth = U10 * COSALPHA - V10 * SINALPHA
-                        V10_earth = U10 * SINALPHA + V10 * COSALPHA
-
-                        values = np.zeros((U10_earth.shape[0], GRID_LAT.shape[0], GRID_LAT.shape[1]), dtype=np.float32)
-                        for t in range(U10_earth.shape[0]):
-                            Interpolator = RegularGridInterpolator(
-                                (np.arange(y0, y0 + ny * dy, dy),np.arange(x0, x0 + nx * dx, dx)),
-                                U10_earth[t,:,:],
-                                bounds_error=False,
-                                fill_value=0
-                            )
-                            values[t, :, :] = Interpolator((GRID_YY.flatten(), GRID_XX.flatten())).reshape(GRID_LAT.shape)
-
-                        values = gaussian_filter1d(values, sigma=3, axis=0) #(nt,ny,nx)
-                        values = np.expand_dims(values, axis=1) # (nt,nz,ny,nx)
-                        values = np.expand_dims(values, axis=1) # (nt,nv,nz,ny,nx)
-                        var_name = '_'.join([a_species, type_grid, var])
-                        attrs_render['human_name'] = 'u10'
-                        attrs_render['unit']       = "m/s"
-                        attrs_render['vmin']       = float(values.min())
-                        attrs_render['vmax']       = float(values.max())
-                        attrs_render['thresholds'] = [-10, -8 , -6, -4, -2, -1, 0, 1, 2, 4, 6, 8, 10]
-                        save_data(dir_visor, var_name, values, attrs=attrs_render, compress='float16')
-
-                    elif var == 'v10':
-                        COSALPHA = dsWRF['COSALPHA'].values
-                        SINALPHA = dsWRF['SINALPHA'].values
-                        U10 = dsWRF['U10'].values
-                        V10 = dsWRF['V10'].values
-                        U10_earth = U10 * COSALPHA - V10 * SINALPHA
-                        V10_earth = U10 * SINALPHA + V10 * COSALPHA
-                        
-                        values = np.zeros((V10_earth.shape[0], GRID_LAT.shape[0], GRID_LAT.shape[1]), dtype=np.float32)
-                        for t in range(V10_earth.shape[0]):
-                            Interpolator = RegularGridInterpolator(
-                                (np.arange(y0, y0 + ny * dy, dy),np.arange(x0, x0 + nx * dx, dx)),
-                                V10_earth[t,:,:],
-                                bounds_error=False,
-                                fill_value=0
-                            )
-                            values[t, :, :] = Interpolator((GRID_YY.flatten(), GRID_XX.flatten())).reshape(GRID_LAT.shape)
-                            
-                        values = gaussian_filter1d(values, sigma=3, axis=0) #(nt,ny,nx)
-                        values = np.expand_dims(values, axis=1) # (nt,nz,ny,nx)
-                        values = np.expand_dims(values, axis=1) # (nt,nv,nz,ny,nx)
-                        var_name = '_'.join([a_species, type_grid, var])
-                        attrs_render['human_name'] = 'v10'
-                        attrs_render['unit']       = "m/s"
-                        attrs_render['vmin']       = float(values.min())
-                        attrs_render['vmax']       = float(values.max())
-                        attrs_render['thresholds'] = [-10, -8 , -6, -4, -2, -1, 0, 1, 2, 4, 6, 8, 10]
-                        save_data(dir_visor, var_name, values, attrs=attrs_render, compress='float16')
-
-                    elif var == 'hysp': 
-                        values = dspuff['hysp'].values #(nt,ny,nx)
-                        values = values*1000*365*0.25* 5000 * 1e4
-                        scale = structure_template['grids'][type_grid]['scale']
-                        values = zoom(values, (scale['dt'], scale['dy'], scale['dx']), order=1)
-                        values = np.expand_dims(values, axis=1) #(nt,nz,ny,nx)
-                        values = np.expand_dims(values, axis=1) #(nt,nv,nz,ny,nx)
-                        var_name = '_'.join([a_species, type_grid, var])
-                        attrs_render['human_name']   = f"Concentración de {a_species}"
-                        attrs_render['unit']         = "µg/m³"
-                        attrs_render['vmin']         = float(values.min())
-                        attrs_render['vmax']         = float(values.max())
-                        attrs_render['thresholds']   = [0.5, 1, 2, 5, 10, 20, 30, 40, 50, 75, 100, 125, 150, 300, 500, 1000]
-                        save_data(dir_visor, var_name, values, attrs=attrs_render, compress='float16')
-
-    ## Marcamos el directorio como listo
-    flag_path = os.path.join(instance, 'READY')
-    with open(flag_path, 'w') as f:
-        f.write('')
+        if var == 'lon':
+            values = GRID_LON #(ny,nx)
+            values = np.expand_dims(np.expand_dims(np.expand_dims(values, axis=0), axis=0), axis=0) #(nt,nv,nz,ny,nx)
+            attrs_render['human_name'] = 'Longitud'
+            attrs_render['unit']       = 'deg'
+            attrs_render['vmin']       = float(values.min())
+            attrs_render['vmax']       = float(values.max())
+            attrs_render['thresholds'] = np.round(np.linspace(attrs_render['vmin'], attrs_render['vmax'], 8),2).tolist()
+            save_data(dir_visor, coordx, values, attrs=attrs_render, storage_format=storage_format, precompress=precompress, lod_levels=lod_levels)
+            shared[var] = coordx
+
+        elif var == 'lat':
+            values = GRID_LAT #(ny,nx)
+            values = np.expand_dims(np.expand_dims(np.expand_dims(values, axis=0), axis=0), axis=0) #(nt,nv,nz,ny,nx)
+            var_name = '_'.join([a_species, type_grid, var])
+            attrs_render['human_name'] = 'Latitud'
+            attrs_render['unit']       = 'deg'
+            attrs_render['vmin']       = float(values.min())
+            attrs_render['vmax']       = float(values.max())
+            attrs_render['thresholds'] = np.round(np.linspace(attrs_render['vmin'], attrs_render['vmax'], 8),2).tolist()
+            save_data(dir_visor, coordy, values, attrs=attrs_render, storage_format=storage_format, precompress=precompress, lod_levels=lod_levels)
+            shared[var] = coordy
+
+        elif var in ('u10', 'v10'):
+            values = gaussian_filter1d(context.wind()[var], sigma=3, axis=0) #(nt,ny,nx)
+            values = np.expand_dims(values, axis=1) # (nt,nz,ny,nx)
+            values = np.expand_dims(values, axis=1) # (nt,nv,nz,ny,nx)
+            var_name = '_'.join([a_species, type_grid, var])
+            attrs_render['human_name'] = var
+            attrs_render['unit']       = "m/s"
+            attrs_render['vmin']       = float(values.min())
+            attrs_render['vmax']       = float(values.max())
+            attrs_render['thresholds'] = [-10, -8 , -6, -4, -2, -1, 0, 1, 2, 4, 6, 8, 10]
+            save_data(dir_visor, var_name, values, attrs=attrs_render, compress='float16', storage_format=storage_format, precompress=precompress, lod_levels=lod_levels)
+            shared[var] = var_name
+
+        elif var == 'hysp': 
+            ## Por bloques de tiempo (zoom_blocks), escribiendo en el cubo preasignado
+            scale   = structure_template['grids'][type_grid]['scale']
+            factors = (scale['dt'], scale['dy'], scale['dx'])
+            var_name = '_'.join([a_species, type_grid, var])
+            with xr.open_dataset(os.path.join(dir_puff, a_species, nc_files_source[-1]), engine="netcdf4") as dspuff:
+                field = dspuff['hysp'] #(nt,ny,nx)
+                nt, ny, nx = zoom_shape(field.shape, factors)
+                values = species_cube(dir_visor, var_name, (nt, 1, 1, ny, nx)) #(nt,nv,nz,ny,nx)
+                steps  = max(1, species_memory_bytes // (16 * 4 * ny * nx))
+                try:
+                    read = lambda j0, j1: field[j0:j1].values*1000*365*0.25* 5000 * 1e4
+                    for i0, i1, block in zoom_blocks(read, field.shape, factors, steps):
+                        values[i0:i1, 0] = block[:, np.newaxis]
+
+                    attrs_render['human_name']   = f"Concentración de {a_species}"
+                    attrs_render['unit']         = "µg/m³"
+                    attrs_render['vmin']         = float(values.min())
+                    attrs_render['vmax']         = float(values.max())
+                    attrs_render['thresholds']   = [0.5, 1, 2, 5, 10, 20, 30, 40, 50, 75, 100, 125, 150, 300, 500, 1000]
+                    save_data(dir_visor, var_name, values, attrs=attrs_render, compress=compress_species, storage_format=storage_format, precompress=precompress, quantization=quantization_species, sparse_floor=sparse_floor_species, lod_levels=lod_levels)
+                    if publish_stats:
+                        save_stats(dir_visor, var_name, values, attrs=attrs_render, storage_format=storage_format, precompress=precompress, lod_levels=lod_levels)
+                finally:
+                    if isinstance(values, DiskCube):
+                        values.remove()
+
+
+def pipeline_config():
+    """Configuracion que determina las salidas: si cambia, el manifiesto las marca para regenerar."""
+    return {
+        'structure_template'  : structure_template,
+        'storage_format'      : storage_format,
+        'precompress'         : precompress,
+        'compress_species'    : compress_species,
+        'quantization_species': quantization_species,
+        'sparse_floor_species': sparse_floor_species,
+        'lod_levels'          : lod_levels,
+        'publish_stats'       : publish_stats,
+    }
+
+
+def task_inputs(instance, domain, a_species, type_grid):
+    """Archivos que lee ingest_grid: los .nc de la especie y la salida WRF del dominio."""
+    dir_domain, dir_puff, dir_visor = domain_dirs(instance, domain)
+    files = [os.path.join(dir_puff, a_species, f) for f in source_files(dir_puff, a_species)]
+    files += [os.path.join(dir_domain, f) for f in os.listdir(dir_domain) if f.startswith('wrf_d') and f.endswith('.nc')]
+    return files
+
+
+def task_outputs(instance, domain, a_species, type_grid):
+    """Directorios de las variables que publica ingest_grid."""
+    dir_domain, dir_puff, dir_visor = domain_dirs(instance, domain)
+    names = ['_'.join([a_species, type_grid, var]) for var in structure_template['grids'][type_grid]['vars']]
+    if publish_stats and 'hysp' in structure_template['grids'][type_grid]['vars']:
+        names.append(os.path.join('_'.join([a_species, type_grid, 'hysp']), STATS_DIR))
+    return [os.path.join(dir_visor, name) for name in names]
+
+
+def plan(force=False, dry_run=False, checksum=False):
+    """
+    Recorre instancias, dominios y especies y arma las tareas de ingest_grid cuyas salidas no estan
+    al dia segun el manifiesto de la instancia (todas con force). Con dry_run solo reporta que se
+    regeneraria y por que.
+    Retorna (tareas, resultados, manifiestos, huellas):
+        tareas     = [((instance, domain, grilla, especies), bytes estimados)]
+        resultados = {task: (False, 0, error)} de lo que fallo al planificar
+        huellas    = {task: [(salida, fingerprint)]} para registrar en el manifiesto las salidas de cada tarea
+                     (salida = (instance, domain, especie, grilla) o (instance, domain, especie, 'sources'))
+    """
+    tasks, results, entries = [], {}, {}
+    manifests = {instance: load_manifest(instance) for instance in instances}
+    config    = pipeline_config()
+    for instance in instances:
+        for domain in domains:
+
+            dir_domain, dir_puff, dir_visor = domain_dirs(instance, domain)
+            if not dir_domain:
+                print(f"[SKIP] El dominio {domain} no se encuentra para la instancia {instance}")
+                continue
+
+            if not os.path.exists(dir_puff):
+                print(f"[ALERT] No existe el directorio {dir_puff} para el dominio {domain}")
+                continue
+
+            if not os.path.exists(dir_visor) and not dry_run:
+                os.makedirs(dir_visor)
+
+            ## Read directories in dir_puff
+            stale   = {}     # type_grid -> [(task por especie, huella, bytes estimados)]
+            species = os.listdir(dir_puff)
+            for a_species in species:
+                task = (instance, domain, a_species)
+                try:
+                    for type_grid in structure_template['grids']:
+                        task   = (instance, domain, a_species, type_grid)
+                        entry  = fingerprint(task_inputs(*task), config, checksum)
+                        reason = stale_reason(manifests[instance], task, entry, task_outputs(*task), force)
+                        if reason is None:
+                            print(f"[SKIP] {label(task)} al dia")
+                            continue
+                        print(f"[{'DRY' if dry_run else 'PLAN'}] {label(task)}: {reason}")
+                        stale.setdefault(type_grid, []).append((task, entry, task_memory(*task)))
+                except Exception:
+                    results[task] = (False, 0.0, traceback.format_exc())
+                    print(f"[ERROR] No se pudo planificar {label(task)}\n{results[task][2]}")
+
+            ## Una tarea por grilla con todas sus especies por regenerar (comparten GridContext)
+            for type_grid, items in stale.items():
+                task = (instance, domain, type_grid, tuple(item[0][2] for item in items))
+                tasks.append((task, max(item[2] for item in items)))
+                entries[task] = [(item[0], item[1]) for item in items]
+    return tasks, results, manifests, entries
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Publica para el visor las instancias HYSPLIT (directorios 20*) del directorio actual')
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    tasks, results, manifests, entries = plan(args.force, args.dry_run, args.checksum)
+    if args.dry_run:
+        print(f"[DRY] {sum(len(items) for items in entries.values())} salidas por regenerar, {sum(estimate for _, estimate in tasks) / 1024**3:.1f} GiB estimados en total")
+        return
+
+    ## Las instancias con salidas por regenerar dejan de estar listas mientras se reescriben
+    clear_ready({task[0] for task in list(entries) + list(results)})
+    results.update(run_tasks(tasks, ingest_grid, args.workers, memory_bytes(args)))
+    record(manifests, results, entries)
+
+    ## Marcamos como listas las instancias cuyas tareas terminaron todas bien
+    mark_ready(instances, results)
+
+
+if __name__ == '__main__':
+    main()
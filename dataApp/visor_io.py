@@ -0,0 +1,597 @@
+#################################################################################################
+## ESCRITURA DE VARIABLES PARA EL VISOR (compartido por trigger.py y trigger_hy.py)
+#################################################################################################
+import os
+import sys
+import json
+import zlib
+import shutil
+import numpy as np
+
+## Reducciones temporales compartidas con /api/stats/: provider/products.py solo depende de numpy
+#   (se importa sin Django), asi los productos precalculados y los calculados en linea son los mismos
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from provider.products import temporal_stats
+
+## Compresores opcionales para los payloads precomprimidos
+try:
+    import brotli
+except ImportError:
+    brotli = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+## Formatos de almacenamiento soportados por provider/storage.py
+#   'npz': data.npz comprimible, requiere np.load + tobytes en cada lectura
+#   'raw': values.bin (little-endian, C-order) + header.json. Se sirve con sendfile/mmap
+STORAGE_FORMATS = ('npz', 'raw')
+
+## Copias precomprimidas de values.bin (solo formato raw), negociadas por Accept-Encoding en DataAPI
+#   Se comprimen una sola vez al publicar, con el nivel maximo de cada compresor
+PRECOMPRESS_SUFFIX = {
+    'gzip': '.gz',
+    'br'  : '.br',
+    'zstd': '.zst',
+}
+
+## Formatos cuantizados: codigo entero + (scale, offset) por grupo, guardados en header["quant"]
+#   per='frame'  : un par por paso de tiempo (eje t)
+#   per='source' : un par por fuente (eje v)
+#   log=True     : se cuantiza y = log1p(x / floor), para campos >= 0 con umbrales de 0.5 a 1000
+#   Decodificacion: y = code * scale[g] + offset[g];  x = floor * expm1(y) si log, si no x = y
+QUANT_DTYPES = {
+    'uint8' : '|u1',
+    'uint16': '<u2',
+}
+QUANT_AXIS = {
+    'frame' : 0,
+    'source': 1,
+}
+
+## Formato disperso (solo raw): sparse.bin en lugar de values.bin, para plumas con mayoria de ceros
+#   Cada frame (t, v, z) guarda su caja envolvente, un bitmap y los valores > floor (ver sparse_encode)
+SPARSE_VALUES = 'sparse.bin'
+
+## Estadisticas temporales de una variable (ver save_stats): <variable>/stats/, fuera del catalogo de variables
+STATS_DIR = 'stats'
+
+
+def save_data(dir_base, variable, values, attrs, compress='float32', storage_format='raw', precompress=(), quantization=None,
+              sparse_floor=None, lod_levels=0):
+
+        if storage_format not in STORAGE_FORMATS:
+            raise ValueError(f"Formato de almacenamiento no soportado: {storage_format}")
+        if sparse_floor is not None and (storage_format != 'raw' or compress in QUANT_DTYPES):
+            raise ValueError("El formato disperso requiere storage_format='raw' y compress float16/float32")
+        if isinstance(values, DiskCube) and storage_format != 'raw':
+            raise ValueError("Un DiskCube solo se publica en storage_format='raw'")
+
+        output_path = os.path.join(dir_base, variable)
+        if not os.path.exists(output_path):
+            os.makedirs(output_path)
+
+        ## Piramide de resolucion: <variable>/lod<k>/ con la grilla reducida 2^k veces (ver downsample)
+        levels = pyramid(values, lod_levels)
+        if lod_levels:
+            attrs = {**attrs, 'lod_levels': len(levels)}
+        for level, values_lod in enumerate(levels, 1):
+            attrs_lod = {**attrs, 'lod': level}
+            for key in ('dy', 'dx'):
+                if attrs_lod.get(key):
+                    attrs_lod[key] = attrs_lod[key] * 2 ** level
+            save_data(output_path, f'lod{level}', values_lod, attrs_lod, compress, storage_format, precompress,
+                      quantization, sparse_floor)
+            if isinstance(values_lod, DiskCube):
+                values_lod.remove()
+
+        ## Tipo de dato (un DiskCube se convierte por bloques de fuentes a otro DiskCube)
+        quant = None
+        if compress in QUANT_DTYPES:
+            values, quant = quantize(values, compress, attrs=attrs, **(quantization or {}))
+        else:
+            dtype  = '<f2' if compress == 'float16' else '<f4'
+            values = map_sources(lambda block: block.astype(dtype), values, values.shape, dtype, compress)
+
+        if storage_format == 'raw':
+            save_raw(output_path, values, attrs, compress, precompress, quant, sparse_floor)
+            if isinstance(values, DiskCube):
+                values.remove()
+        else:
+            extra = {'quant': quant} if quant is not None else {}
+            npz_path = os.path.join(output_path, "data.npz")
+            with open(npz_path + '.tmp', 'wb') as f:
+                np.savez(f,
+                    values   = values,
+                    nt       = values.shape[0],
+                    nv       = values.shape[1],
+                    nz       = values.shape[2],
+                    ny       = values.shape[3],
+                    nx       = values.shape[4],
+                    attrs    = attrs,
+                    compress = compress,
+                    **extra,
+                )
+            os.replace(npz_path + '.tmp', npz_path)
+
+        ## Niveles de una publicacion anterior con mas niveles (lod_levels menor o piramide que se detuvo antes);
+        #   se borran despues del header, que ya acota attrs['lod_levels'] al numero de niveles nuevo
+        for name in os.listdir(output_path):
+            if name.startswith('lod') and name[3:].isdigit() and int(name[3:]) > len(levels):
+                shutil.rmtree(os.path.join(output_path, name))
+        ## Las estadisticas de la publicacion anterior no corresponden a los datos nuevos: save_stats las
+        #   vuelve a escribir despues de save_data (si no, /api/stats/ las calcula en linea)
+        if os.path.isdir(os.path.join(output_path, STATS_DIR)):
+            shutil.rmtree(os.path.join(output_path, STATS_DIR))
+        print(f"[OK] {variable} - frames guardados en {dir_base}")
+
+
+def downsample(values):
+    """
+    Reduce la grilla (ny,nx) de values (...,ny,nx) a la mitad promediando bloques de 2x2 celdas.
+    Con ny o nx impar el ultimo bloque promedia solo las celdas que existen.
+    Aplicado a las grillas lon/lat da los centros de las celdas del nivel reducido.
+    """
+    values = np.asarray(values, dtype=np.float32)
+    ny, nx = values.shape[-2:]
+    padded = np.full(values.shape[:-2] + (ny + ny % 2, nx + nx % 2), np.nan, dtype=np.float32)
+    padded[..., :ny, :nx] = values
+    blocks = padded.reshape(values.shape[:-2] + (padded.shape[-2] // 2, 2, padded.shape[-1] // 2, 2))
+    return np.nanmean(blocks, axis=(-3, -1))
+
+
+## Lado minimo (celdas) del nivel mas grueso de la piramide
+LOD_MIN_CELLS = 16
+
+def pyramid(values, levels):
+    """
+    Niveles 1..levels de la piramide de values (se detiene antes si la grilla baja de LOD_MIN_CELLS).
+    Si values es un DiskCube cada nivel es otro DiskCube (<archivo>.lod<k>); quien lo usa lo borra.
+    """
+    result = []
+    for level in range(1, levels + 1):
+        ny, nx = values.shape[-2:]
+        if min(ny, nx) < 2 * LOD_MIN_CELLS:
+            break
+        shape  = values.shape[:-2] + ((ny + 1) // 2, (nx + 1) // 2)
+        values = map_sources(downsample, values, shape, '<f4', f'lod{level}')
+        result.append(values)
+    return result
+
+
+def quantize(values, compress, per='frame', log=False, floor=None, attrs=None):
+    """
+    Cuantiza values (nt,nv,nz,ny,nx) a uint8/uint16 con un (scale, offset) por grupo (ver QUANT_AXIS).
+    Con log=True se cuantiza log1p(x / floor); floor por defecto es 1/10 del menor umbral positivo de attrs.
+    Retorna (codigos, quant), donde quant lleva los parametros de decodificacion y las cotas de error:
+        max_abs_error: cota del error absoluto (lineal): max(scale) / 2 + redondeo float32 de la decodificacion
+        max_rel_error: cota de |x' - x| / (x + floor) (log): expm1 de la cota anterior sobre y
+        measured_*   : error maximo medido contra los valores float32 de entrada
+    Si values es un DiskCube se hacen dos pasadas por bloques de fuentes (rango por grupo, luego codigos)
+    y los codigos quedan en otro DiskCube (<archivo>.<compress>).
+    """
+    if per not in QUANT_AXIS:
+        raise ValueError(f"Agrupacion de cuantizacion no soportada: {per}")
+    dtype  = np.dtype(QUANT_DTYPES[compress])
+    levels = np.iinfo(dtype).max
+    axis   = QUANT_AXIS[per]
+    other  = tuple(k for k in range(values.ndim) if k != axis)
+    if log and floor is None:
+        positive = [t for t in (attrs or {}).get('thresholds') or [] if t > 0]
+        floor    = min(positive) / 10 if positive else 1e-3
+
+    def transform(v0, v1):
+        x = np.asarray(values[:, v0:v1], dtype=np.float32)
+        if not log:
+            return x, x
+        if np.nanmin(x) < 0:
+            raise ValueError("La cuantizacion logaritmica requiere valores >= 0")
+        return x, np.log1p(x / np.float32(floor))
+
+    ## Rango de y por grupo (en memoria hay un solo bloque y se reutiliza en la segunda pasada)
+    blocks = source_blocks(values, copies=4)
+    lows, highs = [], []
+    for v0, v1 in blocks:
+        x, y = transform(v0, v1)
+        lows.append(y.min(axis=other, keepdims=True))
+        highs.append(y.max(axis=other, keepdims=True))
+    if axis == 1:
+        offset, high = np.concatenate(lows, axis=1), np.concatenate(highs, axis=1)
+    else:
+        offset, high = np.minimum.reduce(lows), np.maximum.reduce(highs)
+    scale = (high - offset) / levels
+    scale[scale == 0] = 1
+
+    codes = values.like(values.shape, dtype, compress) if isinstance(values, DiskCube) else None
+    error_abs = error_rel = y_abs = 0.0
+    for v0, v1 in blocks:
+        if len(blocks) > 1:
+            x, y = transform(v0, v1)
+        group   = (slice(None), slice(v0, v1)) if axis == 1 else slice(None)
+        block   = np.rint((y - offset[group]) / scale[group]).clip(0, levels).astype(dtype)
+        decoded = block * scale[group] + offset[group]
+        if log:
+            decoded = floor * np.expm1(decoded)
+        error     = np.abs(decoded - x)
+        error_abs = max(error_abs, float(error.max()))
+        y_abs     = max(y_abs, float(np.abs(y).max()))
+        if log:
+            error_rel = max(error_rel, float((error / (x + floor)).max()))
+        if codes is None:
+            codes = block
+        else:
+            codes[:, v0:v1] = block
+
+    quant = {
+        "dtype" : compress,
+        "per"   : per,
+        "log"   : bool(log),
+        "floor" : float(floor) if log else None,
+        "scale" : scale.ravel().astype(float).tolist(),
+        "offset": offset.ravel().astype(float).tolist(),
+    }
+    ## Cota sobre y: medio paso de cuantizacion + redondeo de code * scale + offset en float32
+    bound = float(scale.max()) / 2 + y_abs * 2.0 ** -21
+    if log:
+        quant["max_rel_error"]          = float(np.expm1(bound))
+        quant["measured_max_rel_error"] = error_rel
+    else:
+        quant["max_abs_error"]          = bound
+    quant["measured_max_abs_error"] = error_abs
+    return codes, quant
+
+
+def save_raw(output_path, values, attrs, compress, precompress=(), quant=None, sparse_floor=None):
+    """
+    Escribe values.bin con el buffer crudo del cubo y header.json con su descripcion.
+    Con sparse_floor escribe en su lugar sparse.bin (ver sparse_encode) y header["sparse"].
+    El header se escribe al final (de forma atomica): su existencia indica que los datos estan completos.
+    Los datos tambien se escriben en un .tmp y se renombran: nunca se reescribe en el lugar un archivo
+    que el visor tenga mapeado en memoria o que otra variable comparta por link_data.
+    Un DiskCube denso ya tiene el buffer de values.bin: su archivo se renombra en lugar de copiarse.
+    """
+    values_path = os.path.join(output_path, "values.bin")
+    sparse_path = os.path.join(output_path, SPARSE_VALUES)
+    ## Las copias comprimidas de una publicacion anterior quedarian desfasadas
+    for suffix in PRECOMPRESS_SUFFIX.values():
+        if os.path.exists(values_path + suffix):
+            os.remove(values_path + suffix)
+
+    sparse = None
+    if sparse_floor is None:
+        if isinstance(values, DiskCube):
+            values.close()
+            os.replace(values.path, values_path)
+        else:
+            values = np.ascontiguousarray(values)
+            values.tofile(values_path + '.tmp')
+            os.replace(values_path + '.tmp', values_path)
+        for coding in precompress:
+            precompress_file(values_path, coding)
+    else:
+        data, sparse = sparse_encode(values, sparse_floor)
+        with open(sparse_path + '.tmp', 'wb') as f:
+            f.write(data)
+        os.replace(sparse_path + '.tmp', sparse_path)
+
+    header = {
+        "format"  : "raw",
+        "dtype"   : values.dtype.str,
+        "nt"      : values.shape[0],
+        "nv"      : values.shape[1],
+        "nz"      : values.shape[2],
+        "ny"      : values.shape[3],
+        "nx"      : values.shape[4],
+        "attrs"   : attrs,
+        "compress": compress,
+    }
+    if quant is not None:
+        header["quant"] = quant
+    if sparse is not None:
+        header["sparse"] = sparse
+    header_path = os.path.join(output_path, "header.json")
+    with open(header_path + '.tmp', 'w') as f:
+        json.dump(header, f)
+    os.replace(header_path + '.tmp', header_path)
+
+    ## El archivo del otro formato (publicacion anterior) ya no esta referenciado por el header
+    stale = values_path if sparse is not None else sparse_path
+    if os.path.exists(stale):
+        os.remove(stale)
+
+
+def link_data(dir_base, variable, source, attrs_update):
+    """
+    Publica variable con los mismos datos que la variable source ya guardada en dir_base (ej. el viento
+    o las coordenadas de una grilla, identicos para todas las especies del dominio), sin recalcularlos
+    ni reescribirlos: values.bin / sparse.bin, sus copias precomprimidas y los niveles lod<k> se enlazan
+    con hardlinks (se copian si el sistema de archivos no lo permite) y header.json se escribe propio,
+    con attrs actualizados con attrs_update (ej. coordx/coordy/windx/windy de la especie).
+    En formato npz los attrs viajan dentro de data.npz: se enlaza tal cual (attrs de source).
+    """
+    link_tree(os.path.join(dir_base, source), os.path.join(dir_base, variable), attrs_update)
+    print(f"[OK] {variable} - enlazado a {source} en {dir_base}")
+
+
+def link_tree(source_path, output_path, attrs_update):
+    os.makedirs(output_path, exist_ok=True)
+    names = {name for name in os.listdir(source_path) if not name.endswith('.tmp')}
+    for name in sorted(names - {"header.json"}):
+        path   = os.path.join(source_path, name)
+        target = os.path.join(output_path, name)
+        if os.path.isdir(path):
+            link_tree(path, target, attrs_update)
+            continue
+        try:
+            os.link(path, target + '.tmp')
+        except OSError:
+            shutil.copyfile(path, target + '.tmp')
+        os.replace(target + '.tmp', target)
+
+    ## El header al final, como en save_raw
+    if "header.json" in names:
+        with open(os.path.join(source_path, "header.json")) as f:
+            header = json.load(f)
+        header["attrs"] = {**header["attrs"], **attrs_update}
+        header_path = os.path.join(output_path, "header.json")
+        with open(header_path + '.tmp', 'w') as f:
+            json.dump(header, f)
+        os.replace(header_path + '.tmp', header_path)
+
+    ## Archivos y niveles lod<k> de una publicacion anterior de la variable que source no tiene
+    for name in set(os.listdir(output_path)) - names:
+        path = os.path.join(output_path, name)
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        elif os.path.isfile(path):
+            os.remove(path)
+
+
+def sparse_encode(values, floor):
+    """
+    Codifica cada frame (t, v, z) de values (nt,nv,nz,ny,nx) como su caja envolvente de celdas > floor,
+    un bitmap de esas celdas dentro de la caja (np.packbits, orden C) y sus valores (dtype de values).
+    Las celdas <= floor se decodifican como 0.
+    Retorna (bytes, layout) con sparse.bin = [frames | bitmap | values] y layout para header["sparse"]:
+        frames: int32 (nframes, 5) = j0, j1, i0, i1, nnz   (caja [j0:j1, i0:i1]; nnz=0 frame vacio)
+    """
+    ny, nx  = values.shape[-2:]
+    nframes = int(np.prod(values.shape[:-2]))
+    index   = np.zeros((nframes, 5), dtype='<i4')
+    bitmaps = []
+    nonzero = []
+    ## Por bloques de tiempo si values es un DiskCube
+    frames  = (frame for t0, t1 in time_blocks(values) for frame in np.asarray(values[t0:t1]).reshape(-1, ny, nx))
+    for f, frame in enumerate(frames):
+        mask = frame > floor
+        rows = np.flatnonzero(mask.any(axis=1))
+        if rows.size == 0:
+            continue
+        cols = np.flatnonzero(mask.any(axis=0))
+        j0, j1, i0, i1 = rows[0], rows[-1] + 1, cols[0], cols[-1] + 1
+        crop = mask[j0:j1, i0:i1]
+        bitmaps.append(np.packbits(crop, axis=None))
+        nonzero.append(frame[j0:j1, i0:i1][crop])
+        index[f] = (j0, j1, i0, i1, nonzero[-1].size)
+
+    bitmap = np.concatenate(bitmaps) if bitmaps else np.zeros(0, dtype=np.uint8)
+    data   = np.concatenate(nonzero).astype(values.dtype) if nonzero else np.zeros(0, dtype=values.dtype)
+    parts  = [index.tobytes(), bitmap.tobytes(), data.tobytes()]
+    layout = {"floor": float(floor), "nframes": nframes, "dtype": values.dtype.str}
+    offset = 0
+    for name, part in zip(("frames", "bitmap", "values"), parts):
+        layout[name] = [offset, len(part)]
+        offset += len(part)
+    return b''.join(parts), layout
+
+
+## Tamaño de los bloques en que se lee values.bin para precomprimirlo
+PRECOMPRESS_BLOCK = 64 * 1024**2
+
+def precompress_file(path, coding):
+    """
+    Escribe <path><sufijo> con path comprimido segun coding ('gzip', 'br' o 'zstd'), leyendolo por bloques.
+    Si el compresor no esta instalado se avisa y se omite (DataAPI usara otra codificacion o identity).
+    """
+    if coding == 'gzip':
+        ## wbits=31: encabezado gzip (mtime=0, salida reproducible)
+        compressor = zlib.compressobj(9, zlib.DEFLATED, 31)
+        process, finish = compressor.compress, compressor.flush
+    elif coding == 'br':
+        if brotli is None:
+            print(f"[SKIP] brotli no instalado, se omite {path}.br")
+            return
+        compressor = brotli.Compressor(quality=11)
+        process, finish = compressor.process, compressor.finish
+    elif coding == 'zstd':
+        if zstandard is None:
+            print(f"[SKIP] zstandard no instalado, se omite {path}.zst")
+            return
+        compressor = zstandard.ZstdCompressor(level=19).compressobj()
+        process, finish = compressor.compress, compressor.flush
+    else:
+        raise ValueError(f"Codificacion no soportada: {coding}")
+
+    target = path + PRECOMPRESS_SUFFIX[coding]
+    with open(path, 'rb') as source, open(target + '.tmp', 'wb') as f:
+        for block in iter(lambda: source.read(PRECOMPRESS_BLOCK), b''):
+            f.write(process(block))
+        f.write(finish())
+    os.replace(target + '.tmp', target)
+
+
+def save_stats(dir_base, variable, values, attrs, percentiles=(50, 90, 99), **kwargs):
+    """
+    Publica <variable>/stats/: estadisticas temporales del total sobre las fuentes de values (nt,nv,nz,ny,nx),
+    como un cubo (1,nproductos,nz,ny,nx). attrs['products'] nombra cada indice v.
+    No es una variable del catalogo: /api/stats/ lo sirve directamente cuando se pide sin parametros.
+    Se llama despues de save_data(dir_base, variable, ...), que borra las estadisticas anteriores.
+    """
+    names, products = temporal_stats(sum_sources(values), percentiles, attrs.get('thresholds') or [])
+    attrs_stats = {**attrs, 'products': names, 'human_name': f"Estadisticas de {attrs.get('human_name')}"}
+    save_data(os.path.join(dir_base, variable), STATS_DIR, products[np.newaxis], attrs=attrs_stats, compress='float32', **kwargs)
+
+
+#################################################################################################
+## CUBOS EN DISCO: ARMADO Y ESCRITURA CON MEMORIA ACOTADA
+#################################################################################################
+##  Un cubo que no cabe en memoria (ej. concentraciones de cientos de fuentes) se arma en un archivo
+##  crudo y save_data lo procesa por bloques de fuentes. Se lee y escribe con pread/pwrite y no con
+##  mmap: las paginas mapeadas de un cubo grande cuentan en la memoria residente del proceso.
+
+## Presupuesto por defecto (bytes) de los bloques float32 en que se procesa un DiskCube
+DISK_BLOCK_BYTES = 256 * 1024**2
+
+
+class DiskCube:
+    """
+    Cubo (nt,nv,...) en un archivo crudo (C-order, sin header) que se indexa como un arreglo por
+    bloques: cube[t0:t1], cube[t0:t1, v] y cube[t0:t1, v0:v1] (lectura, retorna np.ndarray, y escritura).
+    budget: bytes float32 que pueden ocupar los bloques en que se procesa (ver source_blocks/time_blocks).
+    """
+
+    def __init__(self, path, shape, dtype='<f4', budget=DISK_BLOCK_BYTES):
+        self.path   = path
+        self.shape  = tuple(int(n) for n in shape)
+        self.dtype  = np.dtype(dtype)
+        self.ndim   = len(self.shape)
+        self.budget = budget
+        self.fd     = os.open(path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+        os.ftruncate(self.fd, self.nbytes)
+
+    @property
+    def size(self):
+        return int(np.prod(self.shape))
+
+    @property
+    def nbytes(self):
+        return self.size * self.dtype.itemsize
+
+    def like(self, shape, dtype, tag):
+        """DiskCube vacio junto a este (<archivo>.<tag>), con el mismo presupuesto."""
+        return DiskCube(f"{self.path}.{tag}", shape, dtype, self.budget)
+
+    def _frame_count(self):
+        return int(np.prod(self.shape[2:]))
+
+    def source_blocks(self, copies=1):
+        """Rangos (v0, v1) de fuentes cuyas `copies` copias float32 (todos los tiempos) caben en el presupuesto."""
+        nt, nv = self.shape[:2]
+        step = max(1, self.budget // (copies * nt * self._frame_count() * 4))
+        return [(v0, min(v0 + step, nv)) for v0 in range(0, nv, step)]
+
+    def time_blocks(self, copies=1):
+        """Rangos (t0, t1) de pasos de tiempo cuyas `copies` copias float32 (todas las fuentes) caben en el presupuesto."""
+        nt, nv = self.shape[:2]
+        step = max(1, self.budget // (copies * nv * self._frame_count() * 4))
+        return [(t0, min(t0 + step, nt)) for t0 in range(0, nt, step)]
+
+    def _index(self, key):
+        key = key if isinstance(key, tuple) else (key,)
+        if len(key) > 2:
+            raise IndexError("DiskCube solo se indexa por tiempo y fuente")
+        ranges = []
+        for item, n in zip(key + (slice(None),) * (2 - len(key)), self.shape):
+            if isinstance(item, slice):
+                start, stop, step = item.indices(n)
+                if step != 1:
+                    raise IndexError("DiskCube no soporta saltos en los indices")
+                ranges.append((start, max(start, stop), False))
+            else:
+                item = int(item) + (n if int(item) < 0 else 0)
+                if not 0 <= item < n:
+                    raise IndexError(f"Indice {item} fuera de rango")
+                ranges.append((item, item + 1, True))
+        return ranges
+
+    def _offset(self, t, v):
+        return (t * self.shape[1] + v) * self._frame_count() * self.dtype.itemsize
+
+    def _parts(self, t0, t1, v0, v1):
+        """(t, desplazamiento) de los tramos contiguos del archivo que cubren [t0:t1, v0:v1]."""
+        if (v0, v1) == (0, self.shape[1]):
+            return [(t0, self._offset(t0, 0))]
+        return [(t, self._offset(t, v0)) for t in range(t0, t1)]
+
+    def __getitem__(self, key):
+        (t0, t1, squeeze_t), (v0, v1, squeeze_v) = self._index(key)
+        out = np.empty((t1 - t0, v1 - v0) + self.shape[2:], dtype=self.dtype)
+        parts = self._parts(t0, t1, v0, v1)
+        for (t, offset), buffer in zip(parts, [out] if len(parts) == 1 else out):
+            view = memoryview(buffer).cast('B')
+            while view.nbytes:
+                count = os.preadv(self.fd, [view], offset)
+                if count == 0:
+                    raise EOFError(f"{self.path} termino antes de lo esperado")
+                view, offset = view[count:], offset + count
+        return out[(0 if squeeze_t else slice(None), 0 if squeeze_v else slice(None))]
+
+    def __setitem__(self, key, block):
+        (t0, t1, squeeze_t), (v0, v1, squeeze_v) = self._index(key)
+        shape = self.shape[2:]
+        if not squeeze_v:
+            shape = (v1 - v0,) + shape
+        if not squeeze_t:
+            shape = (t1 - t0,) + shape
+        block = np.broadcast_to(np.asarray(block, dtype=self.dtype), shape)
+        block = np.ascontiguousarray(block).reshape((t1 - t0, v1 - v0) + self.shape[2:])
+        parts = self._parts(t0, t1, v0, v1)
+        for (t, offset), buffer in zip(parts, [block] if len(parts) == 1 else block):
+            view = memoryview(np.ascontiguousarray(buffer)).cast('B')
+            while view.nbytes:
+                count = os.pwrite(self.fd, view, offset)
+                view, offset = view[count:], offset + count
+
+    def min(self):
+        return min(self[t0:t1].min() for t0, t1 in self.time_blocks())
+
+    def max(self):
+        return max(self[t0:t1].max() for t0, t1 in self.time_blocks())
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    def remove(self):
+        """Cierra y borra el archivo (si no fue renombrado antes, ver save_raw)."""
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def source_blocks(values, copies=1):
+    """Rangos (v0, v1) en que se procesa values: uno solo si esta en memoria, los de DiskCube.source_blocks si no."""
+    if isinstance(values, DiskCube):
+        return values.source_blocks(copies)
+    return [(0, values.shape[1])]
+
+
+def time_blocks(values, copies=1):
+    """Rangos (t0, t1) en que se procesa values: uno solo si esta en memoria, los de DiskCube.time_blocks si no."""
+    if isinstance(values, DiskCube):
+        return values.time_blocks(copies)
+    return [(0, values.shape[0])]
+
+
+def map_sources(func, values, shape, dtype, tag):
+    """
+    func(values) con func aplicada fuente a fuente (ej. downsample, astype). En memoria es una sola llamada;
+    con un DiskCube el resultado es otro DiskCube (<archivo>.<tag>) escrito por bloques de fuentes.
+    """
+    if not isinstance(values, DiskCube):
+        return func(values)
+    result = values.like(shape, dtype, tag)
+    for v0, v1 in values.source_blocks(copies=4):
+        result[:, v0:v1] = func(values[:, v0:v1])
+    return result
+
+
+def sum_sources(values):
+    """Suma float32 de values (nt,nv,...) sobre las fuentes, por bloques si values es un DiskCube."""
+    total = None
+    for v0, v1 in source_blocks(values):
+        part = values[:, v0:v1].sum(axis=1, dtype=np.float32)
+        total = part if total is None else np.add(total, part, out=total)
+    return total
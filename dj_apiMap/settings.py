@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -41,6 +42,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'provider.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -121,3 +123,34 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# Provider
+# Directorio con las instancias publicadas por dataApp/trigger.py
+PROVIDER_DATA_DIR = os.environ.get('PROVIDER_DATA_DIR', str(BASE_DIR / 'dataApp'))
+
+# Presupuesto (bytes) de la cache LRU de cubos decodificados o mapeados (values.bin), por proceso. 0 la deshabilita.
+PROVIDER_CACHE_MAX_BYTES = 512 * 1024**2
+
+# Presupuesto (bytes) de la cache de indices espaciales (KD-tree) de las grillas de coordenadas
+PROVIDER_GRID_CACHE_MAX_BYTES = 128 * 1024**2
+
+# Cache HTTP: max-age (s) de las URLs con gen=<generacion actual de la instancia> (mtime de READY, immutable;
+# sin gen o con una generacion anterior la respuesta es no-cache) y de los catalogos
+PROVIDER_IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+PROVIDER_CATALOG_MAX_AGE   = 60
+
+# Intervalo minimo (s) entre verificaciones del disco del catalogo de instancias
+PROVIDER_CATALOG_REFRESH_SECONDS = 5
+
+# Threads del pool donde las vistas async leen archivos y decodifican cubos (ver provider/aio.py)
+PROVIDER_IO_THREADS = 8
+
+# Precargar en segundo plano la ultima instancia READY de cada dominio al iniciar el proceso
+PROVIDER_WARM_ON_START = False
+
+# Memoria (bytes) por bloque de tiempo al combinar corridas en /api/ensemble/
+PROVIDER_ENSEMBLE_CHUNK_BYTES = 64 * 1024**2
+
+# Rutas medidas por provider.metrics.MetricsMiddleware (Server-Timing y /metrics)
+PROVIDER_METRICS_PREFIX = '/api/'
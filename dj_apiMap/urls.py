@@ -19,10 +19,12 @@ from django.urls import path
 from django.contrib import admin
 from django.views.generic import TemplateView, RedirectView
 from django.urls import include
+from provider.views import MetricsAPI
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', RedirectView.as_view(url='/admin/', permanent=True)),
+    path('metrics', MetricsAPI.as_view(), name='metrics'),
 ]
 
 urlpatterns += [path('api/', include('provider.urls')),]
\ No newline at end of file
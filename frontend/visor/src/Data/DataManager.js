@@ -75,12 +75,14 @@ export class State extends EventTarget {
         // NUEVO: listas de opciones disponibles
         this.domains = context.domains || [];
         this.instances = [];
+        this.generations = {};   // generacion (READY) de cada instancia: URLs de datos cacheables como immutable
         this.variables = [];
         this.failMode = context.failMode;
     }
 
     _cacheKey(domain, instance, variable) {
-        return `${domain}__${instance}__${variable}`;
+        // Con la generacion: una instancia re-ingestada se vuelve a cargar
+        return `${domain}__${instance}__${variable}__${this.generations[instance] || ''}`;
     }
 
     // Getters para referenciar los parametros
@@ -110,6 +112,7 @@ export class State extends EventTarget {
             const res = await safeFetch(`/api/instances/?domain=${this.#domain}`);
             const json = await res.json();
             this.instances = json.instances;
+            this.generations = json.generations || {};
         } catch (err) {
             console.error(`Error loading instances for ${this.#domain}:`);
             this.instances = [instanceFail];
@@ -220,7 +223,7 @@ export class State extends EventTarget {
         // Si no esta en cache. Iniciar carga con evento
         document.dispatchEvent(new CustomEvent('loading:start'));
         try {
-            const data = await getDataPowerV(domain, instance, variable);
+            const data = await getDataPowerV(domain, instance, variable, this.generations[instance]);
             this.cache[key] = data;
         } catch (err) {
             console.error(`Error loading all frames for ${this.#variable}:`, err);
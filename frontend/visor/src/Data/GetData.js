@@ -14,18 +14,61 @@ function structureArray(nx, ny, Z) {
     return grid;
 }
 
-async function getData(domain, instance, var_name) {
-    const apiUrl = `/api/data/?domain=${domain}&instance=${instance}&variable=${var_name}`;
+// Vista tipada (sin copia) de una parte del bundle segun su dtype de numpy
+function typedPart(buffer, part) {
+    const Constructor =
+        part.dtype == '|u1' ? Uint8Array :
+            part.dtype == '<u2' ? Uint16Array :
+                part.dtype == '<f2' ? Float16Array :
+                    Float32Array;
+    return new Constructor(buffer, part.offset, part.nbytes / Constructor.BYTES_PER_ELEMENT);
+}
+
+// Vista tipada del cubo de /api/data/ segun su compress
+function typedValues(buffer, compress) {
+    return compress == 'uint8' ? new Uint8Array(buffer) :
+        compress == 'uint16' ? new Uint16Array(buffer) :
+            compress == 'float16' ? new Float16Array(buffer) :
+                new Float32Array(buffer);
+}
+
+// Valores fisicos de un slice cuantizado: y = code * scale[g] + offset[g]; x = floor * expm1(y) si log
+function dequantize(codes, quant, group) {
+    const scale = quant.scale[group];
+    const offset = quant.offset[group];
+    const result = new Float32Array(codes.length);
+    for (let k = 0; k < codes.length; k++) {
+        const y = codes[k] * scale + offset;
+        result[k] = quant.log ? quant.floor * Math.expm1(y) : y;
+    }
+    return result;
+}
+
+// Valor fisico de un solo codigo cuantizado (misma decodificacion que dequantize)
+function dequantizeValue(code, quant, group) {
+    const y = code * quant.scale[group] + quant.offset[group];
+    return quant.log ? quant.floor * Math.expm1(y) : y;
+}
 
-    let response;
+async function getData(domain, instance, var_name, generation = null) {
+    // Dos requests en paralelo: el cubo por /api/data/ (sendfile y copia precomprimida segun Accept-Encoding)
+    // y en /api/bundle/ sin el cubo (values=0) las grillas lon/lat, metadata y geojson de fuentes para species
+    // Con la generacion de la instancia (gen) el navegador puede cachear las respuestas como immutable
+    const withSources = var_name.match(new RegExp("species")) ? 1 : 0;
+    const query = `domain=${domain}&instance=${instance}&variable=${var_name}` + (generation ? `&gen=${generation}` : '');
+
+    let response, responseValues;
     try {
-        response = await safeFetch(apiUrl);
+        [response, responseValues] = await Promise.all([
+            safeFetch(`/api/bundle/?${query}&sources=${withSources}&values=0`),
+            safeFetch(`/api/data/?${query}`),
+        ]);
     } catch (error) {
         console.error("Error fetching data:", error);
         return null;
     }
 
-    const buffer = await response.arrayBuffer();
+    const [buffer, bufferValues] = await Promise.all([response.arrayBuffer(), responseValues.arrayBuffer()]);
     const headerJSON = response.headers.get('X-Header');
     const metadata = JSON.parse(headerJSON);
 
@@ -38,34 +81,17 @@ async function getData(domain, instance, var_name) {
         nx,
         attrs,
         compress,
+        quant,
+        parts,
     } = metadata;
+    const partsByName = Object.fromEntries(parts.map(part => [part.name, part]));
 
     // Decodificamos el buffer segun tipo
-    const valuesToReturn =
-        compress == 'uint8' ? new Uint8Array(buffer) :
-            compress == 'float16' ? new Float16Array(buffer) :
-                new Float32Array(buffer);
+    const valuesToReturn = typedValues(bufferValues, compress);
 
     // Coordenadas
-    const apiUrlXX = `/api/data/?domain=${domain}&instance=${instance}&variable=${attrs['coordx']}`;
-    const responseXX = await safeFetch(apiUrlXX);
-    const bufferXX = await responseXX.arrayBuffer();
-    const headersXX = responseXX.headers.get('X-Header');
-    const metadataXX = JSON.parse(headersXX);
-    const valuesXX =
-        metadataXX.compress == 'uint8' ? new Uint8Array(bufferXX).slice(0, metadataXX.nx * metadataXX.ny) :
-            metadataXX.compress == 'float16' ? new Float16Array(bufferXX).slice(0, metadataXX.nx * metadataXX.ny) :
-                new Float32Array(bufferXX).slice(0, metadataXX.nx * metadataXX.ny);
-
-    const apiUrlYY = `/api/data/?domain=${domain}&instance=${instance}&variable=${attrs['coordy']}`;
-    const responseYY = await safeFetch(apiUrlYY);
-    const bufferYY = await responseYY.arrayBuffer();
-    const headersYY = responseYY.headers.get('X-Header');
-    const metadataYY = JSON.parse(headersYY);
-    const valuesYY =
-        metadataYY.compress == 'uint8' ? new Uint8Array(bufferYY).slice(0, metadataYY.nx * metadataYY.ny) :
-            metadataYY.compress == 'float16' ? new Float16Array(bufferYY).slice(0, metadataYY.nx * metadataYY.ny) :
-                new Float32Array(bufferYY).slice(0, metadataYY.nx * metadataYY.ny);
+    const valuesXX = typedPart(buffer, partsByName['lon']);
+    const valuesYY = typedPart(buffer, partsByName['lat']);
 
     // Creamos proyeccion
     const ZLON = structureArray(
@@ -139,22 +165,35 @@ async function getData(domain, instance, var_name) {
     }
 
     // Función para obtener un slice 2D de los datos (t, v, z) -> (ny, nx)
+    // Cubos cuantizados (uint8/uint16): se decodifica solo el slice pedido, el cubo queda en enteros
     function valuesApi(t, v, z) {
         const start = (t * nv * nz * ny * nx) + (v * nz * ny * nx) + (z * ny * nx);
         const end = start + (ny * nx);
-        return valuesToReturn.subarray(start, end);
+        const slice = valuesToReturn.subarray(start, end);
+        if (!quant) {
+            return slice;
+        }
+        return dequantize(slice, quant, quant.per == 'source' ? v : t);
+    }
+
+    // Valor de una celda (t, v, z, j, i), para series por punto: en cubos cuantizados decodifica
+    // solo ese elemento en vez del slice (ny, nx) completo
+    function valueAt(t, v, z, j, i) {
+        const code = valuesToReturn[(t * nv * nz * ny * nx) + (v * nz * ny * nx) + (z * ny * nx) + (j * nx + i)];
+        if (!quant) {
+            return code;
+        }
+        return dequantizeValue(code, quant, quant.per == 'source' ? v : t);
     }
 
     /////////////// Variables Espaciales-End
     // Vectores para combinacion lineal en [v]
     let abVector =
-        compress == 'uint8' ? new Uint8Array(nv) :
-            compress == 'float16' ? new Float16Array(nv) :
-                new Float32Array(nv);
+        compress == 'float16' ? new Float16Array(nv) :
+            new Float32Array(nv);
     let emVector =
-        compress == 'uint8' ? new Uint8Array(nv) :
-            compress == 'float16' ? new Float16Array(nv) :
-                new Float32Array(nv);
+        compress == 'float16' ? new Float16Array(nv) :
+            new Float32Array(nv);
     // Valores basicos para combinacion lineal
     // Esta eleccion permite mostrar solo la primera variable por defecto (v=0) 
     abVector[0] = 0;
@@ -164,13 +203,12 @@ async function getData(domain, instance, var_name) {
         "type": "FeatureCollection",
         "features": []
     };
-    if (var_name.match(new RegExp("species"))) {
-        let species = var_name.split('_')[0];
-        let dataSources = await safeFetch(`
-            /api/sources/?&domain=${domain}&instance=${instance}&species=${species}
-        `);
+    if (withSources && partsByName['sources']) {
+        const sourcesPart = partsByName['sources'];
+        const dataSourcesJSON = JSON.parse(
+            new TextDecoder().decode(new Uint8Array(buffer, sourcesPart.offset, sourcesPart.nbytes))
+        );
         // Agregamos los features al geoJsonSources
-        let dataSourcesJSON = await dataSources.json();
         geoJsonSources.features = dataSourcesJSON.features;
         abVector[0] = 0;
         emVector[0] = 2000;
@@ -187,6 +225,7 @@ async function getData(domain, instance, var_name) {
         attrs: attrs,
         values: valuesToReturn,
         valuesApi: valuesApi,
+        valueAt: valueAt,
         valuesXX: valuesXX,
         valuesYY: valuesYY,
         proj_ij_to_lonlat: proj_ij_to_lonlat,
@@ -203,9 +242,9 @@ async function getData(domain, instance, var_name) {
 /**
  * Esta funcion extiende a getData para agregar data sobre el eje [v] 
  */
-async function getDataPowerV(domain, instance, var_name) {
+async function getDataPowerV(domain, instance, var_name, generation = null) {
 
-    const data = await getData(domain, instance, var_name);
+    const data = await getData(domain, instance, var_name, generation);
     if (!var_name.match(new RegExp("species"))) {
         // Si no es species, no hacemos nada especial
         return data;
@@ -220,6 +259,7 @@ async function getDataPowerV(domain, instance, var_name) {
         attrs,
         values: valuesToReturn,
         valuesApi,
+        valueAt,
         valuesXX,
         valuesYY,
         proj_ij_to_lonlat,
@@ -283,14 +323,16 @@ async function getDataPowerV(domain, instance, var_name) {
         const v_old = geoJsonSources_new.features[v].properties.id_inner;
         return valuesApi(t, v_old, z);
     }
+    function valueAt_new(t, v, z, j, i) {
+        const v_old = geoJsonSources_new.features[v].properties.id_inner;
+        return valueAt(t, v_old, z, j, i);
+    }
     let abVector_new =
-        compress == 'uint8' ? new Uint8Array(nv_new) :
-            compress == 'float16' ? new Float16Array(nv_new) :
-                new Float32Array(nv_new);
+        compress == 'float16' ? new Float16Array(nv_new) :
+            new Float32Array(nv_new);
     let emVector_new =
-        compress == 'uint8' ? new Uint8Array(nv_new) :
-            compress == 'float16' ? new Float16Array(nv_new) :
-                new Float32Array(nv_new);
+        compress == 'float16' ? new Float16Array(nv_new) :
+            new Float32Array(nv_new);
 
     abVector_new[0] = 0;
     emVector_new[0] = 2000;
@@ -305,6 +347,7 @@ async function getDataPowerV(domain, instance, var_name) {
         attrs: attrs,
         values: valuesToReturn,
         valuesApi: valuesApi_new,
+        valueAt: valueAt_new,
         valuesXX: valuesXX,
         valuesYY: valuesYY,
         proj_ij_to_lonlat: proj_ij_to_lonlat,
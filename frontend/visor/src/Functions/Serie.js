@@ -239,7 +239,7 @@ function serieGenerator(context, state, map, mapContainer, panelSerie) {
         const startDate = parseInstanceToDate(state.instance, context);
         const data = state.currentData;
         const [i, j] = data.proj_lonlat_to_ij(lonSerie, latSerie);
-        const { nx, ny, nv, nt, valuesApi, emVector, abVector } = data;
+        const { nx, ny, nv, nt, valueAt, emVector, abVector } = data;
 
         const geoJsonSources = state.currentData.geoJsonSources;
         const totalKey = 'total';
@@ -257,7 +257,7 @@ function serieGenerator(context, state, map, mapContainer, panelSerie) {
             seriesKeys.forEach(p => temporaryAccumulator[p] = 0);
             for (let v = 0; v < nv; v++) {
                 let key = geoJsonSources.features[v]?.properties.project || '';
-                let value = valuesApi(t, v, state.level)[j * nx + i] * emVector[v] * (1 - abVector[v] / 100);
+                let value = valueAt(t, v, state.level, j, i) * emVector[v] * (1 - abVector[v] / 100);
                 temporaryAccumulator[key]      += value;
                 temporaryAccumulator[totalKey] += value;
             }
@@ -0,0 +1,67 @@
+#################################################################################################
+## SOPORTE ASGI: I/O FUERA DEL EVENT LOOP EN UN POOL ACOTADO
+#################################################################################################
+import asyncio
+import functools
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+
+## Threads para lectura de archivos y decodificacion numpy (numpy/zlib liberan el GIL)
+IO_THREADS = getattr(settings, 'PROVIDER_IO_THREADS', 8)
+## Bloque de lectura al enviar archivos bajo ASGI (bajo WSGI se usa sendfile)
+IO_CHUNK   = 2 * 1024 * 1024
+
+executor = ThreadPoolExecutor(max_workers=IO_THREADS, thread_name_prefix='provider-io')
+
+
+async def run_io(func, *args, **kwargs):
+    """
+    Ejecuta func en el pool de I/O sin bloquear el event loop.
+    Corre en una copia del contexto de la tarea (asi las fases de provider/metrics.py llegan a la request).
+    """
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(executor, functools.partial(context.run, func, *args, **kwargs))
+
+
+async def aiter_sync(iterator):
+    """Iterador async sobre un iterador sync: cada bloque se produce en el pool de I/O."""
+    iterator = iter(iterator)
+    done     = object()
+    while True:
+        chunk = await run_io(next, iterator, done)
+        if chunk is done:
+            break
+        yield chunk
+
+
+def for_asgi(request, response):
+    """
+    Bajo ASGI, reemplaza el contenido sync de una respuesta streaming por un iterador async
+    (Django consumiria un iterador sync completo en memoria antes de enviarlo).
+    Bajo WSGI la respuesta no se toca, asi FileResponse sigue usando wsgi.file_wrapper/sendfile.
+    """
+    if not isinstance(request, ASGIRequest) or not response.streaming or response.is_async:
+        return response
+    filelike = getattr(response, 'file_to_stream', None)
+    if filelike is not None:
+        iterator = iter(lambda: filelike.read(IO_CHUNK), b'')
+    else:
+        iterator = response.streaming_content
+    response.streaming_content = aiter_sync(iterator)
+    return response
+
+
+def offload(view_class):
+    """
+    Decorador de clase: expone un `get` async que corre el `respond` sync de la vista en el pool de I/O.
+    Asi la misma vista sirve bajo WSGI y ASGI sin bloquear el event loop.
+    """
+    async def get(self, request, *args, **kwargs):
+        response = await run_io(self.respond, request, *args, **kwargs)
+        return for_asgi(request, response)
+    get.__doc__ = view_class.respond.__doc__
+    view_class.get = get
+    return view_class
@@ -1,6 +1,28 @@
+import sys
+import threading
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class ProviderConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'provider'
+
+    def ready(self):
+        ## Precarga en segundo plano de la ultima instancia READY (ver PROVIDER_WARM_ON_START)
+        if not getattr(settings, 'PROVIDER_WARM_ON_START', False):
+            return
+        # En comandos de manage.py distintos de runserver no tiene sentido (migrate, warm_cache, ...)
+        if sys.argv[0].endswith('manage.py') and len(sys.argv) > 1 and sys.argv[1] != 'runserver':
+            return
+        threading.Thread(target=warm_on_start, name='provider-warmup', daemon=True).start()
+
+
+def warm_on_start():
+    from .views import dir_root, catalog, domains
+    from .warmup import warm_latest
+    try:
+        records = warm_latest(dir_root, catalog, domains)
+        print(f"[provider] precarga: {len(records)} variables, {sum(r['bytes'] for r in records) / 1e6:.1f} MB")
+    except Exception as e:
+        print(f"[provider] precarga fallida: {e}")
@@ -0,0 +1,78 @@
+#################################################################################################
+## CACHE EN MEMORIA DE CUBOS DECODIFICADOS
+#################################################################################################
+import os
+import threading
+from collections import OrderedDict
+from django.conf import settings
+
+
+def file_key(path):
+    """
+    Llave de identidad de un archivo: (path, mtime, size).
+    Si el archivo se reescribe cambia la llave y la entrada antigua termina expulsada por LRU.
+    """
+    stat = os.stat(path)
+    return (str(path), stat.st_mtime_ns, stat.st_size)
+
+
+class CubeCache:
+    """
+    Cache LRU de cubos decodificados, limitada por un presupuesto de bytes.
+    Es compartida por todos los threads del proceso (un lock protege el diccionario).
+    Con max_bytes = 0 la cache queda deshabilitada.
+    """
+    def __init__(self, max_bytes):
+        self.max_bytes  = int(max_bytes)
+        self.bytes      = 0
+        self.hits       = 0
+        self.misses     = 0
+        self.evictions  = 0
+        self._entries   = OrderedDict()     # key -> (entry, nbytes)
+        self._lock      = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def put(self, key, entry, nbytes):
+        nbytes = int(nbytes)
+        # Un cubo mas grande que el presupuesto completo no se guarda
+        if nbytes > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self.bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (entry, nbytes)
+            self.bytes += nbytes
+            while self.bytes > self.max_bytes:
+                _, (_, old_nbytes) = self._entries.popitem(last=False)
+                self.bytes     -= old_nbytes
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def stats(self):
+        with self._lock:
+            requests = self.hits + self.misses
+            return {
+                "entries"   : len(self._entries),
+                "bytes"     : self.bytes,
+                "max_bytes" : self.max_bytes,
+                "hits"      : self.hits,
+                "misses"    : self.misses,
+                "evictions" : self.evictions,
+                "hit_ratio" : self.hits / requests if requests else 0.0,
+            }
+
+
+cube_cache = CubeCache(getattr(settings, 'PROVIDER_CACHE_MAX_BYTES', 512 * 1024**2))
@@ -0,0 +1,85 @@
+#################################################################################################
+## VALIDADORES HTTP (ETag / Last-Modified) Y POLITICAS DE Cache-Control
+#################################################################################################
+import os
+import hashlib
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control, set_response_etag
+from django.utils.http import http_date
+from .metrics import phase
+
+## Una publicacion de una instancia (generacion = mtime de READY) no cambia mas: las URLs que la nombran
+#   con gen=<generacion> se cachean "para siempre" en el navegador y en el proxy. La ingesta incremental
+#   puede reescribir una instancia READY (y su READY): sin gen, o con una generacion anterior, se revalida
+IMMUTABLE_MAX_AGE = getattr(settings, 'PROVIDER_IMMUTABLE_MAX_AGE', 365 * 24 * 3600)
+## Los catalogos (contexto, instancias, variables) cambian cuando llega una corrida nueva
+CATALOG_MAX_AGE   = getattr(settings, 'PROVIDER_CATALOG_MAX_AGE', 60)
+
+
+def generation_token(mtime_ns):
+    return format(mtime_ns, 'x')
+
+
+def generation(dir_instance):
+    """Generacion de la publicacion actual de la instancia (mtime de READY), None si no tiene READY."""
+    try:
+        return generation_token(os.stat(os.path.join(dir_instance, 'READY')).st_mtime_ns)
+    except (FileNotFoundError, NotADirectoryError):
+        return None
+
+
+def is_immutable(request, dir_instances):
+    """
+    True si la request nombra con gen= la generacion actual de cada instancia (READY), en el mismo orden
+    (gen=<g1>,<g2> para respuestas que combinan instancias). Solo esas respuestas se marcan immutable.
+    """
+    tokens = request.GET.get("gen", "").split(',')
+    if len(tokens) != len(dir_instances):
+        return False
+    return all(token and token == generation(dir_instance) for token, dir_instance in zip(tokens, dir_instances))
+
+
+def file_validators(request, paths):
+    """
+    (etag, last_modified) a partir de la identidad de los archivos (inode, mtime, size) y de la query.
+    La query entra al hash porque los recortes/ponderaciones cambian el cuerpo de la respuesta.
+    """
+    with phase('validate'):
+        digest        = hashlib.sha1()
+        last_modified = 0
+        for path in paths:
+            stat = os.stat(path)
+            digest.update(f"{path}:{stat.st_ino}:{stat.st_mtime_ns}:{stat.st_size};".encode())
+            last_modified = max(last_modified, stat.st_mtime)
+        digest.update(request.path.encode())
+        digest.update(repr(sorted(request.GET.lists())).encode())
+    return f'"{digest.hexdigest()}"', int(last_modified)
+
+
+def not_modified(request, etag, last_modified, immutable):
+    """
+    Respuesta 304 (o 412) si los validadores del cliente coinciden; None en otro caso.
+    El 304 lleva los mismos ETag, Last-Modified y Cache-Control que tendria el 200 (ver set_validators).
+    """
+    response    = set_validators(HttpResponse(), etag, last_modified, immutable)
+    conditional = get_conditional_response(request, etag=etag, last_modified=last_modified, response=response)
+    return None if conditional is response else conditional
+
+
+def set_validators(response, etag, last_modified, immutable):
+    """ETag, Last-Modified y Cache-Control: immutable si la URL nombra la generacion actual (is_immutable), revalidar si no."""
+    response['ETag']          = etag
+    response['Last-Modified'] = http_date(last_modified)
+    if immutable:
+        patch_cache_control(response, public=True, max_age=IMMUTABLE_MAX_AGE, immutable=True)
+    else:
+        patch_cache_control(response, no_cache=True)
+    return response
+
+
+def catalog_response(request, response):
+    """ETag por hash del contenido y cache corta, para respuestas JSON de catalogo."""
+    set_response_etag(response)
+    patch_cache_control(response, public=True, max_age=CATALOG_MAX_AGE)
+    return get_conditional_response(request, etag=response['ETag'], response=response)
@@ -0,0 +1,124 @@
+#################################################################################################
+## CATALOGO EN MEMORIA DE DOMINIOS, INSTANCIAS Y VARIABLES
+#################################################################################################
+import os
+import json
+import time
+import threading
+import numpy as np
+from django.conf import settings
+from .storage import RAW_HEADER, find_cube
+from .caching import generation_token
+
+## Segundos entre verificaciones del disco. Dentro de ese intervalo el catalogo es una lectura de dict
+REFRESH_SECONDS = getattr(settings, 'PROVIDER_CATALOG_REFRESH_SECONDS', 5)
+
+
+def read_metadata(cube_file):
+    """Metadata de una variable (sin leer sus valores)."""
+    if os.path.basename(cube_file) == RAW_HEADER:
+        with open(cube_file, 'r') as f:
+            header = json.load(f)
+    else:
+        # np.load de un npz es perezoso: solo se descomprimen los miembros que se leen
+        with np.load(cube_file, allow_pickle=True) as npz:
+            header = {key: int(npz[key]) for key in ('nt', 'nv', 'nz', 'ny', 'nx')}
+            header["attrs"]    = npz["attrs"].item()
+            header["compress"] = str(npz["compress"])
+            header["format"]   = "npz"
+    return {key: header[key] for key in ('format', 'nt', 'nv', 'nz', 'ny', 'nx', 'attrs', 'compress')}
+
+
+def scan_instance(dir_instance, domains):
+    """{domain: {variable: metadata}} de una instancia."""
+    info = {}
+    for domain in domains:
+        dir_visor = os.path.join(dir_instance, domain, 'visor')
+        if not os.path.isdir(dir_visor):
+            continue
+        variables = {}
+        for variable in sorted(os.listdir(dir_visor)):
+            cube_file = find_cube(dir_visor, variable)
+            if cube_file is None:
+                continue
+            metadata = read_metadata(cube_file)
+            ## Estadisticas publicadas como variable hermana <variable>_stats (antes de <variable>/stats/)
+            if "products" in metadata["attrs"]:
+                continue
+            variables[variable] = metadata
+        info[domain] = variables
+    return info
+
+
+def grids_info(variables):
+    """Grillas distintas (par coordx/coordy) de un conjunto de variables, con las variables que las usan."""
+    grids = {}
+    for variable, meta in variables.items():
+        coordx = meta["attrs"].get("coordx")
+        coordy = meta["attrs"].get("coordy")
+        if not coordx or not coordy:
+            continue
+        grid = grids.setdefault(f"{coordx}|{coordy}", {
+            "coordx"   : coordx,
+            "coordy"   : coordy,
+            "ny"       : meta["ny"],
+            "nx"       : meta["nx"],
+            "variables": [],
+        })
+        grid["variables"].append(variable)
+    return list(grids.values())
+
+
+class Catalog:
+    """
+    Catalogo de instancias READY por dominio, construido una vez por proceso.
+    Se refresca a lo mas cada REFRESH_SECONDS: re-escanea solo instancias nuevas, instancias que
+    recien reciben READY o cuyo READY fue reescrito (re-ingesta). Las instancias sin READY no se listan.
+    """
+    def __init__(self, dir_root, domains):
+        self.dir_root   = dir_root
+        self.domains    = list(domains)
+        self._ready     = {}      # instance -> (mtime READY, {domain: {variable: metadata}})
+        self._checked   = None    # time.monotonic() de la ultima verificacion
+        self._lock      = threading.Lock()
+
+    def refresh(self, force=False):
+        now = time.monotonic()
+        if not force and self._checked is not None and now - self._checked < REFRESH_SECONDS:
+            return
+        with self._lock:
+            if not force and self._checked is not None and now - self._checked < REFRESH_SECONDS:
+                return
+            ready = {}
+            for instance in os.listdir(self.dir_root):
+                if not instance.startswith('20'):
+                    continue
+                try:
+                    mtime = os.stat(os.path.join(self.dir_root, instance, 'READY')).st_mtime_ns
+                except (FileNotFoundError, NotADirectoryError):
+                    continue
+                known = self._ready.get(instance)
+                if known is not None and known[0] == mtime:
+                    ready[instance] = known
+                else:
+                    ready[instance] = (mtime, scan_instance(os.path.join(self.dir_root, instance), self.domains))
+            self._ready   = ready
+            self._checked = time.monotonic()
+
+    def instances(self, domain):
+        """Instancias READY con el dominio, ordenadas."""
+        self.refresh()
+        return sorted(i for i, (_, info) in self._ready.items() if domain in info)
+
+    def generations(self, domain):
+        """{instance: generacion} de las instancias READY con el dominio (ver caching.generation)."""
+        self.refresh()
+        return {i: generation_token(mtime) for i, (mtime, info) in self._ready.items() if domain in info}
+
+    def variables(self, domain, instance):
+        """{variable: metadata} de una instancia READY ({} si no existe o no esta lista)."""
+        self.refresh()
+        item = self._ready.get(instance)
+        if item is None:
+            return {}
+        return item[1].get(domain, {})
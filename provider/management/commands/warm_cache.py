@@ -0,0 +1,35 @@
+import time
+from django.core.management.base import BaseCommand
+from provider.cache import cube_cache
+from provider.warmup import warm_latest
+
+
+class Command(BaseCommand):
+    help = (
+        "Precarga la ultima instancia READY de cada dominio (todas las variables y grillas) en la cache "
+        "de cubos y en el page cache del OS, y reporta tiempos y bytes para dimensionar la cache."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--domain', action='append', help='Dominio a precargar (por defecto todos)')
+
+    def handle(self, *args, **options):
+        from provider.views import dir_root, catalog, domains
+
+        selected = options['domain'] or domains
+        self.stdout.write(f"{'dominio':14} {'instancia':14} {'variable':24} {'formato':7} {'MB':>9} {'s':>8}")
+
+        def log(record):
+            self.stdout.write(
+                f"{record['domain']:14} {record['instance']:14} {record['variable']:24} {record['format']:7} "
+                f"{record['bytes'] / 1e6:9.2f} {record['seconds']:8.3f}"
+            )
+
+        start   = time.perf_counter()
+        records = warm_latest(dir_root, catalog, selected, log=log)
+        stats   = cube_cache.stats()
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(records)} variables, {sum(r['bytes'] for r in records) / 1e6:.1f} MB leidos en "
+            f"{time.perf_counter() - start:.2f} s. Cache de cubos: {stats['entries']} entradas, "
+            f"{stats['bytes'] / 1e6:.1f} MB de {stats['max_bytes'] / 1e6:.0f} MB"
+        ))
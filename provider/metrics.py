@@ -0,0 +1,217 @@
+#################################################################################################
+## METRICAS: Server-Timing POR REQUEST Y /metrics EN FORMATO PROMETHEUS
+#################################################################################################
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+## Limites (s) de los buckets del histograma de latencia
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+## Tiempos por fase de la request en curso ({fase: segundos}); None fuera de una request medida
+_phases = contextvars.ContextVar('provider_phases', default=None)
+
+
+@contextmanager
+def phase(name):
+    """
+    Mide un bloque como fase de la request en curso (sale en Server-Timing y en /metrics).
+    Fuera de MetricsMiddleware no registra nada. Las fases con el mismo nombre se acumulan.
+    """
+    record = _phases.get()
+    if record is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record[name] = record.get(name, 0.0) + time.perf_counter() - start
+
+
+class Registry:
+    """Contadores e histogramas del proceso, protegidos por un lock (cada observacion es O(buckets))."""
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets   = tuple(buckets)
+        self.in_flight = 0
+        self.latency   = {}     # view -> [conteos por bucket..., +Inf], suma
+        self.requests  = {}     # (view, status) -> n
+        self.bytes     = {}     # view -> bytes enviados
+        self.phases    = {}     # fase -> [n, segundos]
+        self._lock     = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            self.in_flight += 1
+
+    def finish(self, view, status, seconds, phases):
+        with self._lock:
+            self.in_flight -= 1
+            counts, total = self.latency.get(view) or ([0] * (len(self.buckets) + 1), 0.0)
+            for k, limit in enumerate(self.buckets):
+                if seconds <= limit:
+                    counts[k] += 1
+                    break
+            else:
+                counts[-1] += 1
+            self.latency[view] = (counts, total + seconds)
+            self.requests[(view, status)] = self.requests.get((view, status), 0) + 1
+            for name, value in phases.items():
+                item = self.phases.setdefault(name, [0, 0.0])
+                item[0] += 1
+                item[1] += value
+
+    def add_bytes(self, view, nbytes):
+        with self._lock:
+            self.bytes[view] = self.bytes.get(view, 0) + nbytes
+
+    def render(self, caches=()):
+        """Exposicion en formato de texto de Prometheus. caches: [(nombre, CubeCache)]."""
+        with self._lock:
+            latency   = {view: (list(counts), total) for view, (counts, total) in self.latency.items()}
+            requests  = dict(self.requests)
+            sent      = dict(self.bytes)
+            phases    = {name: tuple(item) for name, item in self.phases.items()}
+            in_flight = self.in_flight
+
+        lines = [
+            "# HELP provider_requests_in_flight Requests en curso.",
+            "# TYPE provider_requests_in_flight gauge",
+            f"provider_requests_in_flight {in_flight}",
+            "# HELP provider_request_duration_seconds Latencia por vista.",
+            "# TYPE provider_request_duration_seconds histogram",
+        ]
+        for view, (counts, total) in sorted(latency.items()):
+            cumulative = 0
+            for limit, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                lines.append(f'provider_request_duration_seconds_bucket{{view="{view}",le="{limit}"}} {cumulative}')
+            lines.append(f'provider_request_duration_seconds_sum{{view="{view}"}} {total:.6f}')
+            lines.append(f'provider_request_duration_seconds_count{{view="{view}"}} {cumulative}')
+
+        lines += ["# HELP provider_requests_total Requests por vista y status.", "# TYPE provider_requests_total counter"]
+        for (view, status), count in sorted(requests.items()):
+            lines.append(f'provider_requests_total{{view="{view}",status="{status}"}} {count}')
+
+        lines += ["# HELP provider_response_bytes_total Bytes de cuerpo enviados por vista.", "# TYPE provider_response_bytes_total counter"]
+        for view, nbytes in sorted(sent.items()):
+            lines.append(f'provider_response_bytes_total{{view="{view}"}} {nbytes}')
+
+        lines += ["# HELP provider_phase_seconds Tiempo acumulado por fase (ver Server-Timing).", "# TYPE provider_phase_seconds summary"]
+        for name, (count, total) in sorted(phases.items()):
+            lines.append(f'provider_phase_seconds_sum{{phase="{name}"}} {total:.6f}')
+            lines.append(f'provider_phase_seconds_count{{phase="{name}"}} {count}')
+
+        lines += [
+            "# HELP provider_cache_hits_total Aciertos de las caches LRU del proceso.",
+            "# TYPE provider_cache_hits_total counter",
+        ]
+        stats = [(name, cache.stats()) for name, cache in caches]
+        for name, item in stats:
+            lines.append(f'provider_cache_hits_total{{cache="{name}"}} {item["hits"]}')
+        lines += ["# TYPE provider_cache_misses_total counter"]
+        for name, item in stats:
+            lines.append(f'provider_cache_misses_total{{cache="{name}"}} {item["misses"]}')
+        lines += ["# TYPE provider_cache_hit_ratio gauge"]
+        for name, item in stats:
+            lines.append(f'provider_cache_hit_ratio{{cache="{name}"}} {item["hit_ratio"]:.6f}')
+        lines += ["# TYPE provider_cache_bytes gauge"]
+        for name, item in stats:
+            lines.append(f'provider_cache_bytes{{cache="{name}"}} {item["bytes"]}')
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+def server_timing(phases, total):
+    """Server-Timing: fase;dur=ms, ..., total;dur=ms"""
+    items = [f"{name};dur={seconds * 1000:.2f}" for name, seconds in phases.items()]
+    items.append(f"total;dur={total * 1000:.2f}")
+    return ", ".join(items)
+
+
+def count_sync(view, iterator):
+    nbytes = 0
+    try:
+        for chunk in iterator:
+            nbytes += len(chunk)
+            yield chunk
+    finally:
+        registry.add_bytes(view, nbytes)
+
+
+async def count_async(view, iterator):
+    nbytes = 0
+    try:
+        async for chunk in iterator:
+            nbytes += len(chunk)
+            yield chunk
+    finally:
+        registry.add_bytes(view, nbytes)
+
+
+class MetricsMiddleware:
+    """
+    Mide cada request a /api/: latencia por vista, status, bytes enviados y requests en curso,
+    y agrega Server-Timing con las fases registradas con phase() (busqueda de archivos, validadores,
+    decodificacion, recorte, header). El envio del cuerpo no alcanza a salir en Server-Timing
+    (los headers ya se enviaron), pero sus bytes si se cuentan.
+    Soporta WSGI y ASGI sin adaptar la cadena de middlewares.
+    """
+    sync_capable  = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.prefix       = getattr(settings, 'PROVIDER_METRICS_PREFIX', '/api/')
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not request.path.startswith(self.prefix):
+            return self.get_response(request)
+        phases, token, start = self.begin()
+        try:
+            response = self.get_response(request)
+        finally:
+            _phases.reset(token)
+        return self.end(request, response, phases, start)
+
+    async def __acall__(self, request):
+        if not request.path.startswith(self.prefix):
+            return await self.get_response(request)
+        phases, token, start = self.begin()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _phases.reset(token)
+        return self.end(request, response, phases, start)
+
+    def begin(self):
+        registry.start()
+        phases = {}
+        return phases, _phases.set(phases), time.perf_counter()
+
+    def end(self, request, response, phases, start):
+        total = time.perf_counter() - start
+        match = getattr(request, 'resolver_match', None)
+        view  = getattr(match.func, 'view_class', match.func).__name__ if match is not None else 'unmatched'
+        registry.finish(view, response.status_code, total, phases)
+        response['Server-Timing'] = server_timing(phases, total)
+
+        length = response.get('Content-Length')
+        if length is not None:
+            registry.add_bytes(view, int(length))
+        elif not response.streaming:
+            registry.add_bytes(view, len(response.content))
+        elif response.is_async:
+            response.streaming_content = count_async(view, response.streaming_content)
+        else:
+            response.streaming_content = count_sync(view, response.streaming_content)
+        return response
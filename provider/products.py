@@ -0,0 +1,116 @@
+#################################################################################################
+## PRODUCTOS DERIVADOS CALCULADOS EN EL SERVIDOR
+#################################################################################################
+import numpy as np
+
+
+def weighted_sources(values, weights):
+    """
+    Contraccion del eje de fuentes: sum_v values[:, v] * weights[v].
+    values (nt,nv,nz,ny,nx), weights (nv,) -> (nt,1,nz,ny,nx) float32.
+    einsum recorre el cubo una sola vez y no genera copias float32 del cubo completo.
+    """
+    weights = np.asarray(weights, dtype=np.float32)
+    result  = np.einsum('tvzyx,v->tzyx', values, weights, dtype=np.float32, casting='unsafe')
+    return result[:, np.newaxis]
+
+
+def point_series(values, jj, ii, ww, level=0):
+    """
+    Series (nt,nv,n) en n puntos, leyendo solo las celdas necesarias del cubo.
+    jj, ii, ww (n,k) son indices y pesos de interpolacion (k=1 vecino mas cercano, k=4 bilineal).
+    """
+    columns = np.asarray(values[:, :, level, jj, ii], dtype=np.float32)   # (nt,nv,n,k)
+    return np.einsum('tvnk,nk->tvn', columns, ww)
+
+
+def group_sources(labels):
+    """
+    Matriz de pertenencia (ngroups,nv) para sumar fuentes por etiqueta (ej. 'project').
+    Retorna (grupos ordenados por primera aparicion, matriz float32).
+    """
+    groups = list(dict.fromkeys(labels))
+    matrix = np.zeros((len(groups), len(labels)), dtype=np.float32)
+    for v, label in enumerate(labels):
+        matrix[groups.index(label), v] = 1
+    return groups, matrix
+
+
+def temporal_stats(field, percentiles=(), thresholds=()):
+    """
+    Reducciones sobre el eje de tiempo de field (nt,nz,ny,nx):
+    maximo, media, percentiles y numero de pasos de tiempo sobre cada umbral.
+    Retorna (nombres, arreglo float32 (nproductos,nz,ny,nx)).
+    Tambien la usa save_stats() en dataApp/visor_io.py para los productos precalculados al publicar
+    (este modulo solo depende de numpy, dataApp lo importa sin Django).
+    """
+    field  = np.asarray(field, dtype=np.float32)
+    names  = ['max', 'mean']
+    layers = [field.max(axis=0), field.mean(axis=0)]
+    if len(percentiles):
+        names  += [f'p{q:g}' for q in percentiles]
+        layers += list(np.percentile(field, percentiles, axis=0))
+    for threshold in thresholds:
+        names.append(f'exceed_{threshold:g}')
+        layers.append(np.count_nonzero(field > threshold, axis=0))
+    return names, np.stack(layers).astype(np.float32)
+
+
+ENSEMBLE_OPS = ('diff', 'mean', 'max', 'min', 'std')
+
+
+def align_valid_times(starts, dt, nts):
+    """
+    Ventana de tiempos validos comun a varias corridas.
+    starts: datetime de inicio de cada corrida, dt: paso (minutos, comun), nts: nt de cada corrida.
+    Retorna (offsets, nt, start): indice del primer paso comun en cada corrida, largo y tiempo valido inicial.
+    """
+    start   = max(starts)
+    offsets = []
+    for run_start in starts:
+        minutes = (start - run_start).total_seconds() / 60
+        if minutes % dt:
+            raise ValueError(f"Corridas desfasadas en {minutes:g} min, no multiplo de dt={dt:g}")
+        offsets.append(int(minutes // dt))
+    nt = min(n - offset for n, offset in zip(nts, offsets))
+    if nt <= 0:
+        raise ValueError("Las corridas no tienen tiempos validos en comun")
+    return offsets, nt, start
+
+
+def ensemble_fields(cubes, offsets, nt, op, z=slice(None), chunk=1):
+    """
+    Diferencia (cubes[0] - cubes[1]) o estadistica (mean, max, min, std) entre corridas del campo total
+    (suma sobre fuentes) en los nt pasos comunes. Recorre el tiempo por bloques de `chunk` pasos y cada
+    corrida se suma al acumulador del bloque, asi la memoria no crece con el numero de corridas.
+    cubes: lista de arreglos (nt,nv,nz,ny,nx) (memmap o en memoria). Retorna float32 (nt,nz,ny,nx).
+    """
+    if op == 'diff' and len(cubes) != 2:
+        raise ValueError("diff requiere exactamente 2 instancias")
+    shape  = cubes[0][:1, 0, z].shape[1:]
+    result = np.empty((nt,) + shape, dtype=np.float32)
+    for t0 in range(0, nt, chunk):
+        t1 = min(t0 + chunk, nt)
+        acc, sq = None, None
+        for k, (values, offset) in enumerate(zip(cubes, offsets)):
+            field = values[offset + t0:offset + t1, :, z].sum(axis=1, dtype=np.float32)   # (chunk,nz,ny,nx)
+            if acc is None:
+                acc = field.astype(np.float64) if op in ('mean', 'std') else field
+                sq  = np.square(acc) if op == 'std' else None
+            elif op == 'diff':
+                acc = acc - field
+            elif op == 'max':
+                np.maximum(acc, field, out=acc)
+            elif op == 'min':
+                np.minimum(acc, field, out=acc)
+            else:
+                acc += field
+                if op == 'std':
+                    sq += np.square(field, dtype=np.float64)
+        n = len(cubes)
+        if op == 'mean':
+            acc = acc / n
+        elif op == 'std':
+            acc = np.sqrt(np.maximum(sq / n - np.square(acc / n), 0))
+        result[t0:t1] = acc
+    return result
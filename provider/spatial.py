@@ -0,0 +1,170 @@
+#################################################################################################
+## INDICE ESPACIAL SOBRE GRILLAS CURVILINEAS (lon, lat) DEL VISOR
+#################################################################################################
+import json
+import numpy as np
+from scipy.spatial import cKDTree
+from django.conf import settings
+from .cache import CubeCache, file_key
+from .storage import find_cube, load_cube
+
+
+class GridIndex:
+    """
+    KD-tree sobre los centros de una grilla (ny,nx) de lon/lat.
+    Las longitudes se escalan por cos(lat media) para que la distancia sea aproximadamente isotropica.
+    """
+    def __init__(self, lon, lat):
+        self.lon    = np.asarray(lon, dtype=np.float64)
+        self.lat    = np.asarray(lat, dtype=np.float64)
+        self.ny, self.nx = self.lon.shape
+        self.coslat = float(np.cos(np.deg2rad(np.nanmean(self.lat))))
+        self.xx     = self.lon * self.coslat
+        self.tree   = cKDTree(np.column_stack([self.xx.ravel(), self.lat.ravel()]))
+
+        # Tamaño tipico de celda, para marcar puntos fuera de la grilla
+        steps = []
+        if self.nx > 1:
+            steps.append(np.hypot(np.diff(self.xx, axis=1), np.diff(self.lat, axis=1)).max())
+        if self.ny > 1:
+            steps.append(np.hypot(np.diff(self.xx, axis=0), np.diff(self.lat, axis=0)).max())
+        self.cell = float(max(steps)) if steps else 0.0
+
+    @property
+    def nbytes(self):
+        # Estimacion: lon, lat y xx + datos (2 columnas) e indices del KD-tree
+        return 6 * self.lon.nbytes
+
+    def nearest(self, lon, lat):
+        """Indices (j, i) de la celda mas cercana y si el punto cae dentro de la grilla."""
+        lon  = np.atleast_1d(np.asarray(lon, dtype=np.float64))
+        lat  = np.atleast_1d(np.asarray(lat, dtype=np.float64))
+        dist, flat = self.tree.query(np.column_stack([lon * self.coslat, lat]))
+        j, i = np.unravel_index(flat, (self.ny, self.nx))
+        inside = dist <= self.cell
+        return j, i, inside
+
+    def bilinear(self, lon, lat):
+        """
+        Indices y pesos bilineales (n,4) para cada punto.
+        Parte de la celda mas cercana y resuelve la posicion fraccional (i, j) con el jacobiano local
+        de la grilla, por lo que no recorre las nx*ny celdas.
+        """
+        lon  = np.atleast_1d(np.asarray(lon, dtype=np.float64))
+        lat  = np.atleast_1d(np.asarray(lat, dtype=np.float64))
+        j, i, inside = self.nearest(lon, lat)
+
+        # Diferencias finitas hacia adelante (hacia atras en el borde)
+        i_nb = np.where(i < self.nx - 1, i + 1, i - 1)
+        j_nb = np.where(j < self.ny - 1, j + 1, j - 1)
+        sign_i = np.where(i < self.nx - 1, 1.0, -1.0)
+        sign_j = np.where(j < self.ny - 1, 1.0, -1.0)
+        dx_di = (self.xx[j, i_nb]  - self.xx[j, i])  * sign_i
+        dy_di = (self.lat[j, i_nb] - self.lat[j, i]) * sign_i
+        dx_dj = (self.xx[j_nb, i]  - self.xx[j, i])  * sign_j
+        dy_dj = (self.lat[j_nb, i] - self.lat[j, i]) * sign_j
+        if self.nx == 1:
+            dx_di, dy_di = np.ones_like(dx_di), np.zeros_like(dy_di)
+        if self.ny == 1:
+            dx_dj, dy_dj = np.zeros_like(dx_dj), np.ones_like(dy_dj)
+
+        rx  = lon * self.coslat - self.xx[j, i]
+        ry  = lat - self.lat[j, i]
+        det = dx_di * dy_dj - dx_dj * dy_di
+        det = np.where(det == 0, np.inf, det)
+        di  = ( dy_dj * rx - dx_dj * ry) / det
+        dj  = (-dy_di * rx + dx_di * ry) / det
+
+        fi = np.clip(i + di, 0, self.nx - 1)
+        fj = np.clip(j + dj, 0, self.ny - 1)
+        i0 = np.minimum(np.floor(fi).astype(np.intp), max(self.nx - 2, 0))
+        j0 = np.minimum(np.floor(fj).astype(np.intp), max(self.ny - 2, 0))
+        i1 = np.minimum(i0 + 1, self.nx - 1)
+        j1 = np.minimum(j0 + 1, self.ny - 1)
+        wx = fi - i0
+        wy = fj - j0
+
+        jj = np.stack([j0, j0, j1, j1], axis=1)
+        ii = np.stack([i0, i1, i0, i1], axis=1)
+        ww = np.stack([(1 - wx) * (1 - wy), wx * (1 - wy), (1 - wx) * wy, wx * wy], axis=1)
+        return jj, ii, ww.astype(np.float32), inside
+
+
+grid_cache = CubeCache(getattr(settings, 'PROVIDER_GRID_CACHE_MAX_BYTES', 128 * 1024**2))
+
+
+def coord_files(dir_visor, attrs):
+    """Archivos de las coordenadas (lon, lat) de una variable, del mismo nivel de la piramide (attrs.lod)."""
+    lod      = attrs.get('lod', 0)
+    file_lon = find_cube(dir_visor, attrs['coordx'], lod)
+    file_lat = find_cube(dir_visor, attrs['coordy'], lod)
+    if file_lon is None or file_lat is None:
+        raise FileNotFoundError(f"Coordenadas no encontradas: {attrs['coordx']}, {attrs['coordy']}")
+    return file_lon, file_lat
+
+
+def grid_arrays(dir_visor, attrs):
+    """
+    Grillas (lon, lat) float32 contiguas (ny,nx), listas para enviar.
+    Todas las variables de una grilla comparten la misma entrada de cache.
+    """
+    file_lon, file_lat = coord_files(dir_visor, attrs)
+    key    = ('arrays', file_key(file_lon), file_key(file_lat))
+    arrays = grid_cache.get(key)
+    if arrays is None:
+        lon    = np.ascontiguousarray(load_cube(file_lon)["values"][0, 0, 0], dtype='<f4')
+        lat    = np.ascontiguousarray(load_cube(file_lat)["values"][0, 0, 0], dtype='<f4')
+        arrays = (lon, lat)
+        grid_cache.put(key, arrays, lon.nbytes + lat.nbytes)
+    return arrays
+
+
+def grid_index(dir_visor, attrs):
+    """
+    GridIndex de la grilla de una variable (attrs['coordx'] contiene lon y attrs['coordy'] lat).
+    Se construye una vez por par de archivos de coordenadas y se comparte entre variables.
+    """
+    file_lon, file_lat = coord_files(dir_visor, attrs)
+    key   = (file_key(file_lon), file_key(file_lat))
+    index = grid_cache.get(key)
+    if index is None:
+        lon   = load_cube(file_lon)["values"][0, 0, 0]
+        lat   = load_cube(file_lat)["values"][0, 0, 0]
+        index = GridIndex(lon, lat)
+        grid_cache.put(key, index, index.nbytes)
+    return index
+
+
+def receptor_weights(dir_visor, attrs, places_file, method='bilinear'):
+    """
+    Indices y pesos de interpolacion de todos los puntos de places.geojson sobre la grilla de una variable.
+    Se calculan una vez por (grilla, places.geojson, method) y se comparten entre variables y requests.
+    Retorna un dict con names, lon, lat (n,) y jj, ii, ww (n,k), inside (n,).
+    """
+    file_lon, file_lat = coord_files(dir_visor, attrs)
+    key       = ('receptors', method, file_key(file_lon), file_key(file_lat), file_key(places_file))
+    receptors = grid_cache.get(key)
+    if receptors is None:
+        with open(places_file, 'r') as f:
+            features = json.load(f).get("features", [])
+        points = [feature for feature in features if (feature.get("geometry") or {}).get("type") == "Point"]
+        names  = [(feature.get("properties") or {}).get("name", str(n)) for n, feature in enumerate(points)]
+        lon    = np.array([feature["geometry"]["coordinates"][0] for feature in points], dtype=np.float64)
+        lat    = np.array([feature["geometry"]["coordinates"][1] for feature in points], dtype=np.float64)
+        index  = grid_index(dir_visor, attrs)
+        if method == 'nearest':
+            j, i, inside = index.nearest(lon, lat)
+            jj, ii, ww = j[:, None], i[:, None], np.ones((lon.size, 1), dtype=np.float32)
+        else:
+            jj, ii, ww, inside = index.bilinear(lon, lat)
+        receptors = {
+            "names" : names,
+            "lon"   : lon,
+            "lat"   : lat,
+            "jj"    : jj,
+            "ii"    : ii,
+            "ww"    : ww,
+            "inside": inside,
+        }
+        grid_cache.put(key, receptors, lon.nbytes * 2 + jj.nbytes + ii.nbytes + ww.nbytes + inside.nbytes)
+    return receptors
@@ -0,0 +1,274 @@
+#################################################################################################
+## LECTURA DE CUBOS PUBLICADOS POR dataApp/trigger.py
+#################################################################################################
+import os
+import json
+import numpy as np
+from .cache import cube_cache, file_key
+from .metrics import phase
+
+## Formatos (ver dataApp/visor_io.py)
+#   raw: <variable>/values.bin + <variable>/header.json
+#   npz: <variable>/data.npz (instancias antiguas)
+RAW_HEADER = "header.json"
+RAW_VALUES = "values.bin"
+NPZ_FILE   = "data.npz"
+## Formato raw disperso: <variable>/sparse.bin en lugar de values.bin (header["sparse"] describe sus partes)
+SPARSE_VALUES = "sparse.bin"
+SPARSE_TYPE   = "application/vnd.visor.sparse"
+## Estadisticas temporales precalculadas de una variable: <variable>/stats/ (cubo con attrs["products"])
+STATS_DIR = "stats"
+
+## Eje de los parametros (scale, offset) de un cubo cuantizado, segun quant["per"]
+QUANT_AXIS = {
+    'frame' : 0,
+    'source': 1,
+}
+
+## Copias precomprimidas de values.bin, en orden de preferencia del servidor
+PRECOMPRESSED = (
+    ('zstd', '.zst'),
+    ('br'  , '.br'),
+    ('gzip', '.gz'),
+)
+
+
+def find_cube(dir_visor, variable, lod=0):
+    """
+    Retorna el archivo que describe la variable (header.json o data.npz), o None si no existe.
+    El formato raw tiene prioridad. lod > 0: nivel lod de la piramide (<variable>/lod<k>/).
+    """
+    dir_variable = os.path.join(dir_visor, variable, f'lod{lod}') if lod else os.path.join(dir_visor, variable)
+    with phase('find'):
+        for name in (RAW_HEADER, NPZ_FILE):
+            path = os.path.join(dir_variable, name)
+            if os.path.exists(path):
+                return path
+    return None
+
+
+def read_npz(npz_file):
+    """
+    Decodifica un data.npz completo.
+    Retorna un dict con el cubo (nt,nv,nz,ny,nx), su metadata y los bytes listos para enviar.
+    """
+    npz = np.load(npz_file, allow_pickle=True)
+    values_bytes = npz["values"].tobytes()
+    values = np.frombuffer(values_bytes, dtype=npz["values"].dtype).reshape(npz["values"].shape)
+    return {
+        "values"  : values,            # vista de solo lectura sobre "bytes"
+        "bytes"   : values_bytes,
+        "path"    : None,
+        "nt"      : int(npz["nt"]),
+        "nv"      : int(npz["nv"]),
+        "nz"      : int(npz["nz"]),
+        "ny"      : int(npz["ny"]),
+        "nx"      : int(npz["nx"]),
+        "attrs"   : npz["attrs"].item(),
+        "compress": str(npz["compress"]),
+        "quant"   : npz["quant"].item() if "quant" in npz.files else None,
+        "sparse"  : None,
+    }
+
+
+def read_raw(header_file):
+    """
+    Lee header.json y mapea values.bin en memoria (sin copiarlo).
+    "path" apunta a values.bin para poder enviarlo directamente con sendfile.
+    """
+    with open(header_file, 'r') as f:
+        header = json.load(f)
+    shape  = (header["nt"], header["nv"], header["nz"], header["ny"], header["nx"])
+    if header.get("sparse"):
+        ## Disperso: se expande a denso una vez (queda en la cache como un npz)
+        sparse_path = os.path.join(os.path.dirname(header_file), SPARSE_VALUES)
+        with open(sparse_path, 'rb') as f:
+            values_bytes = sparse_decode(f.read(), header["sparse"], shape, header["dtype"]).tobytes()
+        values      = np.frombuffer(values_bytes, dtype=np.dtype(header["dtype"])).reshape(shape)
+        values_path = None
+    else:
+        values_path  = os.path.join(os.path.dirname(header_file), RAW_VALUES)
+        values       = np.memmap(values_path, dtype=np.dtype(header["dtype"]), mode='r', shape=shape)
+        values_bytes = None
+        sparse_path  = None
+    return {
+        "values"  : values,
+        "bytes"   : values_bytes,
+        "path"    : values_path,
+        "nt"      : header["nt"],
+        "nv"      : header["nv"],
+        "nz"      : header["nz"],
+        "ny"      : header["ny"],
+        "nx"      : header["nx"],
+        "attrs"   : header["attrs"],
+        "compress": header["compress"],
+        "quant"   : header.get("quant"),
+        "sparse"  : {**header["sparse"], "path": sparse_path} if header.get("sparse") else None,
+    }
+
+
+def sparse_decode(data, layout, shape, dtype):
+    """
+    Expande sparse.bin (ver sparse_encode() en dataApp/visor_io.py) a un arreglo denso shape.
+    data: bytes del archivo (o de la respuesta sparse de /api/data/); layout: header["sparse"].
+    """
+    ny, nx = shape[-2:]
+    dtype  = np.dtype(dtype)
+    dense  = np.zeros((layout["nframes"], ny, nx), dtype=dtype)
+    frames = np.frombuffer(data, dtype='<i4', count=layout["nframes"] * 5, offset=layout["frames"][0]).reshape(-1, 5)
+    bitmap = np.frombuffer(data, dtype=np.uint8, count=layout["bitmap"][1], offset=layout["bitmap"][0])
+    values = np.frombuffer(data, dtype=dtype, count=layout["values"][1] // dtype.itemsize, offset=layout["values"][0])
+    cells  = (frames[:, 1] - frames[:, 0]) * (frames[:, 3] - frames[:, 2])
+    bits_start   = np.concatenate([[0], np.cumsum((cells + 7) // 8)])
+    values_start = np.concatenate([[0], np.cumsum(frames[:, 4])])
+    for f in np.flatnonzero(frames[:, 4]):
+        j0, j1, i0, i1, nnz = frames[f]
+        mask = np.unpackbits(bitmap[bits_start[f]:bits_start[f + 1]], count=cells[f]).view(bool).reshape(j1 - j0, i1 - i0)
+        dense[f, j0:j1, i0:i1][mask] = values[values_start[f]:values_start[f] + nnz]
+    return dense.reshape(shape)
+
+
+def load_cube(cube_file):
+    """
+    Lee una variable (raw o npz) pasando por la cache LRU del proceso.
+    El cubo retornado es compartido: no debe modificarse.
+    Un cubo raw ocupa en la cache lo que pesa el values.bin mapeado, asi la LRU tambien acota los mmaps
+    (y descriptores) abiertos; uno raw disperso ocupa su version densa.
+    cube["values"] son los valores almacenados (lo que se envia); cube["field"] los mismos en unidades
+    fisicas (igual a "values" salvo en cubos cuantizados), para los productos calculados en el servidor.
+    """
+    key  = file_key(cube_file)
+    cube = cube_cache.get(key)
+    if cube is None:
+        with phase('decode'):
+            if os.path.basename(cube_file) == RAW_HEADER:
+                cube   = read_raw(cube_file)
+                nbytes = os.path.getsize(cube_file) + (len(cube["bytes"]) if cube["bytes"] is not None
+                                                        else os.path.getsize(cube["path"]))
+            else:
+                cube   = read_npz(cube_file)
+                nbytes = len(cube["bytes"])
+            cube["field"] = Dequantized(cube["values"], cube["quant"]) if cube["quant"] else cube["values"]
+        cube_cache.put(key, cube, nbytes)
+    return cube
+
+
+class Dequantized:
+    """
+    Vista en unidades fisicas (float32) de un cubo cuantizado (ver quantize() en dataApp/visor_io.py).
+    Indexar decodifica solo lo seleccionado; np.asarray() decodifica el cubo completo.
+    """
+    def __init__(self, codes, quant):
+        self.codes  = codes
+        self.quant  = quant
+        self.shape  = codes.shape
+        self.ndim   = codes.ndim
+        self.dtype  = np.dtype(np.float32)
+        shape = [1] * codes.ndim
+        shape[QUANT_AXIS[quant["per"]]] = -1
+        self.scale  = np.asarray(quant["scale"], dtype=np.float32).reshape(shape)
+        self.offset = np.asarray(quant["offset"], dtype=np.float32).reshape(shape)
+        self.floor  = np.float32(quant["floor"]) if quant.get("log") else None
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, key):
+        codes  = np.asarray(self.codes[key])
+        scale  = np.broadcast_to(self.scale, self.shape)[key]
+        offset = np.broadcast_to(self.offset, self.shape)[key]
+        values = codes * scale + offset
+        if self.floor is not None:
+            values = self.floor * np.expm1(values)
+        return values.astype(np.float32, copy=False)
+
+    def __array__(self, dtype=None, copy=None):
+        values = self[...]
+        return values if dtype is None else values.astype(dtype, copy=False)
+
+
+def slice_quant(quant, t=slice(None), v=slice(None)):
+    """Parametros de decodificacion de un recorte values[t, v]: se recortan scale/offset de su eje."""
+    if quant is None:
+        return None
+    index = t if QUANT_AXIS[quant["per"]] == 0 else v
+    return {
+        **quant,
+        "scale" : np.asarray(quant["scale"])[index].tolist(),
+        "offset": np.asarray(quant["offset"])[index].tolist(),
+    }
+
+
+def cube_bytes(cube):
+    """Bytes del cubo completo (lee values.bin si el formato es raw)."""
+    if cube["bytes"] is not None:
+        return cube["bytes"]
+    with open(cube["path"], 'rb') as f:
+        return f.read()
+
+
+def hyperslab(cube, t=slice(None), v=slice(None), z=slice(None)):
+    """
+    Sub-cubo values[t, v, z] como arreglo contiguo.
+    Los recortes basicos (t, z) se aplican primero, asi un cubo raw (memmap) solo lee las paginas necesarias.
+    """
+    with phase('slice'):
+        values = cube["values"][t, :, z]
+        if not (isinstance(v, slice) and v == slice(None)):
+            values = values[:, v]
+        return np.ascontiguousarray(values)
+
+
+def parse_accept_encoding(header):
+    """'gzip, br;q=0.8, *;q=0' -> {'gzip': 1.0, 'br': 0.8, '*': 0.0}"""
+    accepted = {}
+    for item in header.split(','):
+        parts = item.strip().split(';')
+        coding = parts[0].strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in parts[1:]:
+            key, _, value = param.strip().partition('=')
+            if key.strip() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[coding] = q
+    return accepted
+
+
+def sparse_file(cube_file, accept):
+    """sparse.bin de la variable si existe y el cliente lo acepta (Accept: application/vnd.visor.sparse)."""
+    if os.path.basename(cube_file) != RAW_HEADER or SPARSE_TYPE not in (accept or ''):
+        return None
+    path = os.path.join(os.path.dirname(cube_file), SPARSE_VALUES)
+    return path if os.path.exists(path) else None
+
+
+def precompressed_file(cube_file, accept_encoding):
+    """
+    Elige la copia precomprimida de values.bin segun Accept-Encoding.
+    Retorna (path, coding) o None para enviar identity. Se ignoran copias mas antiguas que values.bin.
+    """
+    if os.path.basename(cube_file) != RAW_HEADER or not accept_encoding:
+        return None
+    accepted = parse_accept_encoding(accept_encoding)
+    values_path = os.path.join(os.path.dirname(cube_file), RAW_VALUES)
+    candidates = []
+    for rank, (coding, suffix) in enumerate(PRECOMPRESSED):
+        q = accepted.get(coding, accepted.get('*', 0.0))
+        if q <= 0:
+            continue
+        path = values_path + suffix
+        try:
+            if os.stat(path).st_mtime_ns < os.stat(values_path).st_mtime_ns:
+                continue
+        except FileNotFoundError:
+            continue
+        candidates.append((-q, rank, path, coding))
+    if not candidates:
+        return None
+    _, _, path, coding = min(candidates)
+    return path, coding
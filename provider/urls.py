@@ -1,7 +1,7 @@
 from django.urls import path
 from django.views.generic import TemplateView, RedirectView
 
-from .views import ContextAPI, InstancesAPI, VariablesAPI, PlacesAPI, SourcesAPI, DataAPI, DataJsonAPI
+from .views import ContextAPI, InstancesAPI, VariablesAPI, PlacesAPI, SourcesAPI, DataAPI, DataJsonAPI, CacheStatsAPI, AggregateAPI, SeriesAPI, BundleAPI, CatalogAPI, StatsAPI, ReceptorsAPI, EnsembleAPI
 urlpatterns = [
     path('context/', ContextAPI.as_view(), name='context_api'),
     path('instances/', InstancesAPI.as_view(), name='instances_api'),
@@ -10,4 +10,12 @@ urlpatterns = [
     path('sources/', SourcesAPI.as_view(), name='sources_api'),
     path('data/', DataAPI.as_view(), name='data_api'),
     path('datajson/', DataJsonAPI.as_view(), name='data_json_api'),
+    path('cache/', CacheStatsAPI.as_view(), name='cache_api'),
+    path('aggregate/', AggregateAPI.as_view(), name='aggregate_api'),
+    path('series/', SeriesAPI.as_view(), name='series_api'),
+    path('bundle/', BundleAPI.as_view(), name='bundle_api'),
+    path('catalog/', CatalogAPI.as_view(), name='catalog_api'),
+    path('stats/', StatsAPI.as_view(), name='stats_api'),
+    path('receptors/', ReceptorsAPI.as_view(), name='receptors_api'),
+    path('ensemble/', EnsembleAPI.as_view(), name='ensemble_api'),
 ]
\ No newline at end of file
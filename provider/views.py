@@ -9,9 +9,15 @@ from geojson import Point, Feature, FeatureCollection
 from django.conf import settings
 from dj_apiMap.settings import BASE_DIR
 import jwt
+import numpy as np
+from .storage import find_cube, load_cube
+from .caching import is_immutable, file_validators, not_modified, set_validators, catalog_response
+from .catalog import Catalog, grids_info
+from .aio import offload
+from .metrics import phase
 
 #### Set some global variables
-dir_root          = os.path.join(settings.BASE_DIR, 'dataApp')
+dir_root          = str(getattr(settings, 'PROVIDER_DATA_DIR', os.path.join(settings.BASE_DIR, 'dataApp')))
 
 hoursRun          = 24*7              # Total hours of the simulation
 startHour         = 0                 # Start hour of the simulation
@@ -50,15 +56,98 @@ for place_name, (lon, lat) in places['points'].items():
     geoFeature = Feature(geometry=geoElement, properties=properties)
     geoCollection.features.append(geoFeature)
 
+#### Catalogo de instancias READY (en memoria, ver provider/catalog.py)
+catalog = Catalog(dir_root, domains)
+
 def instances_info(domain):
-    instances = [i for i in os.listdir(dir_root) if i.startswith('20')]
-    instances_per_domain = [i for i in instances if os.path.exists(os.path.join(dir_root, i, domain))]
-    return instances_per_domain
+    return catalog.instances(domain)
 
 def variables_info(domain, instance):
-    dir_visor  = os.path.join(dir_root, instance, domain, 'visor')
-    variables  = [v for v in os.listdir(dir_visor) if os.path.isdir(os.path.join(dir_visor, v))]
-    return variables
+    return list(catalog.variables(domain, instance))
+
+def context_info():
+    return {
+        "hoursRun"           : hoursRun,
+        "startHour"          : startHour,
+        "endHour"            : endHour,
+        "optionLocalTime"    : optionLocalTime,
+        "ref_dt"             : ref_dt,
+        "domains"            : domains,
+        "variableSelector"   : variableSelector,
+        "auxiliaryVairbales" : auxiliaryVairbales,
+        'pointSerieDefault'  : pointSerieDefault,
+        "places"             : geoCollection,
+    }
+
+def select_lod(request, dir_visor, variable):
+    """
+    Archivo de la variable en el nivel de detalle pedido (None si la variable no existe):
+        lod=k      : nivel k de la piramide (0 = resolucion completa)
+        maxcells=N : el nivel mas fino con ny*nx <= N
+    Se acota al nivel mas grueso publicado (attrs['lod_levels'] del header, no los directorios lod<k>
+    presentes); variables sin piramide se entregan completas.
+    Lanza ValueError si los parametros no son validos.
+    """
+    cube_file = find_cube(dir_visor, variable)
+    if cube_file is None or not any(key in request.GET for key in ('lod', 'maxcells')):
+        return cube_file
+    if 'lod' in request.GET:
+        lod = int(request.GET["lod"])
+        if lod < 0:
+            raise ValueError("lod debe ser >= 0")
+    else:
+        maxcells = int(request.GET["maxcells"])
+        if maxcells < 1:
+            raise ValueError("maxcells debe ser >= 1")
+        cube   = load_cube(cube_file)
+        ny, nx = cube["ny"], cube["nx"]
+        lod    = 0
+        while ny * nx > maxcells and min(ny, nx) > 1:
+            ny, nx = (ny + 1) // 2, (nx + 1) // 2
+            lod   += 1
+    lod = min(lod, load_cube(cube_file)["attrs"].get("lod_levels", 0))
+    return find_cube(dir_visor, variable, lod) if lod else cube_file
+
+def open_cube(request, extra_files=(), variable=None):
+    """
+    Resuelve domain/instance/variable desde la request y carga el cubo (pasando por la cache).
+    Retorna (cube, validators, None) o (None, None, response), donde response es un error o un 304.
+    validators = (etag, last_modified, immutable) se usa con set_validators() sobre la respuesta final.
+    extra_files: otros archivos del directorio visor de los que depende la respuesta (entran al ETag).
+    variable: directorio a cargar en lugar del parametro variable (ej. <variable>/stats).
+    """
+    instance = request.GET.get("instance")
+    domain   = request.GET.get("domain")
+    variable = variable or request.GET.get("variable")
+    if domain not in domains:
+        return None, None, JsonResponse({"error": "Dominio no valido"}, status=400)
+    try:
+        dir_visor = os.path.join(dir_root, instance, domain, 'visor')
+        try:
+            cube_file = select_lod(request, dir_visor, variable)
+        except ValueError as e:
+            return None, None, JsonResponse({"error": str(e)}, status=400)
+        if cube_file is None:
+            return None, None, JsonResponse({"error": f"Archivo completo no encontrado: {os.path.join(dir_visor, variable)}"}, status=404)
+        etag, last_modified = file_validators(request, [cube_file] + [os.path.join(dir_visor, name) for name in extra_files])
+        immutable = is_immutable(request, [os.path.join(dir_root, instance)])
+        response = not_modified(request, etag, last_modified, immutable)
+        if response is not None:
+            return None, None, response
+        return load_cube(cube_file), (etag, last_modified, immutable), None
+    except Exception as e:
+        return None, None, JsonResponse({"error": f"Error leyendo archivo completo: {str(e)}"}, status=500)
+
+def parse_vector(text, n, default):
+    """
+    Convierte "1,2.5,0" en un vector float32 de largo n. Si text es vacio se usa default en todo el vector.
+    """
+    if not text:
+        return np.full(n, default, dtype=np.float32)
+    vector = np.array([float(x) for x in text.split(',')], dtype=np.float32)
+    if vector.size != n:
+        raise ValueError(f"Se esperaban {n} valores y se recibieron {vector.size}")
+    return vector
 
 from django.views import View
 from django.http import JsonResponse
@@ -69,29 +158,21 @@ class ContextAPI(View):
         URL Ejemplo:
         /api/context/
         """
-        dict_context = {
-            "hoursRun"           : hoursRun,
-            "startHour"          : startHour,
-            "endHour"            : endHour,
-            "optionLocalTime"    : optionLocalTime,
-            "ref_dt"             : ref_dt,
-            "domains"            : domains,
-            "variableSelector"   : variableSelector,
-            "auxiliaryVairbales" : auxiliaryVairbales,
-            'pointSerieDefault'  : pointSerieDefault,
-            "places"             : geoCollection,
-        }
+        dict_context = context_info()
         # return JsonResponse({"error": "No autorizado"}, status=401)
-        return JsonResponse(dict_context, safe=False)
+        return catalog_response(request, JsonResponse(dict_context, safe=False))
     
 
     
 from django.views import View
 from django.http import JsonResponse
+@offload
 class InstancesAPI(View):
-    def get(self, request, *args, **kwargs):
+    def respond(self, request, *args, **kwargs):
         """
-        API para obtener las instancias del dominio
+        API para obtener las instancias del dominio (solo instancias con READY)
+        generations: {instancia: generacion}; las URLs de datos que agregan gen=<generacion> se cachean
+        como immutable (ver caching.is_immutable)
         URL Ejemplo:
         /api/instances/?domain=antucoya
         """
@@ -101,16 +182,18 @@ class InstancesAPI(View):
             return JsonResponse({"error": "Dominio no valido"}, status=400)
 
         dict_variable = {
-            "domain"   : domain,
-            "instances": instances_info(domain),
+            "domain"     : domain,
+            "instances"  : instances_info(domain),
+            "generations": catalog.generations(domain),
         }
-        return JsonResponse(dict_variable, safe=False)
+        return catalog_response(request, JsonResponse(dict_variable, safe=False))
             
 
 from django.views import View
 from django.http import JsonResponse
+@offload
 class VariablesAPI(View):
-    def get(self, request, *args, **kwargs):
+    def respond(self, request, *args, **kwargs):
         """
         API para obtener las variables de la instancia del dominio
         URL Ejemplo:
@@ -125,10 +208,11 @@ class VariablesAPI(View):
             "domains"  : domain,
             "variables": variables_info(domain, instance),
         }
-        return JsonResponse(dict_variable, safe=False)
+        return catalog_response(request, JsonResponse(dict_variable, safe=False))
 
+@offload
 class PlacesAPI(View):
-    def get(self, request, *args, **kwargs):
+    def respond(self, request, *args, **kwargs):
         """
         API para obtener lugares de interes para un dominio en una instancia particular
         URL Ejemplo:
@@ -141,13 +225,21 @@ class PlacesAPI(View):
         
         places_geojson_path = os.path.join(dir_root, instance, domain, 'visor', f'places.geojson')
         if not os.path.exists(places_geojson_path):
-            return {"error": "places.geojson no encontrado"}
+            return JsonResponse({"error": "places.geojson no encontrado"}, status=404)
+
+        etag, last_modified = file_validators(request, [places_geojson_path])
+        immutable = is_immutable(request, [os.path.join(dir_root, instance)])
+        response  = not_modified(request, etag, last_modified, immutable)
+        if response is not None:
+            return response
         with open(places_geojson_path, 'r') as f:
             places_geojson = geojson.load(f)
-        return JsonResponse(places_geojson, safe=False)
+        response = JsonResponse(places_geojson, safe=False)
+        return set_validators(response, etag, last_modified, immutable)
     
+@offload
 class SourcesAPI(View):
-    def get(self, request, *args, **kwargs):
+    def respond(self, request, *args, **kwargs):
         """
         API para obtener fuentes de emisiones para un dominio en una instancia particular
         URL Ejemplo:
@@ -162,26 +254,79 @@ class SourcesAPI(View):
 
         sources_geojson_path = os.path.join(dir_root, instance, domain, 'visor', f'{species}.geojson')
         if not os.path.exists(sources_geojson_path):
-            return {"error": "sources.geojson no encontrado"}
+            return JsonResponse({"error": "sources.geojson no encontrado"}, status=404)
+
+        etag, last_modified = file_validators(request, [sources_geojson_path])
+        immutable = is_immutable(request, [os.path.join(dir_root, instance)])
+        response  = not_modified(request, etag, last_modified, immutable)
+        if response is not None:
+            return response
         with open(sources_geojson_path, 'r') as f:
             sources_geojson = geojson.load(f)        
-        return JsonResponse(sources_geojson, safe=False)
+        response = JsonResponse(sources_geojson, safe=False)
+        return set_validators(response, etag, last_modified, immutable)
 
-import gzip
 import numpy as np
 from django.http import HttpResponse
+from django.http import FileResponse
+from django.utils.cache import patch_vary_headers
+from .storage import find_cube, load_cube, hyperslab, precompressed_file, slice_quant, sparse_file, SPARSE_TYPE
+HYPERSLAB_PARAMS = ('t0', 't1', 'tstep', 'v', 'level')
+def parse_hyperslab(request, nt, nv, nz):
+    """
+    Lee los parametros opcionales t0, t1, tstep (slice de python sobre nt), v (lista de fuentes) y level.
+    Retorna None si la request no pide recorte, o un dict con los indices para hyperslab().
+    """
+    params = request.GET
+    if not any(key in params for key in HYPERSLAB_PARAMS):
+        return None
+    t0    = int(params.get('t0', 0))
+    t1    = int(params.get('t1', nt))
+    tstep = int(params.get('tstep', 1))
+    if not (0 <= t0 < t1 <= nt and tstep >= 1):
+        raise ValueError(f"Rango de tiempo no valido: t0={t0}, t1={t1}, tstep={tstep} (nt={nt})")
+    t = slice(t0, t1, tstep)
+
+    v = slice(None)
+    if params.get('v'):
+        v = [int(x) for x in params['v'].split(',')]
+        if not all(0 <= x < nv for x in v):
+            raise ValueError(f"Fuentes fuera de rango (nv={nv})")
+
+    z = slice(None)
+    if 'level' in params:
+        level = int(params['level'])
+        if not 0 <= level < nz:
+            raise ValueError(f"Nivel fuera de rango (nz={nz})")
+        z = slice(level, level + 1)
+    return {"t": t, "v": v, "z": z}
+
+@offload
 class DataAPI(View):
-    def get(self, request, *args, **kwargs):
+    def respond(self, request, *args, **kwargs):
         """
-        API optimizada para obtener raster preprocesado desde archivo .npz.
+        API optimizada para obtener raster preprocesado (values.bin o archivo .npz).
+        En formato raw el cuerpo se envia directo desde el archivo (sendfile), sin pasar por Python.
+        Parametros opcionales de recorte (hyperslab):
+            t0, t1, tstep: rango de tiempo [t0, t1) con paso tstep (attrs.dt se multiplica por tstep)
+            v            : lista de fuentes separadas por coma
+            level        : un nivel z
+        Nivel de detalle (piramide publicada con la variable, ver select_lod):
+            lod          : nivel k (grilla reducida 2^k veces, attrs.lod y attrs.dx/dy del nivel en el header)
+            maxcells     : el nivel mas fino con ny*nx <= maxcells
+        Las coordenadas del mismo nivel se piden con la misma opcion sobre attrs.coordx/coordy.
+        gen=<generacion de la instancia> (ver /api/instances/): si es la actual la respuesta es immutable.
+        Sin recorte, si existe una copia precomprimida (values.bin.zst/.br/.gz) aceptada por el
+        Accept-Encoding del cliente, se envia esa copia con su Content-Encoding.
+        Variables guardadas en formato disperso (sparse.bin): se envian tal cual a clientes con
+        Accept: application/vnd.visor.sparse (header.sparse describe las partes, ver storage.sparse_decode)
+        y expandidas a denso al resto.
         Ejemplo de URL:
         /api/data/?domain=antucoya&instance=2025-07-24_00&variable=mp10_hd_lat
+        /api/data/?domain=antucoya&instance=2025-07-24_00&variable=mp10_hd_species&t0=0&t1=4&v=0,2&level=0
+        /api/data/?domain=antucoya&instance=2025-07-24_00&variable=mp10_hd_species&maxcells=20000
         """
 
-        ## Encode with gzip. 
-        # Mas liviano, pero mas lento de leer en el cliente
-        encode = False
-       
         instance = request.GET.get("instance")
         domain   = request.GET.get("domain")
         variable = request.GET.get("variable")
@@ -189,27 +334,57 @@ class DataAPI(View):
         if domain not in domains:
             return JsonResponse({"error": "Dominio no valido"}, status=400)
 
-        dir_visor = os.path.join(dir_root, instance, domain, 'visor')
-
         try:
-            npz_file = os.path.join(dir_visor, variable, "data.npz")
-            if not os.path.exists(npz_file):
-                return JsonResponse({"error": f"Archivo completo no encontrado: {npz_file}"}, status=400)
-            
-            npz      = np.load(npz_file, allow_pickle=True)
-            values   = npz["values"]
-            nt       = int(npz["nt"])
-            nv       = int(npz["nv"])
-            nz       = int(npz["nz"])
-            ny       = int(npz["ny"])
-            nx       = int(npz["nx"])
-            attrs    = npz["attrs"].item()
-            compress = str(npz["compress"])
+            dir_visor = os.path.join(dir_root, instance, domain, 'visor')
+            try:
+                cube_file = select_lod(request, dir_visor, variable)
+            except ValueError as e:
+                return JsonResponse({"error": str(e)}, status=400)
+            if cube_file is None:
+                return JsonResponse({"error": f"Archivo completo no encontrado: {os.path.join(dir_visor, variable)}"}, status=404)
+
+            ## Negociacion de la copia precomprimida o dispersa (solo para el cubo completo)
+            encoded = None
+            sparse  = None
+            if not any(key in request.GET for key in HYPERSLAB_PARAMS):
+                sparse = sparse_file(cube_file, request.META.get('HTTP_ACCEPT', ''))
+                if sparse is None:
+                    encoded = precompressed_file(cube_file, request.META.get('HTTP_ACCEPT_ENCODING', ''))
+
+            etag, last_modified = file_validators(request, [cube_file] + ([encoded[0]] if encoded else []) + ([sparse] if sparse else []))
+            immutable = is_immutable(request, [os.path.join(dir_root, instance)])
+            response  = not_modified(request, etag, last_modified, immutable)
+            if response is not None:
+                patch_vary_headers(response, ('Accept-Encoding', 'Accept'))
+                return response
+
+            cube     = load_cube(cube_file)
+            values   = cube["values"]
+            nt       = cube["nt"]
+            nv       = cube["nv"]
+            nz       = cube["nz"]
+            ny       = cube["ny"]
+            nx       = cube["nx"]
+            attrs    = cube["attrs"]
+            compress = cube["compress"]
 
         except Exception as e:
             return JsonResponse({"error": f"Error leyendo archivo completo: {str(e)}"}, status=500)
 
-        values_bytes = values.tobytes()
+        try:
+            slab = parse_hyperslab(request, nt, nv, nz)
+        except ValueError as e:
+            return JsonResponse({"error": f"Recorte no valido: {str(e)}"}, status=400)
+
+        values_bytes = None
+        if slab is not None:
+            values = hyperslab(cube, **slab)
+            nt, nv, nz = values.shape[:3]
+            if slab["t"].step > 1 and attrs.get("dt"):
+                attrs = {**attrs, "dt": attrs["dt"] * slab["t"].step}
+            with phase('tobytes'):
+                values_bytes = values.tobytes()
+
         header = {
             "variable": variable,
             "nt": nt,
@@ -220,25 +395,75 @@ class DataAPI(View):
             "attrs": attrs,
             "compress": compress,
         }
+        if cube["quant"] is not None:
+            header["quant"] = slice_quant(cube["quant"], slab["t"], slab["v"]) if slab is not None else cube["quant"]
+        if slab is not None:
+            header["slice"] = {
+                "t0"   : slab["t"].start,
+                "tstep": slab["t"].step,
+                "v"    : slab["v"] if isinstance(slab["v"], list) else None,
+                "level": slab["z"].start,
+            }
 
-        if encode == True:
-            values_bytes = gzip.compress(values_bytes)
+        if sparse is not None:
+            header["sparse"] = {key: value for key, value in cube["sparse"].items() if key != "path"}
+            response = FileResponse(open(sparse, 'rb'), content_type=SPARSE_TYPE)
+        elif encoded is not None:
+            response = FileResponse(open(encoded[0], 'rb'), content_type='application/octet-stream')
+            response['Content-Encoding'] = encoded[1]
+        elif values_bytes is not None:
             response = HttpResponse(values_bytes, content_type='application/octet-stream')
-            response['Content-Encoding'] = 'gzip'
+        elif cube["path"] is not None:
+            response = FileResponse(open(cube["path"], 'rb'), content_type='application/octet-stream')
         else:
-            response = HttpResponse(values_bytes, content_type='application/octet-stream')
+            response = HttpResponse(cube["bytes"], content_type='application/octet-stream')
 
-        response['X-Header'] = json.dumps(header)
+        with phase('header'):
+            response['X-Header'] = json.dumps(header)
+        patch_vary_headers(response, ('Accept-Encoding', 'Accept'))
         
-        return response
+        return set_validators(response, etag, last_modified, immutable)
     
 import numpy as np
-from django.http import HttpResponse
+from django.http import HttpResponse, StreamingHttpResponse
+from django.core.serializers.json import DjangoJSONEncoder
+from functools import lru_cache
+JSON_CHUNK = 1 << 16   # elementos por bloque al serializar el cubo
+
+@lru_cache(maxsize=None)
+def json_lookup(dtype_str):
+    """
+    Tabla (object array) con el texto json de cada patron de bits posible, para dtypes de 1-2 bytes.
+    float16 tiene solo 65536 valores: formatear por tabla es ~10x mas rapido que json.dumps por elemento.
+    """
+    dtype = np.dtype(dtype_str)
+    bits  = np.arange(2 ** (8 * dtype.itemsize), dtype=f'<u{dtype.itemsize}')
+    return np.array([json.dumps(x) for x in bits.view(dtype).tolist()], dtype=object)
+
+def iter_json_values(header, values):
+    """
+    Genera el mismo texto que JsonResponse({"header": header, "values": values.flatten().tolist()}),
+    pero por bloques, sin construir la lista completa ni el string completo en memoria.
+    """
+    yield '{"header": ' + json.dumps(header, cls=DjangoJSONEncoder) + ', "values": ['
+    flat   = values.reshape(-1)
+    lookup = json_lookup(flat.dtype.str) if flat.dtype.itemsize <= 2 else None
+    for start in range(0, flat.size, JSON_CHUNK):
+        block = flat[start:start + JSON_CHUNK]
+        if lookup is not None:
+            chunk = ', '.join(lookup[block.view(f'<u{block.dtype.itemsize}')].tolist())
+        else:
+            chunk = json.dumps(block.tolist())[1:-1]
+        yield chunk if start == 0 else ', ' + chunk
+    yield ']}'
+
+@offload
 class DataJsonAPI(View):
-    def get(self, request, *args, **kwargs):
+    def respond(self, request, *args, **kwargs):
         """
         (json version)
-        API optimizada para obtener raster preprocesado desde archivo .npz.
+        API optimizada para obtener raster preprocesado (values.bin o archivo .npz).
+        La respuesta se genera por bloques (StreamingHttpResponse): la memoria no crece con el tamaño del cubo.
         Ejemplo de URL:
         /api/datajson/?domain=antucoya&instance=2025-07-24_00&variable=mp10_hd_lat
         """
@@ -249,22 +474,30 @@ class DataJsonAPI(View):
         if domain not in domains:
             return JsonResponse({"error": "Dominio no valido"}, status=400)
 
-        dir_visor = os.path.join(dir_root, instance, domain, 'visor')
-
         try:
-            npz_file = os.path.join(dir_visor, variable, "data.npz")
-            if not os.path.exists(npz_file):
-                return JsonResponse({"error": f"Archivo completo no encontrado: {npz_file}"}, status=404)
-            
-            npz      = np.load(npz_file, allow_pickle=True)
-            values   = npz["values"]
-            nt       = int(npz["nt"])
-            nv       = int(npz["nv"])
-            nz       = int(npz["nz"])
-            ny       = int(npz["ny"])
-            nx       = int(npz["nx"])
-            attrs    = npz["attrs"].item()
-            compress = str(npz["compress"])
+            dir_visor = os.path.join(dir_root, instance, domain, 'visor')
+            try:
+                cube_file = select_lod(request, dir_visor, variable)
+            except ValueError as e:
+                return JsonResponse({"error": str(e)}, status=400)
+            if cube_file is None:
+                return JsonResponse({"error": f"Archivo completo no encontrado: {os.path.join(dir_visor, variable)}"}, status=404)
+
+            etag, last_modified = file_validators(request, [cube_file])
+            immutable = is_immutable(request, [os.path.join(dir_root, instance)])
+            response  = not_modified(request, etag, last_modified, immutable)
+            if response is not None:
+                return response
+
+            cube     = load_cube(cube_file)
+            values   = cube["values"]
+            nt       = cube["nt"]
+            nv       = cube["nv"]
+            nz       = cube["nz"]
+            ny       = cube["ny"]
+            nx       = cube["nx"]
+            attrs    = cube["attrs"]
+            compress = cube["compress"]
 
         except Exception as e:
             return JsonResponse({"error": f"Error leyendo archivo completo: {str(e)}"}, status=500)
@@ -279,10 +512,596 @@ class DataJsonAPI(View):
             "attrs": attrs,
             "compress": compress,
         }
+        if cube["quant"] is not None:
+            header["quant"] = cube["quant"]
+
+        response = StreamingHttpResponse(iter_json_values(header, values), content_type='application/json')
+        return set_validators(response, etag, last_modified, immutable)
+
+from .cache import cube_cache
+class CacheStatsAPI(View):
+    def get(self, request, *args, **kwargs):
+        """
+        API para consultar el estado de la cache de cubos del proceso (hits, misses, bytes)
+        URL Ejemplo:
+        /api/cache/
+        """
+        return JsonResponse(cube_cache.stats(), safe=False)
+
+from django.http import HttpResponse
+from .products import weighted_sources
+@offload
+class AggregateAPI(View):
+    def respond(self, request, *args, **kwargs):
+        """
+        API para obtener el campo ponderado por emision y abatimiento de cada fuente:
+            sum_v values[:, v] * em[v] * (1 - ab[v]/100)
+        Retorna un cubo float32 (nt,1,nz,ny,nx) con el mismo formato que /api/data/.
+        em y ab son listas separadas por coma de largo nv (por defecto em=1, ab=0).
+        URL Ejemplo:
+        /api/aggregate/?domain=antucoya&instance=2025-07-24_00&variable=mp10_hd_species&em=2000,0,0&ab=0,0,0
+        """
+        variable = request.GET.get("variable")
+        cube, validators, error = open_cube(request)
+        if error is not None:
+            return error
+
+        try:
+            emVector = parse_vector(request.GET.get("em"), cube["nv"], 1)
+            abVector = parse_vector(request.GET.get("ab"), cube["nv"], 0)
+        except ValueError as e:
+            return JsonResponse({"error": f"Vector de emision/abatimiento no valido: {str(e)}"}, status=400)
+
+        values = weighted_sources(cube["field"], emVector * (1 - abVector / 100))
+        header = {
+            "variable": variable,
+            "nt": cube["nt"],
+            "nv": 1,
+            "nz": cube["nz"],
+            "ny": cube["ny"],
+            "nx": cube["nx"],
+            "attrs": cube["attrs"],
+            "compress": "float32",
+        }
+        response = HttpResponse(values.astype('<f4', copy=False).tobytes(), content_type='application/octet-stream')
+        response['X-Header'] = json.dumps(header)
+        return set_validators(response, *validators)
+
+from .spatial import grid_index
+from .products import point_series, group_sources
+def sources_labels(dir_visor, variable, nv, key='project'):
+    """
+    Etiqueta `key` de cada fuente (ordenadas por id_inner) segun el geojson de la especie.
+    Retorna None si el geojson no existe o no calza con nv.
+    """
+    species = variable.split('_')[0]
+    sources_geojson_path = os.path.join(dir_visor, f'{species}.geojson')
+    if not os.path.exists(sources_geojson_path):
+        return None
+    with open(sources_geojson_path, 'r') as f:
+        features = json.load(f)['features']
+    if len(features) != nv:
+        return None
+    features = sorted(features, key=lambda f: f['properties']['id_inner'])
+    return [str(f['properties'].get(key) or '') for f in features]
+
+@offload
+class SeriesAPI(View):
+    def respond(self, request, *args, **kwargs):
+        """
+        API para obtener series de tiempo en uno o varios puntos, por proyecto y total.
+        lon y lat aceptan listas separadas por coma (forma batch). method: bilinear (defecto) o nearest.
+        em y ab ponderan cada fuente igual que en /api/aggregate/.
+        URL Ejemplo:
+        /api/series/?domain=antucoya&instance=2025-07-24_00&variable=mp10_hd_species&lon=-69.666&lat=-22.350
+        """
+        instance = request.GET.get("instance")
+        domain   = request.GET.get("domain")
+        variable = request.GET.get("variable")
+        method   = request.GET.get("method", "bilinear")
+        cube, validators, error = open_cube(request)
+        if error is not None:
+            return error
+
+        try:
+            if method not in ("bilinear", "nearest"):
+                raise ValueError(f"method desconocido: {method}")
+            lon   = np.array([float(x) for x in request.GET.get("lon", "").split(',')])
+            lat   = np.array([float(x) for x in request.GET.get("lat", "").split(',')])
+            level = int(request.GET.get("level", 0))
+            if lon.size != lat.size or not 0 <= level < cube["nz"]:
+                raise ValueError("lon/lat de distinto largo o level fuera de rango")
+            emVector = parse_vector(request.GET.get("em"), cube["nv"], 1)
+            abVector = parse_vector(request.GET.get("ab"), cube["nv"], 0)
+        except ValueError as e:
+            return JsonResponse({"error": f"Parametros no validos: {str(e)}"}, status=400)
+
+        dir_visor = os.path.join(dir_root, instance, domain, 'visor')
+        try:
+            index = grid_index(dir_visor, cube["attrs"])
+        except FileNotFoundError as e:
+            return JsonResponse({"error": str(e)}, status=404)
+
+        if method == "nearest":
+            j, i, inside = index.nearest(lon, lat)
+            jj, ii, ww = j[:, None], i[:, None], np.ones((lon.size, 1), dtype=np.float32)
+        else:
+            jj, ii, ww, inside = index.bilinear(lon, lat)
+
+        series   = point_series(cube["field"], jj, ii, ww, level)           # (nt,nv,n)
+        series   = series * (emVector * (1 - abVector / 100))[None, :, None]
+        labels   = sources_labels(dir_visor, variable, cube["nv"])
+        projects = {}
+        if labels is not None:
+            groups, matrix = group_sources(labels)
+            by_group = np.einsum('gv,tvn->gtn', matrix, series)
+            projects = {group: by_group[g] for g, group in enumerate(groups)}
+        total = series.sum(axis=1)                                           # (nt,n)
+
+        points = []
+        for n in range(lon.size):
+            points.append({
+                "lon"   : float(lon[n]),
+                "lat"   : float(lat[n]),
+                "j"     : int(jj[n, 0]),
+                "i"     : int(ii[n, 0]),
+                "inside": bool(inside[n]),
+                "series": {
+                    **{p: values[:, n].tolist() for p, values in projects.items()},
+                    "total": total[:, n].tolist(),
+                },
+            })
+        response = JsonResponse({
+            "variable": variable,
+            "nt"      : cube["nt"],
+            "dt"      : cube["attrs"].get("dt"),
+            "level"   : level,
+            "method"  : method,
+            "points"  : points,
+        }, safe=False)
+        return set_validators(response, *validators)
+
+from django.http import StreamingHttpResponse
+from .spatial import grid_arrays
+BUNDLE_ALIGN = 8       # offsets multiplos de 8: cada parte se puede ver como TypedArray sin copiar
+BUNDLE_CHUNK = 1 << 20
+
+def iter_bundle(parts):
+    """Escribe las partes del bundle en orden, leyendo por bloques las que vienen de archivo."""
+    for part in parts:
+        if part["path"] is not None:
+            with open(part["path"], 'rb') as f:
+                while True:
+                    chunk = f.read(BUNDLE_CHUNK)
+                    if not chunk:
+                        break
+                    yield chunk
+        else:
+            yield part["data"]
+        yield b"\0" * part["padding"]
+
+@offload
+class BundleAPI(View):
+    def respond(self, request, *args, **kwargs):
+        """
+        API para obtener en una sola respuesta el cubo, sus grillas lon/lat y (opcional) el geojson de fuentes.
+        El cuerpo es la concatenacion de las partes; X-Header describe cada una en "parts":
+            {"name", "dtype" (numpy, ej. "<f2") o "json", "shape", "offset", "nbytes"}
+        Acepta los mismos parametros de recorte que /api/data/. sources=1 agrega el geojson de la especie.
+        values=0 omite el cubo (solo grillas, fuentes y metadata): el visor pide el cubo a /api/data/, que lo
+        envia con sendfile y en su copia precomprimida segun Accept-Encoding; este cuerpo va siempre sin comprimir.
+        URL Ejemplo:
+        /api/bundle/?domain=antucoya&instance=2025-07-24_00&variable=mp10_hd_species&sources=1
+        /api/bundle/?domain=antucoya&instance=2025-07-24_00&variable=mp10_hd_species&sources=1&values=0
+        """
+        instance = request.GET.get("instance")
+        domain   = request.GET.get("domain")
+        variable = request.GET.get("variable")
+        cube, validators, error = open_cube(request)
+        if error is not None:
+            return error
+
+        try:
+            slab = parse_hyperslab(request, cube["nt"], cube["nv"], cube["nz"])
+        except ValueError as e:
+            return JsonResponse({"error": f"Recorte no valido: {str(e)}"}, status=400)
+
+        dir_visor = os.path.join(dir_root, instance, domain, 'visor')
+        try:
+            lon, lat = grid_arrays(dir_visor, cube["attrs"])
+        except FileNotFoundError as e:
+            return JsonResponse({"error": str(e)}, status=404)
+
+        attrs = cube["attrs"]
+        parts = []
+        with_values = request.GET.get("values") not in ("0", "false")
+        values = cube["values"]
+        shape  = values.shape
+        if slab is None:
+            part = {"name": "values", "path": cube["path"], "data": cube["bytes"]}
+        else:
+            ## Sin el cubo basta la forma del recorte (vista basica, no lee datos)
+            shape = values[slab["t"], :, slab["z"]].shape
+            if isinstance(slab["v"], list):
+                shape = (shape[0], len(slab["v"])) + shape[2:]
+            if with_values:
+                values = hyperslab(cube, **slab)
+            if slab["t"].step > 1 and attrs.get("dt"):
+                attrs = {**attrs, "dt": attrs["dt"] * slab["t"].step}
+            part = {"name": "values", "path": None, "data": values.tobytes() if with_values else None}
+        if with_values:
+            parts.append({**part, "dtype": values.dtype.str, "shape": list(shape)})
+        parts.append({"name": "lon", "path": None, "data": lon.tobytes(), "dtype": lon.dtype.str, "shape": list(lon.shape)})
+        parts.append({"name": "lat", "path": None, "data": lat.tobytes(), "dtype": lat.dtype.str, "shape": list(lat.shape)})
+
+        if request.GET.get("sources") in ("1", "true"):
+            species = variable.split('_')[0]
+            sources_geojson_path = os.path.join(dir_visor, f'{species}.geojson')
+            if os.path.exists(sources_geojson_path):
+                with open(sources_geojson_path, 'rb') as f:
+                    parts.append({"name": "sources", "path": None, "data": f.read(), "dtype": "json", "shape": None})
+
+        offset = 0
+        for part in parts:
+            part["nbytes"]  = values.nbytes if part["name"] == "values" else len(part["data"])
+            part["offset"]  = offset
+            part["padding"] = -part["nbytes"] % BUNDLE_ALIGN
+            offset += part["nbytes"] + part["padding"]
+
+        nt, nv, nz, ny, nx = shape
+        header = {
+            "variable": variable,
+            "nt": nt,
+            "nv": nv,
+            "nz": nz,
+            "ny": ny,
+            "nx": nx,
+            "attrs": attrs,
+            "compress": cube["compress"],
+            "parts": [{key: part[key] for key in ("name", "dtype", "shape", "offset", "nbytes")} for part in parts],
+        }
+        if cube["quant"] is not None:
+            header["quant"] = slice_quant(cube["quant"], slab["t"], slab["v"]) if slab is not None else cube["quant"]
+        if slab is not None:
+            header["slice"] = {
+                "t0"   : slab["t"].start,
+                "tstep": slab["t"].step,
+                "v"    : slab["v"] if isinstance(slab["v"], list) else None,
+                "level": slab["z"].start,
+            }
 
-        values_list = values.flatten().tolist()
-        response_data = {
-            "header": header,
-            "values": values_list
+        response = StreamingHttpResponse(iter_bundle(parts), content_type='application/octet-stream')
+        response['Content-Length'] = str(offset)
+        response['X-Header'] = json.dumps(header)
+        return set_validators(response, *validators)
+
+@offload
+class CatalogAPI(View):
+    def respond(self, request, *args, **kwargs):
+        """
+        API con todo lo que la UI necesita al iniciar: contexto, instancias READY por dominio y,
+        para la instancia mas reciente de cada dominio, sus variables (metadata del header) y grillas.
+        detail=all agrega variables y grillas de todas las instancias.
+        URL Ejemplo:
+        /api/catalog/
+        /api/catalog/?detail=all
+        """
+        detail_all = request.GET.get("detail") == "all"
+        dict_domains = {}
+        for domain in domains:
+            instances = catalog.instances(domain)
+            detailed  = instances if detail_all else instances[-1:]
+            dict_domains[domain] = {
+                "instances": instances,
+                "latest"   : instances[-1] if instances else None,
+                "detail"   : {
+                    instance: {
+                        "variables": catalog.variables(domain, instance),
+                        "grids"    : grids_info(catalog.variables(domain, instance)),
+                    }
+                    for instance in detailed
+                },
+            }
+        dict_catalog = {
+            "context": context_info(),
+            "domains": dict_domains,
         }
-        return JsonResponse(response_data, safe=False)
+        return catalog_response(request, JsonResponse(dict_catalog, safe=False))
+
+from .cache import cube_cache
+from .products import temporal_stats
+from .storage import STATS_DIR
+STATS_PERCENTILES = (50, 90, 99)
+
+def stats_header(variable, names, cube, shape):
+    """X-Header de /api/stats/ (precalculado o en linea): shape = (nproductos,nz,ny,nx) float32."""
+    return {
+        "variable": variable,
+        "nt": 1,
+        "nv": shape[0],
+        "nz": shape[1],
+        "ny": shape[2],
+        "nx": shape[3],
+        "attrs": {**cube["attrs"], "products": names},
+        "compress": "float32",
+    }
+
+@offload
+class StatsAPI(View):
+    def respond(self, request, *args, **kwargs):
+        """
+        API para obtener mapas de estadisticas temporales del campo total (o de un subconjunto de fuentes):
+        max, mean, percentiles (p=50,90,99 por defecto) y numero de pasos de tiempo sobre cada umbral
+        de attrs.thresholds (exceed_<umbral>; multiplicar por attrs.dt/60 para obtener horas).
+        Retorna un cubo float32 (1,nproductos,nz,ny,nx) con el formato de /api/data/; attrs.products
+        lista el producto de cada indice v. Sin parametros se sirve el producto precalculado al publicar
+        (<variable>/stats/) si existe. Parametros: p, v, em, ab, level.
+        URL Ejemplo:
+        /api/stats/?domain=antucoya&instance=2025-07-24_00&variable=mp10_hd_species
+        /api/stats/?domain=antucoya&instance=2025-07-24_00&variable=mp10_hd_species&p=95&v=0,3&level=0
+        """
+        instance = request.GET.get("instance")
+        domain   = request.GET.get("domain")
+        variable = request.GET.get("variable")
+        params   = ('p', 'v', 'em', 'ab', 'level')
+        precomputed = None
+        if not any(key in request.GET for key in params):
+            dir_visor = os.path.join(dir_root, str(instance), str(domain), 'visor')
+            if domain in domains and find_cube(dir_visor, os.path.join(str(variable), STATS_DIR)) is not None:
+                precomputed = os.path.join(variable, STATS_DIR)
+
+        cube, validators, error = open_cube(request, variable=precomputed)
+        if error is not None:
+            return error
+
+        if precomputed is not None:
+            ## Cubo (1,nproductos,nz,ny,nx) publicado por save_stats: se envia tal cual
+            header   = stats_header(variable, cube["attrs"]["products"], cube, (cube["nv"], cube["nz"], cube["ny"], cube["nx"]))
+            if cube["path"] is not None:
+                response = FileResponse(open(cube["path"], 'rb'), content_type='application/octet-stream')
+            else:
+                response = HttpResponse(cube["bytes"], content_type='application/octet-stream')
+            response['X-Header'] = json.dumps(header)
+            return set_validators(response, *validators)
+
+        try:
+            percentiles = [float(q) for q in request.GET.get("p", "").split(',') if q] or list(STATS_PERCENTILES)
+            if not all(0 <= q <= 100 for q in percentiles):
+                raise ValueError("percentiles fuera de [0, 100]")
+            weights = parse_vector(request.GET.get("em"), cube["nv"], 1) * (1 - parse_vector(request.GET.get("ab"), cube["nv"], 0) / 100)
+            if request.GET.get("v"):
+                selected = [int(x) for x in request.GET["v"].split(',')]
+                if not all(0 <= x < cube["nv"] for x in selected):
+                    raise ValueError(f"Fuentes fuera de rango (nv={cube['nv']})")
+                mask = np.zeros(cube["nv"], dtype=np.float32)
+                mask[selected] = 1
+                weights = weights * mask
+            z = slice(None)
+            if "level" in request.GET:
+                level = int(request.GET["level"])
+                if not 0 <= level < cube["nz"]:
+                    raise ValueError(f"Nivel fuera de rango (nz={cube['nz']})")
+                z = slice(level, level + 1)
+        except ValueError as e:
+            return JsonResponse({"error": f"Parametros no validos: {str(e)}"}, status=400)
+
+        ## Cache por instancia/variable/parametros (el etag ya combina identidad del archivo y query)
+        key = ('stats', validators[0])
+        result = cube_cache.get(key)
+        if result is None:
+            field = weighted_sources(cube["field"][:, :, z], weights)[:, 0]      # (nt,nz,ny,nx)
+            names, products = temporal_stats(field, percentiles, cube["attrs"].get("thresholds") or [])
+            result = (names, products[np.newaxis].tobytes(), products.shape)
+            cube_cache.put(key, result, len(result[1]))
+        names, values_bytes, shape = result
+
+        header   = stats_header(variable, names, cube, shape)
+        response = HttpResponse(values_bytes, content_type='application/octet-stream')
+        response['X-Header'] = json.dumps(header)
+        return set_validators(response, *validators)
+
+from .spatial import receptor_weights
+PLACES_FILE = 'places.geojson'
+
+@offload
+class ReceptorsAPI(View):
+    def respond(self, request, *args, **kwargs):
+        """
+        API para obtener en una sola request las series de tiempo y estadisticas (max, mean, percentiles,
+        pasos sobre cada umbral) en todos los receptores de places.geojson de la instancia, por proyecto y total.
+        Los indices y pesos de interpolacion se calculan una vez por grilla (ver spatial.receptor_weights).
+        Parametros opcionales: method (bilinear|nearest), level, p, em, ab (como en /api/series/).
+        URL Ejemplo:
+        /api/receptors/?domain=antucoya&instance=2025-07-24_00&variable=mp10_hd_species
+        """
+        instance = request.GET.get("instance")
+        domain   = request.GET.get("domain")
+        variable = request.GET.get("variable")
+        method   = request.GET.get("method", "bilinear")
+        if domain not in domains:
+            return JsonResponse({"error": "Dominio no valido"}, status=400)
+        dir_visor   = os.path.join(dir_root, str(instance), domain, 'visor')
+        places_file = os.path.join(dir_visor, PLACES_FILE)
+        if not os.path.exists(places_file):
+            return JsonResponse({"error": "places.geojson no encontrado"}, status=404)
+
+        cube, validators, error = open_cube(request, extra_files=[PLACES_FILE])
+        if error is not None:
+            return error
+
+        try:
+            if method not in ("bilinear", "nearest"):
+                raise ValueError(f"method desconocido: {method}")
+            level = int(request.GET.get("level", 0))
+            if not 0 <= level < cube["nz"]:
+                raise ValueError(f"Nivel fuera de rango (nz={cube['nz']})")
+            percentiles = [float(q) for q in request.GET.get("p", "").split(',') if q] or list(STATS_PERCENTILES)
+            if not all(0 <= q <= 100 for q in percentiles):
+                raise ValueError("percentiles fuera de [0, 100]")
+            weights = parse_vector(request.GET.get("em"), cube["nv"], 1) * (1 - parse_vector(request.GET.get("ab"), cube["nv"], 0) / 100)
+        except ValueError as e:
+            return JsonResponse({"error": f"Parametros no validos: {str(e)}"}, status=400)
+
+        try:
+            receptors = receptor_weights(dir_visor, cube["attrs"], places_file, method)
+        except FileNotFoundError as e:
+            return JsonResponse({"error": str(e)}, status=404)
+        except (ValueError, KeyError, IndexError, TypeError) as e:
+            return JsonResponse({"error": f"places.geojson no valido: {str(e)}"}, status=500)
+
+        ## Una sola lectura de las celdas de todos los receptores
+        series   = point_series(cube["field"], receptors["jj"], receptors["ii"], receptors["ww"], level)   # (nt,nv,n)
+        series   = series * weights[None, :, None]
+        labels   = sources_labels(dir_visor, variable, cube["nv"])
+        projects = {}
+        if labels is not None:
+            groups, matrix = group_sources(labels)
+            by_group = np.einsum('gv,tvn->gtn', matrix, series)
+            projects = {group: by_group[g] for g, group in enumerate(groups)}
+        total = series.sum(axis=1)                                           # (nt,n)
+        names, stats = temporal_stats(total, percentiles, cube["attrs"].get("thresholds") or [])   # (nproductos,n)
+
+        points = []
+        for n, name in enumerate(receptors["names"]):
+            points.append({
+                "name"  : name,
+                "lon"   : float(receptors["lon"][n]),
+                "lat"   : float(receptors["lat"][n]),
+                "j"     : int(receptors["jj"][n, 0]),
+                "i"     : int(receptors["ii"][n, 0]),
+                "inside": bool(receptors["inside"][n]),
+                "series": {
+                    **{p: values[:, n].tolist() for p, values in projects.items()},
+                    "total": total[:, n].tolist(),
+                },
+                "stats" : {product: float(stats[k, n]) for k, product in enumerate(names)},
+            })
+        response = JsonResponse({
+            "variable": variable,
+            "nt"      : cube["nt"],
+            "dt"      : cube["attrs"].get("dt"),
+            "level"   : level,
+            "method"  : method,
+            "points"  : points,
+        }, safe=False)
+        return set_validators(response, *validators)
+
+from datetime import datetime
+from .products import ENSEMBLE_OPS, align_valid_times, ensemble_fields
+## Memoria por bloque de tiempo al combinar corridas (un bloque de una corrida, su decodificacion + acumuladores)
+ENSEMBLE_CHUNK_BYTES = getattr(settings, 'PROVIDER_ENSEMBLE_CHUNK_BYTES', 64 * 1024**2)
+INSTANCE_FORMAT      = '%Y-%m-%d_%H'
+
+@offload
+class EnsembleAPI(View):
+    def respond(self, request, *args, **kwargs):
+        """
+        API para comparar corridas de una variable (campo total, suma sobre fuentes) en sus tiempos validos comunes.
+        op=diff: instances[0] - instances[1]. op=mean|max|min|std: estadistica entre las N instancias.
+        Las corridas se alinean por la fecha de la instancia y attrs.dt; attrs.ensemble.start es el tiempo
+        valido del primer paso. instances=a,b,... o last=N (las N ultimas READY, la mas reciente primero).
+        Retorna un cubo float32 (nt,1,nz,ny,nx) con el formato de /api/data/. Parametro opcional: level.
+        gen=<g1>,<g2>,... (generaciones de instances, en el mismo orden) hace la respuesta immutable.
+        URL Ejemplo:
+        /api/ensemble/?domain=antucoya&variable=mp10_hd_species&instances=2025-07-24_00,2025-07-23_00&op=diff
+        /api/ensemble/?domain=antucoya&variable=mp10_hd_species&last=5&op=std
+        """
+        domain   = request.GET.get("domain")
+        variable = request.GET.get("variable")
+        op       = request.GET.get("op", "mean")
+        if domain not in domains:
+            return JsonResponse({"error": "Dominio no valido"}, status=400)
+        try:
+            if op not in ENSEMBLE_OPS:
+                raise ValueError(f"op desconocido: {op}")
+            if request.GET.get("instances"):
+                instances = request.GET["instances"].split(',')
+            else:
+                last      = int(request.GET.get("last", 2))
+                available = [i for i in instances_info(domain) if variable in catalog.variables(domain, i)]
+                instances = available[::-1][:last]
+            if len(instances) < 2:
+                raise ValueError("Se requieren al menos 2 instancias")
+            if op == 'diff' and len(instances) != 2:
+                raise ValueError("diff requiere exactamente 2 instancias")
+            starts = [datetime.strptime(instance, INSTANCE_FORMAT) for instance in instances]
+        except ValueError as e:
+            return JsonResponse({"error": f"Parametros no validos: {str(e)}"}, status=400)
+
+        cube_files = []
+        for instance in instances:
+            cube_file = find_cube(os.path.join(dir_root, instance, domain, 'visor'), variable)
+            if cube_file is None:
+                return JsonResponse({"error": f"{variable} no encontrado en {instance}"}, status=404)
+            cube_files.append(cube_file)
+        etag, last_modified = file_validators(request, cube_files)
+        immutable = is_immutable(request, [os.path.join(dir_root, instance) for instance in instances])
+        response = not_modified(request, etag, last_modified, immutable)
+        if response is not None:
+            return response
+        cubes = [load_cube(cube_file) for cube_file in cube_files]
+
+        try:
+            dts = {cube["attrs"].get("dt") for cube in cubes}
+            if len(dts) != 1 or None in dts:
+                raise ValueError(f"attrs.dt distinto o ausente entre instancias: {sorted(map(str, dts))}")
+            if len({(cube["nz"], cube["ny"], cube["nx"]) for cube in cubes}) != 1:
+                raise ValueError("Las instancias no comparten la grilla (nz,ny,nx)")
+            dt = dts.pop()
+            offsets, nt, start = align_valid_times(starts, dt, [cube["nt"] for cube in cubes])
+            z = slice(None)
+            if "level" in request.GET:
+                level = int(request.GET["level"])
+                if not 0 <= level < cubes[0]["nz"]:
+                    raise ValueError(f"Nivel fuera de rango (nz={cubes[0]['nz']})")
+                z = slice(level, level + 1)
+        except ValueError as e:
+            return JsonResponse({"error": f"Parametros no validos: {str(e)}"}, status=400)
+
+        ## Cache por conjunto de instancias (el etag combina la identidad de todos los archivos y la query)
+        key    = ('ensemble', etag)
+        result = cube_cache.get(key)
+        if result is None:
+            nz     = len(range(cubes[0]["nz"])[z])
+            cells  = nz * cubes[0]["ny"] * cubes[0]["nx"]
+            ## Por paso: el bloque leido de una corrida (nv,nz,ny,nx) en su dtype, mas su decodificacion
+            ## float32 si esta cuantizada, mas los acumuladores (campo float32, acc y sq float64)
+            step   = max(cube["nv"] * cells * (cube["values"].dtype.itemsize + (4 if cube["quant"] else 0))
+                         for cube in cubes) + cells * (4 + 8 + 8)
+            chunk  = max(1, ENSEMBLE_CHUNK_BYTES // step)
+            fields = ensemble_fields([cube["field"] for cube in cubes], offsets, nt, op, z, chunk)
+            result = (fields[:, np.newaxis].tobytes(), fields.shape)
+            cube_cache.put(key, result, len(result[0]))
+        values_bytes, shape = result
+
+        header = {
+            "variable": variable,
+            "nt": shape[0],
+            "nv": 1,
+            "nz": shape[1],
+            "ny": shape[2],
+            "nx": shape[3],
+            "attrs": {**cubes[0]["attrs"], "ensemble": {
+                "op"       : op,
+                "instances": instances,
+                "offsets"  : offsets,
+                "start"    : start.isoformat(),
+            }},
+            "compress": "float32",
+        }
+        response = HttpResponse(values_bytes, content_type='application/octet-stream')
+        response['X-Header'] = json.dumps(header)
+        return set_validators(response, etag, last_modified, immutable)
+
+from .metrics import registry
+from .spatial import grid_cache
+class MetricsAPI(View):
+    def get(self, request, *args, **kwargs):
+        """
+        Metricas del proceso en formato de texto de Prometheus: latencia por vista (histograma),
+        requests por status, bytes enviados, requests en curso, tiempo por fase y aciertos de las caches.
+        URL Ejemplo:
+        /metrics
+        """
+        body = registry.render([('cube', cube_cache), ('grid', grid_cache)])
+        return HttpResponse(body, content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,72 @@
+#################################################################################################
+## PRECARGA DE LA INSTANCIA MAS RECIENTE (cache de cubos + page cache del OS)
+#################################################################################################
+import os
+import time
+from .storage import find_cube, load_cube, PRECOMPRESSED
+from .spatial import grid_arrays, grid_index
+
+READ_CHUNK = 4 * 1024 * 1024
+
+
+def touch_file(path):
+    """Lee el archivo completo (descartando el contenido) para dejarlo en el page cache. Retorna bytes leidos."""
+    nbytes = 0
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(READ_CHUNK)
+            if not chunk:
+                break
+            nbytes += len(chunk)
+    return nbytes
+
+
+def warm_variable(dir_visor, variable):
+    """Carga una variable en la cache de cubos y su(s) archivo(s) en el page cache."""
+    start     = time.perf_counter()
+    cube_file = find_cube(dir_visor, variable)
+    cube      = load_cube(cube_file)
+    nbytes    = 0
+    if cube["path"] is not None:
+        nbytes += touch_file(cube["path"])
+        for _, suffix in PRECOMPRESSED:
+            if os.path.exists(cube["path"] + suffix):
+                nbytes += touch_file(cube["path"] + suffix)
+    else:
+        nbytes += len(cube["bytes"])
+    return {
+        "variable": variable,
+        "format"  : "raw" if cube["path"] is not None else ("sparse" if cube["sparse"] else "npz"),
+        "bytes"   : nbytes,
+        "seconds" : time.perf_counter() - start,
+        "attrs"   : cube["attrs"],
+    }
+
+
+def warm_latest(dir_root, catalog, domains, log=None):
+    """
+    Precarga todas las variables y grillas de la ultima instancia READY de cada dominio.
+    Retorna una lista de registros {domain, instance, variable, format, bytes, seconds}.
+    """
+    records = []
+    catalog.refresh(force=True)
+    for domain in domains:
+        instances = catalog.instances(domain)
+        if not instances:
+            continue
+        instance  = instances[-1]
+        dir_visor = os.path.join(dir_root, instance, domain, 'visor')
+        for variable in catalog.variables(domain, instance):
+            record = warm_variable(dir_visor, variable)
+            attrs  = record.pop("attrs")
+            if attrs.get("coordx") and attrs.get("coordy"):
+                try:
+                    grid_arrays(dir_visor, attrs)
+                    grid_index(dir_visor, attrs)
+                except FileNotFoundError:
+                    pass
+            record.update({"domain": domain, "instance": instance})
+            records.append(record)
+            if log is not None:
+                log(record)
+    return records